@@ -1,5 +1,6 @@
 import os
 import csv
+import argparse
 import numpy as np
 from scipy.interpolate import interp1d
 
@@ -98,10 +99,13 @@ def interpolate_bounding_boxes(data):
     return interpolated_data
 
 
-# Resolve input/output paths relative to backend/Data/ANPR-ATCC
+# Resolve input/output paths relative to backend/Data/ANPR-ATCC unless --results is given
 base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 data_dir = os.path.join(base_dir, 'Data', 'ANPR-ATCC')
-results_dir = os.path.join(data_dir, 'Results')
+parser = argparse.ArgumentParser(description="Interpolate the boxes of cars in the frames they were missed")
+parser.add_argument('--results', type=str, default=os.path.join(data_dir, 'Results'),
+                    help="Directory with main.csv; writes Interpolated_Results/vehicle_testing.csv there")
+results_dir = parser.parse_args().results
 interpolated_dir = os.path.join(results_dir, 'Interpolated_Results')
 os.makedirs(interpolated_dir, exist_ok=True)
 
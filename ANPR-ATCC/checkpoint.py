@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import pickle
+import shutil
+import hashlib
+
+# Frames between checkpoints (0 disables checkpointing)
+DEFAULT_EVERY = int(os.environ.get('ITS_ANPR_CHECKPOINT_EVERY', '250'))
+STATE_FILE = 'state.pkl'
+JOURNAL_FILE = 'results.jsonl'
+
+
+def video_fingerprint(video_path, sample_bytes=1 << 20):
+    """Size plus a hash of the first and last MB: cheap, and unchanged when the
+    same upload is copied over the input again."""
+    size = os.path.getsize(video_path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(video_path, 'rb') as f:
+        digest.update(f.read(sample_bytes))
+        if size > sample_bytes:
+            f.seek(max(sample_bytes, size - sample_bytes))
+            digest.update(f.read(sample_bytes))
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    """Periodic snapshot of an ANPR run so a restarted job resumes where it stopped.
+
+    Per-frame results go to an append-only journal, so each checkpoint only
+    writes the frames processed since the previous one. The state file (next
+    frame, journal length, pickled tracker state) is replaced atomically after
+    the journal is flushed; on load the journal is cut back to the length the
+    state file recorded, dropping rows written after the last checkpoint.
+    """
+
+    def __init__(self, checkpoint_dir, video_path, every=None):
+        self.checkpoint_dir = checkpoint_dir
+        self.video_path = video_path
+        self.every = DEFAULT_EVERY if every is None else every
+        self.fingerprint = video_fingerprint(video_path)
+        self.next_frame = 0
+        self.seconds = 0.0
+        self.saves = 0
+
+    @property
+    def enabled(self):
+        return self.every > 0
+
+    def _path(self, name):
+        return os.path.join(self.checkpoint_dir, name)
+
+    def load(self):
+        """Return (next_frame, results, tracker_state), or None when there is nothing to resume."""
+        try:
+            with open(self._path(STATE_FILE), 'rb') as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if state.get('fingerprint') != self.fingerprint:
+            print("Checkpoint belongs to a different input video, starting over")
+            self.clear()
+            return None
+
+        results = {}
+        try:
+            with open(self._path(JOURNAL_FILE), 'r+') as f:
+                f.truncate(state['journal_size'])
+                for line in f:
+                    row = json.loads(line)
+                    results[row['frame']] = {int(car_id): entry for car_id, entry in row['cars'].items()}
+        except (OSError, ValueError) as e:
+            print(f"Checkpoint journal unreadable, starting over: {e}")
+            self.clear()
+            return None
+        self.next_frame = state['frame']
+        return state['frame'], results, state['tracker']
+
+    def due(self, frame_no):
+        return self.enabled and frame_no + 1 - self.next_frame >= self.every
+
+    def save(self, next_frame, results, tracker_state):
+        """Append results for [self.next_frame, next_frame) and record next_frame as the resume point."""
+        start = time.perf_counter()
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        with open(self._path(JOURNAL_FILE), 'a') as f:
+            for frame_no in range(self.next_frame, next_frame):
+                row = {'frame': frame_no, 'cars': results.get(frame_no, {})}
+                f.write(json.dumps(row, default=float) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+            journal_size = f.tell()
+
+        state = {'fingerprint': self.fingerprint, 'frame': next_frame,
+                 'journal_size': journal_size, 'tracker': tracker_state}
+        tmp_path = self._path(f"{STATE_FILE}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(STATE_FILE))
+        self.next_frame = next_frame
+        self.seconds += time.perf_counter() - start
+        self.saves += 1
+
+    def clear(self):
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        self.next_frame = 0
@@ -1,18 +1,51 @@
 import os
-from video_utils import read_video
+import sys
+import argparse
 from tracker import Tracker
+from util import write_csv
+from checkpoint import Checkpoint
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from job_runner import configure_threads
+from frame_source import FrameSource
+
+# Data/ANPR-ATCC holds the input video and the Results of the pipeline scripts;
+# --video and --results (also on add_missing_data.py and visualize.py) point
+# them elsewhere, e.g. for the benchmarks
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data', 'ANPR-ATCC')
 
 def main():
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    data_dir = os.path.join(base_dir, 'Data', 'ANPR-ATCC')
-    input_video_path = os.path.join(data_dir, 'anpr_atcc.mp4')
+    parser = argparse.ArgumentParser(description="ANPR-ATCC vehicle tracking and plate reading")
+    parser.add_argument("--workers", type=int, default=1, help="Process overlapping segments in N parallel workers")
+    parser.add_argument("--overlap", type=int, default=None, help="Overlap between segments in frames (default: 2 seconds)")
+    parser.add_argument("--checkpoint-every", type=int, default=None,
+                        help="Checkpoint every N frames, 0 to disable (default: ITS_ANPR_CHECKPOINT_EVERY or 250)")
+    parser.add_argument("--video", type=str, default=os.path.join(DATA_DIR, 'anpr_atcc.mp4'), help="Input video")
+    parser.add_argument("--results", type=str, default=os.path.join(DATA_DIR, 'Results'),
+                        help="Directory for main.csv and the checkpoint")
+    args = parser.parse_args()
+
+    input_video_path = args.video
+    results_dir = args.results
+    os.makedirs(results_dir, exist_ok=True)
 
-    frames = read_video(input_video_path)
+    if args.workers > 1:
+        from parallel import process_video_parallel
+        results = process_video_parallel(input_video_path, args.workers, args.overlap)
+        write_csv(results, os.path.join(results_dir, 'main.csv'))
+        return
+
+    # Frames are streamed so a resumed run decodes from the checkpoint onwards only
+    checkpoint = Checkpoint(os.path.join(results_dir, 'checkpoint'), input_video_path, args.checkpoint_every)
     track = Tracker()
-    _ = track.process_video(frames)
+    configure_threads()
+    start_frame = track.resume(checkpoint) if checkpoint.enabled else 0
+    frames = FrameSource(input_video_path, start_frame=start_frame)
+    _ = track.process_video(frames, start_frame=start_frame, checkpoint=checkpoint if checkpoint.enabled else None,
+                            results_dir=results_dir)
+    frames.release()
+    checkpoint.clear()
 
 
 if __name__ == '__main__':
     main()
-
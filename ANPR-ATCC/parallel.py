@@ -0,0 +1,158 @@
+import os
+import sys
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frame_source import FrameSource, probe_video
+from segments import keyframe_indices, plan_segments, init_segment_worker, segment_worker
+from job_runner import thread_budget
+import job_stats
+
+# Minimum stitching score for two local tracks to be treated as the same car
+MATCH_THRESHOLD = 0.3
+# Score added when both tracks read the same plate inside the overlap window
+PLATE_BONUS = 0.5
+
+def _new_tracker():
+    from tracker import Tracker
+    return Tracker()
+
+
+def _process_segment(video_path, start, end, overlap):
+    """Track [start - overlap, end) from a fresh tracker state.
+    Track boxes are kept for the leading and trailing overlap windows only,
+    which is what stitching against the neighbouring segments needs.
+    """
+    lead_start = max(0, start - overlap)
+    tracker = segment_worker()
+    tracker.reset_tracking()
+    job_stats.STATS.reset()
+    frames = FrameSource(video_path, start_frame=lead_start, max_frames=end - lead_start)
+    windows = [(lead_start, start), (max(lead_start, end - overlap), end)]
+    results = tracker.process_video(frames, start_frame=lead_start, track_windows=windows, write=False)
+    frames.release()
+    print(f"Segment {start}-{end}: {len(results)} frames")
+    return results, tracker.track_boxes, job_stats.STATS.snapshot()
+
+
+def box_iou(a, b):
+    """IoU of two (x1, y1, x2, y2, ...) boxes."""
+    xx1, yy1 = max(a[0], b[0]), max(a[1], b[1])
+    xx2, yy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0., xx2 - xx1) * max(0., yy2 - yy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.
+
+
+def _plates(results, frames):
+    plates = defaultdict(set)
+    for frame_no in frames:
+        for car_id, entry in results.get(frame_no, {}).items():
+            text = entry['license_plate']['text']
+            if text and text != 'None' and len(text) >= 4:
+                plates[car_id].add(text)
+    return plates
+
+
+def match_tracks(prev_boxes, prev_results, next_boxes, next_results, frames):
+    """Map track ids of the later segment to ids of the earlier one.
+    Pairs are scored by IoU summed over the shared frames (normalised by how
+    long either track was visible) plus a bonus for an identical plate read.
+    """
+    seen_prev, seen_next = defaultdict(int), defaultdict(int)
+    scores = defaultdict(float)
+    for frame_no in frames:
+        a, b = prev_boxes.get(frame_no, {}), next_boxes.get(frame_no, {})
+        for id_a in a:
+            seen_prev[id_a] += 1
+        for id_b in b:
+            seen_next[id_b] += 1
+        for id_a, box_a in a.items():
+            for id_b, box_b in b.items():
+                overlap = box_iou(box_a, box_b)
+                if overlap > 0:
+                    scores[(id_a, id_b)] += overlap
+    for key in scores:
+        scores[key] /= max(seen_prev[key[0]], seen_next[key[1]])
+
+    plates_prev, plates_next = _plates(prev_results, frames), _plates(next_results, frames)
+    for id_a, texts_a in plates_prev.items():
+        for id_b, texts_b in plates_next.items():
+            if texts_a & texts_b:
+                scores[(id_a, id_b)] += PLATE_BONUS
+
+    mapping, used = {}, set()
+    for (id_a, id_b), score in sorted(scores.items(), key=lambda kv: kv[1], reverse=True):
+        if score < MATCH_THRESHOLD:
+            break
+        if id_b in mapping or id_a in used:
+            continue
+        mapping[id_b] = id_a
+        used.add(id_a)
+    return mapping
+
+
+def stitch_segments(segments, outputs, overlap):
+    """Merge per-segment results into one dict with a global car_id space.
+    Frames in an overlap window are taken from the earlier segment, whose
+    tracker is already warmed up there.
+    """
+    merged = {}
+    next_id = 1
+    prev_global = {}
+    prev_output = None
+    for (start, end), (results, track_boxes) in zip(segments, outputs):
+        local_to_global = {}
+        if prev_output is not None:
+            shared = range(max(0, start - overlap), start)
+            matched = match_tracks(prev_output[1], prev_output[0], track_boxes, results, shared)
+            for id_b, id_a in matched.items():
+                if id_a in prev_global:
+                    local_to_global[id_b] = prev_global[id_a]
+
+        for frame_no in range(start, end):
+            rows = results.get(frame_no)
+            if rows is None:
+                continue
+            merged[frame_no] = {}
+            for car_id, entry in rows.items():
+                if car_id not in local_to_global:
+                    local_to_global[car_id] = next_id
+                    next_id += 1
+                merged[frame_no][local_to_global[car_id]] = entry
+
+        # Tracks seen only in the trailing window still need ids for the next match
+        for frame_boxes in track_boxes.values():
+            for car_id in frame_boxes:
+                if car_id not in local_to_global:
+                    local_to_global[car_id] = next_id
+                    next_id += 1
+        prev_global = local_to_global
+        prev_output = (results, track_boxes)
+    return merged
+
+
+def process_video_parallel(video_path, workers, overlap=None):
+    info = probe_video(video_path)
+    total_frames, fps = info['frames'], info['fps'] or 30.0
+    if total_frames <= 0:
+        raise RuntimeError(f"Could not determine frame count of {video_path}")
+    if overlap is None:
+        overlap = int(round(2 * fps))  # 2 seconds
+
+    segments = plan_segments(total_frames, workers, keyframe_indices(video_path, fps))
+    print(f"Processing {total_frames} frames in {len(segments)} segments with {workers} workers, {overlap} frames overlap")
+    threads = max(1, thread_budget() // workers)
+    # spawn: workers must not inherit torch/OpenMP state from the parent
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=init_segment_worker, initargs=(threads, _new_tracker)) as pool:
+        futures = [pool.submit(_process_segment, video_path, start, end, overlap) for start, end in segments]
+        outputs = []
+        for future in futures:
+            results, track_boxes, segment_stats = future.result()
+            job_stats.STATS.merge(segment_stats)
+            outputs.append((results, track_boxes))
+    return stitch_segments(segments, outputs, overlap)
@@ -1,10 +1,11 @@
 import os
-from ultralytics import YOLO
-import cv2
-import numpy as np
 import sys
-import torch
-from util import get_car, read_license_plate, write_csv
+import time
+from util import get_car, prepare_license_plate_crop, read_license_plate, write_csv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_loader import cuda_available, load_model
+import job_stats
 
 class Tracker:
     # 2: 'car',
@@ -15,25 +16,72 @@ class Tracker:
         # load models
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         req_dir = os.path.join(base_dir, 'Models')
-        self.device = 0 if torch.cuda.is_available() else 'cpu'
-        self.vehicle_detection_model = YOLO(os.path.join(req_dir, "yolov8x.pt"))
-        self.license_plate_detector = YOLO(os.path.join(req_dir, "License-Plate.pt"))
-        try:
-            # move models to GPU when available
-            if self.device == 0:
-                self.vehicle_detection_model.to('cuda')
-                self.license_plate_detector.to('cuda')
-        except Exception:
-            pass
+        self.device = 0 if cuda_available() else 'cpu'
+        # exported CPU runtime when available, PyTorch (moved to GPU if present) otherwise
+        self.vehicle_detection_model = load_model(os.path.join(req_dir, "yolov8x.pt"), pipeline='anpr')
+        self.license_plate_detector = load_model(os.path.join(req_dir, "License-Plate.pt"), pipeline='anpr')
         self.results = {}
+        # frame_no -> {track_id: bbox}, only filled for frames inside track_windows
+        self.track_boxes = {}
         self.vehicles = [2, 3, 5, 7]
 
-    def process_video(self, frames):
+    def reset_tracking(self):
+        # Drop tracker state and restart track ids, as for a fresh video
+        predictor = getattr(self.vehicle_detection_model, 'predictor', None)
+        for tracker in getattr(predictor, 'trackers', None) or []:
+            tracker.reset()
+        self.results = {}
+        self.track_boxes = {}
+
+    def tracker_state(self):
+        """Picklable ultralytics tracker state plus the global track id counter."""
+        from ultralytics.trackers.basetrack import BaseTrack
+        predictor = getattr(self.vehicle_detection_model, 'predictor', None)
+        return {'trackers': getattr(predictor, 'trackers', None), 'track_count': BaseTrack._count}
+
+    def restore_tracker_state(self, state):
+        from ultralytics.trackers.basetrack import BaseTrack
+        BaseTrack._count = state['track_count']
+        trackers = state['trackers']
+        if not trackers:
+            return
+
+        # The predictor is created on the first track() call; hand it the saved
+        # trackers before ultralytics' own on_predict_start would create new ones
+        def on_predict_start(predictor):
+            if not hasattr(predictor, 'trackers'):
+                predictor.trackers = trackers
+                predictor.vid_path = [None] * len(trackers)
+        predictor = getattr(self.vehicle_detection_model, 'predictor', None)
+        if predictor is not None:
+            predictor.trackers = trackers
+        else:
+            self.vehicle_detection_model.add_callback('on_predict_start', on_predict_start)
+
+    def resume(self, checkpoint):
+        """Load results and tracker state from `checkpoint`; returns the frame to continue from."""
+        loaded = checkpoint.load()
+        if loaded is None:
+            return 0
+        next_frame, results, tracker_state = loaded
+        self.results = results
+        try:
+            self.restore_tracker_state(tracker_state)
+        except Exception as e:
+            print(f"Could not restore tracker state, tracks restart at frame {next_frame}: {e}")
+        print(f"Resuming from checkpoint at frame {next_frame}")
+        return next_frame
+
+    def process_video(self, frames, start_frame=0, track_windows=None, write=True, checkpoint=None, results_dir=None):
 
-        for frame_no, frame in enumerate(frames):
+        start = time.perf_counter()
+        for frame_no, frame in enumerate(frames, start=start_frame):
             self.results[frame_no] = {}
+            record_tracks = track_windows is not None and any(lo <= frame_no < hi for lo, hi in track_windows)
 
-            detections = self.vehicle_detection_model.track(frame, persist=True, device=self.device, verbose=False)[0]
+            job_stats.count('frames')
+            with job_stats.timer('inference'):
+                detections = self.vehicle_detection_model.track(frame, persist=True, device=self.device, verbose=False)[0]
             class_names = detections.names
             detections_ = []
 
@@ -45,10 +93,13 @@ class Tracker:
 
                 if int(obj_class_id) in self.vehicles:
                     detections_.append([x1, y1, x2, y2, track_id, object_class_name])
+                    if record_tracks:
+                        self.track_boxes.setdefault(frame_no, {})[track_id] = [x1, y1, x2, y2]
 
 
             
-            license_plates = self.license_plate_detector(frame, device=self.device, verbose=False)[0]
+            with job_stats.timer('inference'):
+                license_plates = self.license_plate_detector(frame, device=self.device, verbose=False)[0]
             for license_plate in license_plates.boxes.data.tolist():
                 x1, y1, x2, y2, score, class_id = license_plate
                 xcar1, ycar1, xcar2, ycar2, car_id, car_class = get_car(license_plate, detections_)
@@ -56,15 +107,10 @@ class Tracker:
 
                 if car_id != -1:
 
-                    license_plate_crop = frame[int(y1):int(y2), int(x1): int(x2), :]
+                    license_plate_crop_thresh = prepare_license_plate_crop(frame, x1, y1, x2, y2)
 
-                    sharpen_kernel = np.array([[-1, -1, -1], [-1, 10, -1], [-1, -1, -1]])
-                    license_plate_crop_thresh = cv2.filter2D(license_plate_crop, -1, sharpen_kernel)
-
-                    license_plate_crop_thresh = 255 - license_plate_crop_thresh
-
-
-                    license_plate_text, license_plate_text_score = read_license_plate(license_plate_crop_thresh)
+                    with job_stats.timer('ocr'):
+                        license_plate_text, license_plate_text_score = read_license_plate(license_plate_crop_thresh)
                     if license_plate_text is not None:
                         self.results[frame_no][car_id] = {'car': {'bbox': [xcar1, ycar1, xcar2, ycar2],
                                                                   'obj_class':car_class},
@@ -72,8 +118,21 @@ class Tracker:
                                                                         'text': license_plate_text,
                                                                         'bbox_score': score,
                                                                         'text_score': license_plate_text_score}}
-            
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        results_dir = os.path.join(base_dir, 'Data', 'ANPR-ATCC', 'Results')
+
+            if checkpoint is not None and checkpoint.due(frame_no):
+                checkpoint.save(frame_no + 1, self.results, self.tracker_state())
+
+        if checkpoint is not None and checkpoint.saves:
+            elapsed = time.perf_counter() - start
+            print(f"{checkpoint.saves} checkpoints took {checkpoint.seconds:.2f}s "
+                  f"({100 * checkpoint.seconds / max(elapsed, 1e-9):.2f}% of processing time)")
+
+        if not write:
+            return self.results
+
+        if results_dir is None:
+            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            results_dir = os.path.join(base_dir, 'Data', 'ANPR-ATCC', 'Results')
         os.makedirs(results_dir, exist_ok=True)
-        write_csv(self.results, os.path.join(results_dir, 'main.csv'))
\ No newline at end of file
+        write_csv(self.results, os.path.join(results_dir, 'main.csv'))
+        return self.results
\ No newline at end of file
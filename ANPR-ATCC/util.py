@@ -1,8 +1,26 @@
+import os
+import sys
 import string
-import easyocr
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_loader import STUB_MODELS, cuda_available
+
+# The OCR reader is built on first use; constructing it takes seconds
+reader = None
+
+
+def get_reader():
+    global reader
+    if reader is None and STUB_MODELS:
+        from stub_models import StubReader
+        reader = StubReader()
+    if reader is None:
+        import easyocr
+        reader = easyocr.Reader(['en'], gpu=cuda_available())
+    return reader
 
-# Initialize the OCR reader
-reader = easyocr.Reader(['en'], gpu=True)
 
 # Mapping dictionaries for character conversion
 dict_char_to_int = {'O': '0',
@@ -89,12 +107,19 @@ def format_license(text):
     return license_plate_
 
 
+def prepare_license_plate_crop(frame, x1, y1, x2, y2):
+
+    license_plate_crop = frame[int(y1):int(y2), int(x1): int(x2), :]
+
+    sharpen_kernel = np.array([[-1, -1, -1], [-1, 10, -1], [-1, -1, -1]])
+    license_plate_crop_thresh = cv2.filter2D(license_plate_crop, -1, sharpen_kernel)
+
+    return 255 - license_plate_crop_thresh
+
+
 def read_license_plate(license_plate_crop):
     
-    if reader is None:
-        return "None", 0.0
-
-    detections = reader.readtext(license_plate_crop)
+    detections = get_reader().readtext(license_plate_crop)
 
     for detection in detections:
         bbox, text, score = detection
@@ -1,15 +1,20 @@
+import os
+import sys
 import cv2
 
-def read_video(video_path):
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frame_source import FrameSource
 
-    cap = cv2.VideoCapture(video_path)
+
+def read_video(video_path, size=None, fps=None):
+
+    # Every frame gets its own buffer since all of them are kept
+    source = FrameSource(video_path, size=size, fps=fps, reuse_buffer=False)
     frames = []
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    for frame in source:
         frames.append(frame)
+    source.release()
     return frames
 
 
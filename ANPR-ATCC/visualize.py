@@ -1,16 +1,27 @@
 import os
 import ast
+import argparse
+import time
 import cv2
 import numpy as np
 import pandas as pd
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import job_stats
 
 base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 data_dir = os.path.join(base_dir, 'Data', 'ANPR-ATCC')
-results_dir = os.path.join(data_dir, 'Results')
+parser = argparse.ArgumentParser(description="Draw the interpolated ANPR-ATCC results onto the input video")
+parser.add_argument('--video', type=str, default=os.path.join(data_dir, 'anpr_atcc.mp4'), help="Input video")
+parser.add_argument('--results', type=str, default=os.path.join(data_dir, 'Results'),
+                    help="Directory with Interpolated_Results; output_annotated.webm is written there")
+args = parser.parse_args()
+results_dir = args.results
 interpolated_dir = os.path.join(results_dir, 'Interpolated_Results')
 
 interp_csv_path = os.path.join(interpolated_dir, 'vehicle_testing.csv')
-input_video_path = os.path.join(data_dir, 'anpr_atcc.mp4')
+input_video_path = args.video
 output_video_path = os.path.join(results_dir, 'output_annotated.webm')
 
 if not os.path.isfile(interp_csv_path):
@@ -46,9 +57,11 @@ frame_nmr = -1
 cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
 ret = True
 while ret:
-    ret, frame = cap.read()
+    with job_stats.timer('decode'):
+        ret, frame = cap.read()
     frame_nmr += 1
     if ret:
+        draw_start = time.perf_counter()
         df_ = results[results['frame_nmr'] == frame_nmr]
         for row_indx in range(len(df_)):
             car_x1, car_y1, car_x2, car_y2 = ast.literal_eval(df_.iloc[row_indx]['car_bbox'].replace('[ ', '[').replace('   ', ' ').replace('  ', ' ').replace(' ', ','))
@@ -74,6 +87,8 @@ while ret:
                             2)
             except:
                 pass
-        out.write(frame)
+        job_stats.add_time('draw', time.perf_counter() - draw_start)
+        with job_stats.timer('encode'):
+            out.write(frame)
 out.release()
 cap.release()
\ No newline at end of file
@@ -1,39 +1,113 @@
 import cv2
 import os
+import sys
+import shutil
+import tempfile
 import argparse
-from ultralytics import YOLO
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 
-def detect_accident(video_path, model_path=None, output_path=None, conf_threshold=0.5):
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frame_source import FrameSource, parse_size, probe_video, ffmpeg_available
+from segments import keyframe_indices, plan_segments, concat_videos, init_segment_worker, segment_worker
+from model_loader import load_model
+from job_runner import configure_threads, thread_budget
+import job_stats
+
+# Check if the detected class is related to accident
+# Adjust this list based on your specific model's class names
+ACCIDENT_CLASSES = ['accident', 'crash', 'collision', 'Accident', 'Severe']
+
+def find_accidents(model, frame, conf_threshold, draw=True):
+    # Run inference
+    with job_stats.timer('inference'):
+        results = model(frame, conf=conf_threshold, verbose=False)
+
+    accident_detected = False
+
+    # Visualize results
+    for result in results:
+        boxes = result.boxes
+        for box in boxes:
+            # Get class ID and name
+            cls_id = int(box.cls[0])
+            cls_name = model.names[cls_id]
+
+            # Debug: Print what is detected
+            # print(f"Detected: {cls_name} with confidence {box.conf[0]:.2f}")
+
+            if cls_name in ACCIDENT_CLASSES:
+                accident_detected = True
+                if not draw:
+                    continue
+
+                # Draw bounding box
+                with job_stats.timer('draw'):
+                    x1, y1, x2, y2 = map(int, box.xyxy[0])
+                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
+                    cv2.putText(frame, f"{cls_name} {box.conf[0]:.2f}", (x1, y1 - 10),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
+    return accident_detected
+
+def draw_alert(frame, width, height):
+    # Create a red overlay
+    overlay = frame.copy()
+    cv2.rectangle(overlay, (0, 0), (width, height), (0, 0, 255), -1)
+    alpha = 0.3  # Transparency factor
+    frame = cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0)
+
+    # Add flashing text
+    cv2.putText(frame, "ACCIDENT DETECTED!", (50, 100),
+                cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255), 5, cv2.LINE_AA)
+    cv2.putText(frame, "ACCIDENT DETECTED!", (50, 100),
+                cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 2, cv2.LINE_AA)
+    return frame
+
+def detect_accident(video_path, model_path=None, output_path=None, conf_threshold=0.5,
+                    analysis_size=None, analysis_fps=None, workers=1):
 
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     default_model_path = os.path.join(base_dir, 'Models', 'accident_detector.pt')
     if model_path is None:
         model_path = default_model_path
+
+    if workers > 1 and output_path:
+        if ffmpeg_available():
+            if detect_accident_parallel(video_path, model_path, output_path, conf_threshold,
+                                        analysis_size, analysis_fps, workers):
+                return
+            print("Segment-parallel run failed, falling back to serial processing")
+        else:
+            print("ffmpeg not found, segment-parallel mode disabled")
+
     try:
         # Load the YOLO model
         print(f"Loading model from {model_path}...")
-        model = YOLO(model_path)
+        model = load_model(model_path, pipeline='accident')
+        print(f"Inference backend: {model.inference_backend} {model.inference_precision}")
+        configure_threads()
     except Exception as e:
         print(f"Error loading model: {e}")
         return
 
-    # Open the video file  
-    cap = cv2.VideoCapture(video_path)
+    # Open the video file (scaling and frame-rate sampling happen in the decoder)
+    cap = FrameSource(video_path, size=analysis_size, fps=analysis_fps)
     if not cap.isOpened():
         print(f"Error: Could not open video file {video_path}")
         return
 
     # Get video properties for saving output (optional, but good practice)
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = max(1, int(cap.get(cv2.CAP_PROP_FPS)))
+    width = cap.width
+    height = cap.height
+    fps = max(1, int(cap.fps))
 
     if width <= 0 or height <= 0:
         print("Error: Invalid video dimensions")
         return
 
-    print(f"Video opened: {cap.isOpened()}, {width}x{height} @ {fps}fps")
+    print(f"Video opened: {cap.isOpened()}, {width}x{height} @ {fps}fps ({cap.backend} decoder)")
 
     print(f"Processing video: {video_path}")
     if not output_path:
@@ -43,7 +117,7 @@ def detect_accident(video_path, model_path=None, output_path=None, conf_threshol
     out = None
     if output_path:
         # Use vp80 codec for WebM (better compatibility with openCV headless)
-        fourcc = cv2.VideoWriter_fourcc(*'vp80') 
+        fourcc = cv2.VideoWriter_fourcc(*'vp80')
         out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
         print(f"Writer opened: {out.isOpened()}")
         if not out.isOpened():
@@ -62,37 +136,11 @@ def detect_accident(video_path, model_path=None, output_path=None, conf_threshol
             print(f"End of video or error reading frame at {frame_count}")
             break
         frame_count += 1
+        job_stats.count('frames')
         if frame_count % 30 == 0:
             print(f"Processing frame {frame_count}...")
 
-        # Run inference
-        results = model(frame, conf=conf_threshold, verbose=False)
-
-        accident_detected = False
-        
-        # Visualize results
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                # Get class ID and name
-                cls_id = int(box.cls[0])
-                cls_name = model.names[cls_id]
-                
-                # Check if the detected class is related to accident
-                # Adjust this list based on your specific model's class names
-                accident_classes = ['accident', 'crash', 'collision', 'Accident', 'Severe'] 
-                
-                # Debug: Print what is detected
-                # print(f"Detected: {cls_name} with confidence {box.conf[0]:.2f}")
-
-                if cls_name in accident_classes:
-                    accident_detected = True
-                    
-                    # Draw bounding box
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
-                    cv2.putText(frame, f"{cls_name} {box.conf[0]:.2f}", (x1, y1 - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
+        accident_detected = find_accidents(model, frame, conf_threshold)
 
         # Update alert timer
         if accident_detected:
@@ -101,22 +149,14 @@ def detect_accident(video_path, model_path=None, output_path=None, conf_threshol
         # Display Red Alert if timer is active
         if alert_frames > 0:
             alert_frames -= 1
-            # Create a red overlay
-            overlay = frame.copy()
-            cv2.rectangle(overlay, (0, 0), (width, height), (0, 0, 255), -1)
-            alpha = 0.3  # Transparency factor
-            frame = cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0)
-            
-            # Add flashing text
-            cv2.putText(frame, "ACCIDENT DETECTED!", (50, 100),
-                        cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255), 5, cv2.LINE_AA)
-            cv2.putText(frame, "ACCIDENT DETECTED!", (50, 100),
-                        cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 2, cv2.LINE_AA)
+            with job_stats.timer('draw'):
+                frame = draw_alert(frame, width, height)
 
         # Show the frame
         # Write frame to output video
         if out:
-            out.write(frame)
+            with job_stats.timer('encode'):
+                out.write(frame)
 
         # Show the frame only if not running in headless mode (no output path or explicit flag)
         if not output_path:
@@ -128,7 +168,94 @@ def detect_accident(video_path, model_path=None, output_path=None, conf_threshol
     cap.release()
     if out:
         out.release()
-    cv2.destroyAllWindows()
+    if not output_path:
+        cv2.destroyAllWindows()
+
+# Segment-parallel mode: each pool worker loads the model once and processes
+# keyframe-aligned segments into their own WebM part, which are then joined
+# with the ffmpeg concat demuxer.
+def _process_segment(video_path, start, end, part_path, conf_threshold, analysis_size, analysis_fps):
+    job_stats.STATS.reset()
+    cap = FrameSource(video_path, size=analysis_size, fps=analysis_fps)
+    width, height = cap.width, cap.height
+    fps = max(1, int(cap.fps))
+    step = cap.step
+    model = segment_worker()
+    alert_duration = 10 * fps
+
+    # Alert state at `start` only depends on the previous `alert_duration`
+    # frames, so replay detection over that window to carry it over
+    alert_frames = 0
+    lead_start = max(0, int(round(start - alert_duration * step)))
+    if lead_start < start:
+        lead = FrameSource(video_path, size=analysis_size, fps=analysis_fps, start_frame=lead_start,
+                           max_frames=int(round((start - lead_start) / step)))
+        for frame in lead:
+            if find_accidents(model, frame, conf_threshold, draw=False):
+                alert_frames = alert_duration
+            if alert_frames > 0:
+                alert_frames -= 1
+        lead.release()
+
+    cap = FrameSource(video_path, size=analysis_size, fps=analysis_fps, start_frame=start,
+                      max_frames=int(round((end - start) / step)))
+    out = cv2.VideoWriter(part_path, cv2.VideoWriter_fourcc(*'vp80'), fps, (width, height))
+    if not out.isOpened():
+        raise RuntimeError(f"Could not open video writer for {part_path}")
+
+    frame_count = 0
+    for frame in cap:
+        frame_count += 1
+        if find_accidents(model, frame, conf_threshold):
+            alert_frames = alert_duration
+        if alert_frames > 0:
+            alert_frames -= 1
+            with job_stats.timer('draw'):
+                frame = draw_alert(frame, width, height)
+        with job_stats.timer('encode'):
+            out.write(frame)
+    out.release()
+    cap.release()
+    job_stats.count('frames', frame_count)
+    print(f"Segment {start}-{end}: {frame_count} frames")
+    return frame_count, job_stats.STATS.snapshot()
+
+def detect_accident_parallel(video_path, model_path, output_path, conf_threshold=0.5,
+                             analysis_size=None, analysis_fps=None, workers=2):
+    info = probe_video(video_path)
+    total_frames, src_fps = info['frames'], info['fps'] or 30.0
+    if total_frames <= 0:
+        print("Error: Could not determine frame count for segment-parallel mode")
+        return False
+
+    segments = plan_segments(total_frames, workers, keyframe_indices(video_path, src_fps))
+    print(f"Processing {total_frames} frames in {len(segments)} segments with {workers} workers")
+
+    part_dir = tempfile.mkdtemp(prefix=f"{os.path.basename(output_path)}.segments_", dir=os.path.dirname(os.path.abspath(output_path)))
+    part_paths = [os.path.join(part_dir, f"part_{i:04d}.webm") for i in range(len(segments))]
+    # Split this job's thread budget (ITS_NUM_THREADS, set by the job runner) between the workers
+    threads = max(1, thread_budget() // workers)
+    try:
+        # spawn: workers must not inherit torch/OpenMP state from the parent
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=init_segment_worker,
+                                 initargs=(threads, partial(load_model, model_path, pipeline='accident'))) as pool:
+            futures = [pool.submit(_process_segment, video_path, start, end, part_path,
+                                   conf_threshold, analysis_size, analysis_fps)
+                       for (start, end), part_path in zip(segments, part_paths)]
+            frame_count = 0
+            for future in futures:
+                segment_frames, segment_stats = future.result()
+                frame_count += segment_frames
+                job_stats.STATS.merge(segment_stats)
+        print(f"Processed {frame_count} frames, joining segments")
+        return concat_videos(part_paths, output_path)
+    except Exception as e:
+        print(f"Error in segment-parallel processing: {e}")
+        return False
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Accident Detection using YOLO")
@@ -138,7 +265,10 @@ if __name__ == "__main__":
     parser.add_argument("--model", type=str, default=default_model_path, help="Path to the YOLO model file")
     parser.add_argument("--output", type=str, default=None, help="Path to save the output video")
     parser.add_argument("--conf", type=float, default=0.5, help="Confidence threshold")
+    parser.add_argument("--size", type=str, default=None, help="Analysis resolution as WIDTHxHEIGHT (default: source)")
+    parser.add_argument("--fps", type=float, default=None, help="Analysis frame rate (default: source)")
+    parser.add_argument("--workers", type=int, default=1, help="Process keyframe-aligned segments in N parallel workers")
 
     args = parser.parse_args()
 
-    detect_accident(args.video, args.model, args.output, args.conf)
+    detect_accident(args.video, args.model, args.output, args.conf, parse_size(args.size), args.fps, args.workers)
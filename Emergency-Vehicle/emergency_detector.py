@@ -1,9 +1,17 @@
 import cv2
 import os
+import sys
+import time
 import argparse
-from ultralytics import YOLO
 
-def detect_emergency(video_path, model_path=None, output_path=None, conf_threshold=0.5):
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frame_source import FrameSource, parse_size
+from model_loader import load_model
+from job_runner import configure_threads
+import job_stats
+
+def detect_emergency(video_path, model_path=None, output_path=None, conf_threshold=0.5,
+                     analysis_size=None, analysis_fps=None):
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     default_model_path = os.path.join(base_dir, 'Models', 'Emergency_Vechicle_Detection.pt')
     fallback_model_path = "yolov8n.pt"
@@ -16,25 +24,27 @@ def detect_emergency(video_path, model_path=None, output_path=None, conf_thresho
 
     try:
         print(f"Loading model from {model_path}...")
-        model = YOLO(model_path)
+        model = load_model(model_path, pipeline='emergency')
+        print(f"Inference backend: {model.inference_backend} {model.inference_precision}")
+        configure_threads()
     except Exception as e:
         print(f"Error loading model: {e}")
         return
 
-    cap = cv2.VideoCapture(video_path)
+    cap = FrameSource(video_path, size=analysis_size, fps=analysis_fps)
     if not cap.isOpened():
         print(f"Error: Could not open video file {video_path}")
         return
 
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = max(1, int(cap.get(cv2.CAP_PROP_FPS)))
+    width = cap.width
+    height = cap.height
+    fps = max(1, int(cap.fps))
 
     if width <= 0 or height <= 0:
         print("Error: Invalid video dimensions")
         return
 
-    print(f"Video opened: {width}x{height} @ {fps}fps")
+    print(f"Video opened: {width}x{height} @ {fps}fps ({cap.backend} decoder)")
 
     out = None
     if output_path:
@@ -69,13 +79,16 @@ def detect_emergency(video_path, model_path=None, output_path=None, conf_thresho
             break
             
         frame_count += 1
+        job_stats.count('frames')
         if frame_count % 30 == 0:
             print(f"Processing frame {frame_count}...")
 
         # Run tracking (model.track on single frame returns a list of Results)
-        results = model.track(frame, persist=True, conf=conf_threshold, verbose=False)
+        with job_stats.timer('inference'):
+            results = model.track(frame, persist=True, conf=conf_threshold, verbose=False)
         result = results[0]
         
+        draw_start = time.perf_counter()
         boxes = result.boxes
         if boxes is not None and len(boxes) > 0:
             # Batch extraction of attributes as numpy arrays for faster iteration
@@ -106,14 +119,15 @@ def detect_emergency(video_path, model_path=None, output_path=None, conf_thresho
                         cv2.rectangle(frame, (x1, y1), (x2, y2), color, thickness)
                         cv2.putText(frame, label, (x1, max(y1 - 10, 0)),
                                     cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+        job_stats.add_time('draw', time.perf_counter() - draw_start)
 
         if out:
-            out.write(frame)
+            with job_stats.timer('encode'):
+                out.write(frame)
 
     cap.release()
     if out:
         out.release()
-    cv2.destroyAllWindows()
     print("Done processing emergency video.")
 
 if __name__ == "__main__":
@@ -122,5 +136,7 @@ if __name__ == "__main__":
     parser.add_argument("--model", type=str, default=None, help="Path to the YOLO model file")
     parser.add_argument("--output", type=str, default=None, help="Path to save the output video")
     parser.add_argument("--conf", type=float, default=0.5, help="Confidence threshold")
+    parser.add_argument("--size", type=str, default=None, help="Analysis resolution as WIDTHxHEIGHT (default: source)")
+    parser.add_argument("--fps", type=float, default=None, help="Analysis frame rate (default: source)")
     args = parser.parse_args()
-    detect_emergency(args.video, args.model, args.output, args.conf)
+    detect_emergency(args.video, args.model, args.output, args.conf, parse_size(args.size), args.fps)
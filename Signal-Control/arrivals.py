@@ -0,0 +1,169 @@
+import os
+import csv
+import math
+import bisect
+import argparse
+from collections import Counter
+
+from simulation import assign_lane, VEHICLE_TYPES, NO_OF_SIGNALS
+
+# Arrival generators for Simulation(arrivals=...) besides the original
+# LegacyArrivals: Poisson arrivals with per-approach rates, an optional
+# time-of-day schedule and a class mix, and replay of the vehicles recorded by
+# ANPR-ATCC (vehicle_testing.csv). Like LegacyArrivals they draw only from the
+# simulation's random generator, so a seed reproduces a run exactly.
+#
+#   python arrivals.py ../Data/ANPR-ATCC/Results/Interpolated_Results/vehicle_testing.csv
+
+CLASS_INDEX = {name: index for index, name in VEHICLE_TYPES.items()}
+# Vehicle mix of the original generator
+UNIFORM_MIX = {name: 1 for name in CLASS_INDEX}
+# COCO names in ANPR-ATCC results -> simulator classes
+TRACE_CLASSES = {'car': 'car', 'motorcycle': 'bike', 'bus': 'bus', 'truck': 'truck'}
+TRACE_FPS = 30
+
+
+def _cumulative(weights):
+    total = float(sum(weights))
+    cumulative, running = [], 0.0
+    for weight in weights:
+        running += weight / total
+        cumulative.append(running)
+    return cumulative
+
+
+def _pick(rng, cumulative):
+    return min(bisect.bisect_right(cumulative, rng.random()), len(cumulative) - 1)
+
+
+def _poisson(rng, mean):
+    """Knuth's method; `mean` is small (arrivals per tick)."""
+    limit = math.exp(-mean)
+    count, product = 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+class PoissonArrivals:
+    """Poisson arrivals per approach. `rates` are vehicles per hour for right,
+    down, left and up; `schedule` is a list of (start second, factors) that
+    scale the rates from that time on (e.g. a peak hour), with one factor for
+    all approaches or one per approach; `mix` weights the vehicle classes
+    (default: uniform, as the original generator)."""
+
+    def __init__(self, rates, mix=None, schedule=None):
+        if len(rates) != NO_OF_SIGNALS:
+            raise ValueError(f"Expected {NO_OF_SIGNALS} rates, got {len(rates)}")
+        mix = mix or UNIFORM_MIX
+        unknown = set(mix) - set(CLASS_INDEX)
+        if unknown:
+            raise ValueError(f"Unknown vehicle classes: {', '.join(sorted(unknown))}")
+        self.rates = [float(rate) for rate in rates]
+        self.classes = [CLASS_INDEX[name] for name in mix]
+        self.class_cumulative = _cumulative(list(mix.values()))
+        self.schedule = []
+        for start, factors in sorted(schedule or [(0, 1.0)], key=lambda entry: entry[0]):
+            if isinstance(factors, (int, float)):
+                factors = [factors] * NO_OF_SIGNALS
+            if len(factors) != NO_OF_SIGNALS:
+                raise ValueError(f"Expected 1 or {NO_OF_SIGNALS} factors at {start}s, got {len(factors)}")
+            self.schedule.append((start, [float(f) for f in factors]))
+        self.schedule_starts = [start for start, _ in self.schedule]
+
+    def factors(self, seconds):
+        """Rate factor of each approach at `seconds`."""
+        i = bisect.bisect_right(self.schedule_starts, seconds) - 1
+        return self.schedule[i][1] if i >= 0 else [0.0] * NO_OF_SIGNALS
+
+    def take(self, rng, tick, ticks_per_second):
+        factors = self.factors(tick / ticks_per_second)
+        vehicles = []
+        for direction_number, rate in enumerate(self.rates):
+            for _ in range(_poisson(rng, rate * factors[direction_number] / 3600 / ticks_per_second)):
+                vehicle_type = self.classes[_pick(rng, self.class_cumulative)]
+                lane, will_turn = assign_lane(rng, vehicle_type)
+                vehicles.append((lane, vehicle_type, direction_number, will_turn))
+        return vehicles
+
+
+class TraceArrivals:
+    """Replay of recorded arrivals: `events` are (seconds, class name) pairs.
+    Each vehicle goes to `approach` (a direction number) or, if None, to a
+    direction drawn with `direction_split` weights. `speedup` compresses the
+    trace and `repeat` replays it back to back, to stress the controller with
+    recorded volumes."""
+
+    def __init__(self, events, approach=None, direction_split=(1, 1, 1, 1), speedup=1.0, repeat=False):
+        events = sorted((seconds / speedup, name) for seconds, name in events)
+        if not events:
+            raise ValueError("The trace has no vehicles")
+        self.times = [seconds for seconds, _ in events]
+        self.types = [CLASS_INDEX[name] for _, name in events]
+        self.approach = approach
+        self.direction_cumulative = _cumulative(direction_split)
+        self.repeat = repeat
+        self.period = self.times[-1] + 1.0
+
+    @classmethod
+    def from_csv(cls, path, fps=TRACE_FPS, **kwargs):
+        """Vehicles of an ANPR-ATCC vehicle_testing.csv: one per car_id, arriving at
+        its first frame, with its most frequent detected class."""
+        first_frame, classes = {}, {}
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                car_id = int(float(row['car_id']))
+                frame = int(float(row['frame_nmr']))
+                first_frame[car_id] = min(frame, first_frame.get(car_id, frame))
+                name = TRACE_CLASSES.get(row.get('car_class', '').strip())
+                if name:
+                    classes.setdefault(car_id, Counter())[name] += 1
+        events = [(frame / fps, classes[car_id].most_common(1)[0][0] if car_id in classes else 'car')
+                  for car_id, frame in first_frame.items()]
+        return cls(events, **kwargs)
+
+    def _events(self, start, end):
+        """Indices of the events in [start, end) seconds of the replay."""
+        if not self.repeat:
+            return range(bisect.bisect_left(self.times, start), bisect.bisect_left(self.times, end))
+        # Split the window at every repeat that starts inside it
+        indices = []
+        k = math.floor(start / self.period)
+        while k * self.period < end:
+            offset = k * self.period
+            window_start, window_end = max(start, offset) - offset, min(end, offset + self.period) - offset
+            indices.extend(range(bisect.bisect_left(self.times, window_start),
+                                 bisect.bisect_left(self.times, window_end)))
+            k += 1
+        return indices
+
+    def take(self, rng, tick, ticks_per_second):
+        vehicles = []
+        for i in self._events(tick / ticks_per_second, (tick + 1) / ticks_per_second):
+            vehicle_type = self.types[i]
+            lane, will_turn = assign_lane(rng, vehicle_type)
+            direction_number = self.approach
+            if direction_number is None:
+                direction_number = _pick(rng, self.direction_cumulative)
+            vehicles.append((lane, vehicle_type, direction_number, will_turn))
+        return vehicles
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize an ANPR-ATCC trace as simulator arrivals")
+    parser.add_argument('csv', help="vehicle_testing.csv of an ANPR-ATCC job")
+    parser.add_argument('--fps', type=float, default=TRACE_FPS, help="Frame rate of the recorded video")
+    args = parser.parse_args()
+
+    trace = TraceArrivals.from_csv(args.csv, fps=args.fps)
+    duration = trace.times[-1] - trace.times[0]
+    counts = Counter(VEHICLE_TYPES[t] for t in trace.types)
+    print(f"{os.path.basename(args.csv)}: {len(trace.times)} vehicles over {duration:.1f}s "
+          f"({len(trace.times) / max(duration, 1.0) * 3600:.0f} per hour)")
+    for name, count in counts.most_common():
+        print(f"  {name}: {count}")
+
+
+if __name__ == '__main__':
+    main()
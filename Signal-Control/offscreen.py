@@ -0,0 +1,146 @@
+import os
+
+import cv2
+import numpy as np
+
+from simulation import (IMAGE_DIR, DIRECTION_NUMBERS, FALLBACK_SIZES, NO_OF_SIGNALS, SCREEN_WIDTH, SCREEN_HEIGHT,
+                        ROTATION_ANGLE, TURN_ANGLES, TURN_COS, TURN_SIN)
+
+# Headless renderer: draws the simulation straight into one preallocated BGR
+# frame that is handed to cv2.VideoWriter as is. Sprites are read once with
+# OpenCV, and every turning angle is rotated up front, so a frame costs one
+# background copy plus a masked copy per vehicle. The layout below is shared
+# with the pygame renderer of signalcontrol.py.
+
+# Coordinates of signal image, timer, and vehicle count
+signalCoods = [(530,230),(810,230),(810,570),(530,570)]
+signalTimerCoods = [(530,210),(810,210),(810,550),(530,550)]
+vehicleCountCoods = [(480,210),(880,210),(880,550),(480,550)]
+timeElapsedCoods = (1100,50)
+
+# Placeholder colours (RGB) of setup_assets.py, for images that cannot be loaded
+VEHICLE_COLORS = {'car': (0, 0, 255), 'bus': (255, 255, 0), 'truck': (255, 0, 255), 'rickshaw': (255, 165, 0), 'bike': (0, 255, 0)}
+SIGNAL_COLORS = {'red': (255, 0, 0), 'yellow': (255, 255, 0), 'green': (0, 255, 0)}
+SIGNAL_SIZE = (30, 60)
+BACKGROUND_COLOR = (50, 50, 50)
+RED, YELLOW, GREEN = 0, 1, 2
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.6
+FONT_THICKNESS = 2
+
+
+def signal_states(controller):
+    """(RED/YELLOW/GREEN, timer text) of every signal, as shown next to it."""
+    states = []
+    for i, signal in enumerate(controller.signals):
+        if i == controller.current_green and controller.current_yellow == 1:
+            states.append((YELLOW, "STOP" if signal.yellow == 0 else signal.yellow))
+        elif i == controller.current_green:
+            states.append((GREEN, "SLOW" if signal.green == 0 else signal.green))
+        elif signal.red <= 10:
+            states.append((RED, "GO" if signal.red == 0 else signal.red))
+        else:
+            states.append((RED, "---"))
+    return states
+
+
+def _bgr(rgb):
+    return rgb[::-1]
+
+
+def load_sprite(path, size, color):
+    """(BGR image, mask or None when opaque) of the image at `path`, or a `size`
+    rectangle of `color` when it cannot be read."""
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        w, h = size
+        return np.full((h, w, 3), _bgr(color), dtype=np.uint8), None
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if image.shape[2] == 4:
+        return np.ascontiguousarray(image[:, :, :3]), image[:, :, 3:] > 127
+    return image, None
+
+
+def rotate_sprite(sprite, angle):
+    """`sprite` turned clockwise by `angle` degrees on the enlarged canvas that
+    pygame.transform.rotate(image, -angle) would produce."""
+    image, mask = sprite
+    h, w = image.shape[:2]
+    k = int(angle) // ROTATION_ANGLE
+    new_w = int(TURN_COS[k] * w + TURN_SIN[k] * h)
+    new_h = int(TURN_SIN[k] * w + TURN_COS[k] * h)
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), -angle, 1.0)
+    matrix[0, 2] += new_w / 2 - w / 2
+    matrix[1, 2] += new_h / 2 - h / 2
+    rotated = cv2.warpAffine(image, matrix, (new_w, new_h), flags=cv2.INTER_LINEAR)
+    if mask is None:
+        mask = np.ones((h, w), dtype=np.uint8)
+    rotated_mask = cv2.warpAffine(mask.reshape(h, w).astype(np.uint8), matrix, (new_w, new_h),
+                                  flags=cv2.INTER_NEAREST, borderValue=0)
+    return rotated, rotated_mask[:, :, None] > 0
+
+
+class OffscreenRenderer:
+    def __init__(self, width=SCREEN_WIDTH, height=SCREEN_HEIGHT):
+        self.width = width
+        self.height = height
+        background = cv2.imread(os.path.join(IMAGE_DIR, 'mod_int.png'), cv2.IMREAD_COLOR)
+        if background is None:
+            background = np.full((height, width, 3), _bgr(BACKGROUND_COLOR), dtype=np.uint8)
+        elif background.shape[:2] != (height, width):
+            background = cv2.resize(background, (width, height))
+        self.background = background
+        self.frame = np.empty_like(background)
+
+        self.signals = [load_sprite(os.path.join(IMAGE_DIR, 'signals', f"{name}.png"), SIGNAL_SIZE, SIGNAL_COLORS[name])
+                        for name in ('red', 'yellow', 'green')]
+        # (direction, class) -> sprite per rotation angle
+        self.sprites = {}
+        for direction in DIRECTION_NUMBERS.values():
+            for vehicleClass, (w, h) in FALLBACK_SIZES.items():
+                size = (h, w) if direction in ('up', 'down') else (w, h)
+                sprite = load_sprite(os.path.join(IMAGE_DIR, direction, f"{vehicleClass}.png"), size,
+                                     VEHICLE_COLORS[vehicleClass])
+                self.sprites[(direction, vehicleClass)] = {int(angle): rotate_sprite(sprite, angle) if angle else sprite
+                                                           for angle in TURN_ANGLES}
+
+    def blit(self, sprite, x, y):
+        image, mask = sprite
+        h, w = image.shape[:2]
+        x, y = int(x), int(y)
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, self.width), min(y + h, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        target = self.frame[y0:y1, x0:x1]
+        source = image[y0 - y:y1 - y, x0 - x:x1 - x]
+        if mask is None:
+            target[...] = source
+        else:
+            np.copyto(target, source, where=mask[y0 - y:y1 - y, x0 - x:x1 - x])
+
+    def text(self, text, position, color, background):
+        """Text on a filled box with its top left corner at `position`, like a pygame font render."""
+        (w, h), baseline = cv2.getTextSize(text, FONT, FONT_SCALE, FONT_THICKNESS)
+        x, y = position
+        cv2.rectangle(self.frame, (x, y), (x + w + 4, y + h + baseline + 4), _bgr(background), cv2.FILLED)
+        cv2.putText(self.frame, text, (x + 2, y + h + 2), FONT, FONT_SCALE, _bgr(color), FONT_THICKNESS, cv2.LINE_AA)
+
+    def render(self, sim):
+        """Draw `sim` into self.frame and return it; the same array is reused for
+        every frame, so write it out before rendering the next one."""
+        black = (0, 0, 0)
+        white = (255, 255, 255)
+        np.copyto(self.frame, self.background)
+        for i, (state, text) in enumerate(signal_states(sim.controller)):
+            self.blit(self.signals[state], *signalCoods[i])
+            self.text(str(text), signalTimerCoods[i], white, black)
+        for i in range(NO_OF_SIGNALS):
+            self.text(str(sim.crossed[i]), vehicleCountCoods[i], black, white)
+        self.text("Time Elapsed: " + str(sim.time_elapsed), timeElapsedCoods, black, white)
+
+        for direction, vehicleClass, angle, x, y in sim.sprites():
+            self.blit(self.sprites[(direction, vehicleClass)][angle], x, y)
+        return self.frame
@@ -0,0 +1,125 @@
+import os
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_EXCEPTION
+
+from simulation import Simulation, SIM_TIME, DETECTION_TIME
+
+# Predictive green times: when the formula has set the next green, fork the
+# simulation for each candidate duration, run every fork ahead over the same
+# horizon (forks share the random state, so they see the same arrivals) and
+# keep the candidate with the least total waiting. Rollouts run on a process
+# pool within a wall-clock budget; candidates that miss it are dropped, and
+# the formula's value is evaluated first so there is always a fallback.
+#
+#   python rollouts.py --seeds 3 --workers 4 --budget 1.0
+
+ROLLOUT_HORIZON = int(os.environ.get('ITS_SIGNAL_ROLLOUT_HORIZON', '90'))  # simulated seconds
+ROLLOUT_BUDGET = float(os.environ.get('ITS_SIGNAL_ROLLOUT_BUDGET', str(DETECTION_TIME)))  # wall seconds
+
+
+def rollout(state, signal_index, green_time, horizon, deadline=None):
+    """Waiting seconds over `horizon` from `state` (taken inside set_time) with
+    `green_time` for the next green, or None if `deadline` (time.time()) passed."""
+    sim = Simulation.from_snapshot(state)
+    sim.signals[signal_index].green = green_time
+    start = sim.delay_ticks
+    sim.advance()
+    end_tick = sim.tick + horizon * sim.ticks_per_second
+    while sim.tick < end_tick:
+        if deadline is not None and sim.tick % sim.ticks_per_second == 0 and time.time() > deadline:
+            return None
+        sim.step()
+    return (sim.delay_ticks - start) / sim.ticks_per_second
+
+
+class RolloutPlanner:
+    """Plan function for SignalController. `candidates` are green times in
+    seconds (default: minimum to maximum in steps of 5); workers=0 evaluates
+    them in this process."""
+
+    def __init__(self, candidates=None, horizon=ROLLOUT_HORIZON, budget=ROLLOUT_BUDGET, workers=None):
+        self.candidates = candidates
+        self.horizon = horizon
+        self.budget = budget
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.pool = None
+        self.decisions = []
+
+    def attach(self, sim):
+        sim.controller.plan = lambda signal_index, green_time: self.plan(sim, signal_index, green_time)
+        return sim
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def _candidates(self, signal, green_time):
+        candidates = self.candidates or range(signal.minimum, signal.maximum + 1, 5)
+        candidates = sorted({int(g) for g in candidates if signal.minimum <= g <= signal.maximum} - {green_time},
+                            key=lambda g: abs(g - green_time))
+        return [green_time] + candidates
+
+    def plan(self, sim, signal_index, green_time):
+        start = time.perf_counter()
+        deadline = time.time() + self.budget
+        state = sim.snapshot()
+        candidates = self._candidates(sim.signals[signal_index], green_time)
+        delays = {}
+        if self.workers:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            futures = {self.pool.submit(rollout, state, signal_index, g, self.horizon, deadline): g for g in candidates}
+            done, pending = wait(futures, timeout=max(0.0, deadline - time.time()), return_when=FIRST_EXCEPTION)
+            for future in pending:
+                future.cancel()
+            for future in done:
+                delays[futures[future]] = future.result()
+        else:
+            for g in candidates:
+                delays[g] = rollout(state, signal_index, g, self.horizon, deadline)
+        delays = {g: d for g, d in delays.items() if d is not None}
+        best = min(delays, key=delays.get) if delays else green_time
+        self.decisions.append({'time': sim.time_elapsed, 'signal': signal_index, 'formula': green_time,
+                               'chosen': best, 'evaluated': len(delays), 'candidates': len(candidates),
+                               'seconds': time.perf_counter() - start})
+        return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare formula and rollout-planned green times")
+    parser.add_argument('--seeds', type=int, default=3)
+    parser.add_argument('--time', type=int, default=SIM_TIME, help="Simulated seconds per run")
+    parser.add_argument('--horizon', type=int, default=ROLLOUT_HORIZON, help="Simulated seconds per rollout")
+    parser.add_argument('--budget', type=float, default=ROLLOUT_BUDGET, help="Wall seconds per decision")
+    parser.add_argument('--workers', type=int, default=None, help="Rollout processes (0: in this process)")
+    parser.add_argument('--candidates', type=int, nargs='+', default=None, help="Green times to try")
+    args = parser.parse_args()
+
+    planner = RolloutPlanner(args.candidates, args.horizon, args.budget, args.workers)
+    print(f"{'seed':>5}{'mode':>10}{'veh/s':>10}{'wait s':>10}{'max queue':>11}")
+    try:
+        for seed in range(args.seeds):
+            for mode in ('formula', 'rollout'):
+                sim = Simulation(sim_time=args.time, seed=seed)
+                if mode == 'rollout':
+                    planner.attach(sim)
+                summary = sim.run()
+                print(f"{seed:>5}{mode:>10}{summary['per_second']:>10.3f}{summary['average_wait']:>10.1f}"
+                      f"{summary['max_queue']:>11}")
+    finally:
+        planner.close()
+
+    decisions = planner.decisions
+    if decisions:
+        latency = sorted(d['seconds'] for d in decisions)
+        complete = sum(d['evaluated'] == d['candidates'] for d in decisions)
+        changed = sum(d['chosen'] != d['formula'] for d in decisions)
+        print(f"{len(decisions)} decisions: {changed} differ from the formula, {complete} evaluated every candidate, "
+              f"median {latency[len(latency) // 2]:.2f}s, max {latency[-1]:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
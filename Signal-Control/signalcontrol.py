@@ -1,90 +1,45 @@
-import random
-import math
-import time
-import threading
 import pygame
 import sys
 import os
 import cv2
 import numpy as np
 import argparse
-from ultralytics import YOLO
 
-
-defaultRed = 150
-defaultYellow = 5
-defaultGreen = 20
-defaultMinimum = 10
-defaultMaximum = 60
-
-signals = []
-noOfSignals = 4
-simTime = 300       
-timeElapsed = 0
-
-currentGreen = 0   
-nextGreen = (currentGreen+1)%noOfSignals
-currentYellow = 0   
-
-carTime = 2
-bikeTime = 1
-rickshawTime = 2.25 
-busTime = 2.5
-truckTime = 2.5
-
-noOfCars = 0
-noOfBikes = 0
-noOfBuses =0
-noOfTrucks = 0
-noOfRickshaws = 0
-noOfLanes = 2
-
-# Red signal time at which cars will be detected at a signal
-detectionTime = 5
-
-speeds = {'car':2.25, 'bus':1.8, 'truck':1.8, 'rickshaw':2, 'bike':2.5}  # average speeds of vehicles
-
-# Coordinates of start
-x = {'right':[0,0,0], 'down':[755,727,697], 'left':[1400,1400,1400], 'up':[602,627,657]}    
-y = {'right':[348,370,398], 'down':[0,0,0], 'left':[498,466,436], 'up':[800,800,800]}
-
-vehicles = {'right': {0:[], 1:[], 2:[], 'crossed':0}, 'down': {0:[], 1:[], 2:[], 'crossed':0}, 'left': {0:[], 1:[], 2:[], 'crossed':0}, 'up': {0:[], 1:[], 2:[], 'crossed':0}}
-vehicleTypes = {0:'car', 1:'bus', 2:'truck', 3:'rickshaw', 4:'bike'}
-directionNumbers = {0:'right', 1:'down', 2:'left', 3:'up'}
-
-# Coordinates of signal image, timer, and vehicle count
-signalCoods = [(530,230),(810,230),(810,570),(530,570)]
-signalTimerCoods = [(530,210),(810,210),(810,550),(530,550)]
-vehicleCountCoods = [(480,210),(880,210),(880,550),(480,550)]
-vehicleCountTexts = ["0", "0", "0", "0"]
-
-# Coordinates of stop lines
-stopLines = {'right': 590, 'down': 330, 'left': 800, 'up': 535}
-defaultStop = {'right': 580, 'down': 320, 'left': 810, 'up': 545}
-stops = {'right': [580,580,580], 'down': [320,320,320], 'left': [810,810,810], 'up': [545,545,545]}
-
-mid = {'right': {'x':705, 'y':445}, 'down': {'x':695, 'y':450}, 'left': {'x':695, 'y':425}, 'up': {'x':695, 'y':400}}
-rotationAngle = 3
-
-# Gap between vehicles
-gap = 15    # stopping gap
-gap2 = 15   # moving gap
-
-pygame.init()
-simulation = pygame.sprite.Group()
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frame_source import FrameSource, LatestFrameReader
+from model_loader import load_model
+from job_runner import configure_threads
+import job_stats
+from simulation import Simulation, SignalController, DIRECTION_NUMBERS, FALLBACK_SIZES, NO_OF_SIGNALS, SCREEN_WIDTH, SCREEN_HEIGHT
+from traffic_metrics import MetricsRecorder, npz_path
+from offscreen import (OffscreenRenderer, signal_states, signalCoods, signalTimerCoods, vehicleCountCoods,
+                       timeElapsedCoods, VEHICLE_COLORS, BACKGROUND_COLOR)
+
+# Signal timers and vehicles run on the simulated clock of simulation.py; the
+# GUI, the recording and detection mode only read its state. The recording
+# covers the first RECORD_SECONDS simulated seconds at its own frame rate
+# (--fps, by default the tick rate); headless, frames are drawn by the
+# offscreen renderer and the rest of the scenario is simulated without
+# rendering before the lane counts are printed. --metrics records the
+# per-tick time series of traffic_metrics.py; --metrics-only skips rendering
+# altogether.
+
+RECORD_SECONDS = 30
 
 class VehicleDetection:
-    def __init__(self, model_path):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path, batch=1):
+        # Exported models take a fixed batch: one frame per lane
+        self.model = load_model(model_path, pipeline='signal', batch=batch)
         self.class_list = [2, 3, 5, 7] # car, motorcycle, bus, truck (COCO indices)
-        
-    def detect(self, frame):
-        results = self.model(frame, verbose=False)
-        counts = {'car': 0, 'bus': 0, 'truck': 0, 'rickshaw': 0, 'bike': 0}
-        
+
+    def detect(self, frames):
+        """(counts, result) of every frame, from one batched model call."""
+        with job_stats.timer('inference'):
+            results = self.model(frames, verbose=False)
+        detections = []
         for result in results:
-            boxes = result.boxes
-            for box in boxes:
+            counts = {'car': 0, 'bus': 0, 'truck': 0, 'rickshaw': 0, 'bike': 0}
+            for box in result.boxes:
                 cls = int(box.cls[0])
                 if cls == 2:
                     counts['car'] += 1
@@ -94,456 +49,199 @@ class VehicleDetection:
                     counts['bus'] += 1
                 elif cls == 7:
                     counts['truck'] += 1
-                    
-        return counts, results[0].plot()
-
-class TrafficSignal:
-    def __init__(self, red, yellow, green, minimum, maximum):
-        self.red = red
-        self.yellow = yellow
-        self.green = green
-        self.minimum = minimum
-        self.maximum = maximum
-        self.signalText = "30"
-        self.totalGreenTime = 0
-        
-class Vehicle(pygame.sprite.Sprite):
-    def __init__(self, lane, vehicleClass, direction_number, direction, will_turn):
-        pygame.sprite.Sprite.__init__(self)
-        self.lane = lane
-        self.vehicleClass = vehicleClass
-        self.speed = speeds[vehicleClass]
-        self.direction_number = direction_number
-        self.direction = direction
-        self.x = x[direction][lane]
-        self.y = y[direction][lane]
-        self.crossed = 0
-        self.willTurn = will_turn
-        self.turned = 0
-        self.rotateAngle = 0
-        vehicles[direction][lane].append(self)
-        # self.stop = stops[direction][lane]
-        self.index = len(vehicles[direction][lane]) - 1
-        path = "images/" + direction + "/" + vehicleClass + ".png"
-        self.originalImage = pygame.image.load(path)
-        self.currentImage = pygame.image.load(path)
-
-    
-        if(direction=='right'):
-            if(len(vehicles[direction][lane])>1 and vehicles[direction][lane][self.index-1].crossed==0):    # if more than 1 vehicle in the lane of vehicle before it has crossed stop line
-                self.stop = vehicles[direction][lane][self.index-1].stop - vehicles[direction][lane][self.index-1].currentImage.get_rect().width - gap         # setting stop coordinate as: stop coordinate of next vehicle - width of next vehicle - gap
-            else:
-                self.stop = defaultStop[direction]
-            # Set new starting and stopping coordinate
-            temp = self.currentImage.get_rect().width + gap    
-            x[direction][lane] -= temp
-            stops[direction][lane] -= temp
-        elif(direction=='left'):
-            if(len(vehicles[direction][lane])>1 and vehicles[direction][lane][self.index-1].crossed==0):
-                self.stop = vehicles[direction][lane][self.index-1].stop + vehicles[direction][lane][self.index-1].currentImage.get_rect().width + gap
-            else:
-                self.stop = defaultStop[direction]
-            temp = self.currentImage.get_rect().width + gap
-            x[direction][lane] += temp
-            stops[direction][lane] += temp
-        elif(direction=='down'):
-            if(len(vehicles[direction][lane])>1 and vehicles[direction][lane][self.index-1].crossed==0):
-                self.stop = vehicles[direction][lane][self.index-1].stop - vehicles[direction][lane][self.index-1].currentImage.get_rect().height - gap
-            else:
-                self.stop = defaultStop[direction]
-            temp = self.currentImage.get_rect().height + gap
-            y[direction][lane] -= temp
-            stops[direction][lane] -= temp
-        elif(direction=='up'):
-            if(len(vehicles[direction][lane])>1 and vehicles[direction][lane][self.index-1].crossed==0):
-                self.stop = vehicles[direction][lane][self.index-1].stop + vehicles[direction][lane][self.index-1].currentImage.get_rect().height + gap
-            else:
-                self.stop = defaultStop[direction]
-            temp = self.currentImage.get_rect().height + gap
-            y[direction][lane] += temp
-            stops[direction][lane] += temp
-        simulation.add(self)
-
-    def render(self, screen):
-        screen.blit(self.currentImage, (self.x, self.y))
-
-    def move(self):
-        if(self.direction=='right'):
-            if(self.crossed==0 and self.x+self.currentImage.get_rect().width>stopLines[self.direction]):   # if the image has crossed stop line now
-                self.crossed = 1
-                vehicles[self.direction]['crossed'] += 1
-            if(self.willTurn==1):
-                if(self.crossed==0 or self.x+self.currentImage.get_rect().width<mid[self.direction]['x']):
-                    if((self.x+self.currentImage.get_rect().width<=self.stop or (currentGreen==0 and currentYellow==0) or self.crossed==1) and (self.index==0 or self.x+self.currentImage.get_rect().width<(vehicles[self.direction][self.lane][self.index-1].x - gap2) or vehicles[self.direction][self.lane][self.index-1].turned==1)):                
-                        self.x += self.speed
-                else:   
-                    if(self.turned==0):
-                        self.rotateAngle += rotationAngle
-                        self.currentImage = pygame.transform.rotate(self.originalImage, -self.rotateAngle)
-                        self.x += 2
-                        self.y += 1.8
-                        if(self.rotateAngle==90):
-                            self.turned = 1
-                            # path = "images/" + directionNumbers[((self.direction_number+1)%noOfSignals)] + "/" + self.vehicleClass + ".png"
-                            # self.x = mid[self.direction]['x']
-                            # self.y = mid[self.direction]['y']
-                            # self.image = pygame.image.load(path)
-                    else:
-                        if(self.index==0 or self.y+self.currentImage.get_rect().height<(vehicles[self.direction][self.lane][self.index-1].y - gap2) or self.x+self.currentImage.get_rect().width<(vehicles[self.direction][self.lane][self.index-1].x - gap2)):
-                            self.y += self.speed
-            else: 
-                if((self.x+self.currentImage.get_rect().width<=self.stop or self.crossed == 1 or (currentGreen==0 and currentYellow==0)) and (self.index==0 or self.x+self.currentImage.get_rect().width<(vehicles[self.direction][self.lane][self.index-1].x - gap2) or (vehicles[self.direction][self.lane][self.index-1].turned==1))):                
-                # (if the image has not reached its stop coordinate or has crossed stop line or has green signal) and (it is either the first vehicle in that lane or it is has enough gap to the next vehicle in that lane)
-                    self.x += self.speed  # move the vehicle
-
-
-
-        elif(self.direction=='down'):
-            if(self.crossed==0 and self.y+self.currentImage.get_rect().height>stopLines[self.direction]):
-                self.crossed = 1
-                vehicles[self.direction]['crossed'] += 1
-            if(self.willTurn==1):
-                if(self.crossed==0 or self.y+self.currentImage.get_rect().height<mid[self.direction]['y']):
-                    if((self.y+self.currentImage.get_rect().height<=self.stop or (currentGreen==1 and currentYellow==0) or self.crossed==1) and (self.index==0 or self.y+self.currentImage.get_rect().height<(vehicles[self.direction][self.lane][self.index-1].y - gap2) or vehicles[self.direction][self.lane][self.index-1].turned==1)):                
-                        self.y += self.speed
-                else:   
-                    if(self.turned==0):
-                        self.rotateAngle += rotationAngle
-                        self.currentImage = pygame.transform.rotate(self.originalImage, -self.rotateAngle)
-                        self.x -= 2.5
-                        self.y += 2
-                        if(self.rotateAngle==90):
-                            self.turned = 1
-                    else:
-                        if(self.index==0 or self.x>(vehicles[self.direction][self.lane][self.index-1].x + vehicles[self.direction][self.lane][self.index-1].currentImage.get_rect().width + gap2) or self.y<(vehicles[self.direction][self.lane][self.index-1].y - gap2)):
-                            self.x -= self.speed
-            else: 
-                if((self.y+self.currentImage.get_rect().height<=self.stop or self.crossed == 1 or (currentGreen==1 and currentYellow==0)) and (self.index==0 or self.y+self.currentImage.get_rect().height<(vehicles[self.direction][self.lane][self.index-1].y - gap2) or (vehicles[self.direction][self.lane][self.index-1].turned==1))):                
-                    self.y += self.speed
-            
-        elif(self.direction=='left'):
-            if(self.crossed==0 and self.x<stopLines[self.direction]):
-                self.crossed = 1
-                vehicles[self.direction]['crossed'] += 1
-            if(self.willTurn==1):
-                if(self.crossed==0 or self.x>mid[self.direction]['x']):
-                    if((self.x>=self.stop or (currentGreen==2 and currentYellow==0) or self.crossed==1) and (self.index==0 or self.x>(vehicles[self.direction][self.lane][self.index-1].x + vehicles[self.direction][self.lane][self.index-1].currentImage.get_rect().width + gap2) or vehicles[self.direction][self.lane][self.index-1].turned==1)):                
-                        self.x -= self.speed
-                else: 
-                    if(self.turned==0):
-                        self.rotateAngle += rotationAngle
-                        self.currentImage = pygame.transform.rotate(self.originalImage, -self.rotateAngle)
-                        self.x -= 1.8
-                        self.y -= 2.5
-                        if(self.rotateAngle==90):
-                            self.turned = 1
-                            # path = "images/" + directionNumbers[((self.direction_number+1)%noOfSignals)] + "/" + self.vehicleClass + ".png"
-                            # self.x = mid[self.direction]['x']
-                            # self.y = mid[self.direction]['y']
-                            # self.currentImage = pygame.image.load(path)
-                    else:
-                        if(self.index==0 or self.y>(vehicles[self.direction][self.lane][self.index-1].y + vehicles[self.direction][self.lane][self.index-1].currentImage.get_rect().height +  gap2) or self.x>(vehicles[self.direction][self.lane][self.index-1].x + gap2)):
-                            self.y -= self.speed
-            else: 
-                if((self.x>=self.stop or self.crossed == 1 or (currentGreen==2 and currentYellow==0)) and (self.index==0 or self.x>(vehicles[self.direction][self.lane][self.index-1].x + vehicles[self.direction][self.lane][self.index-1].currentImage.get_rect().width + gap2) or (vehicles[self.direction][self.lane][self.index-1].turned==1))):                
-                # (if the image has not reached its stop coordinate or has crossed stop line or has green signal) and (it is either the first vehicle in that lane or it is has enough gap to the next vehicle in that lane)
-                    self.x -= self.speed  # move the vehicle    
-            # if((self.x>=self.stop or self.crossed == 1 or (currentGreen==2 and currentYellow==0)) and (self.index==0 or self.x>(vehicles[self.direction][self.lane][self.index-1].x + vehicles[self.direction][self.lane][self.index-1].currentImage.get_rect().width + gap2))):                
-            #     self.x -= self.speed
-        elif(self.direction=='up'):
-            if(self.crossed==0 and self.y<stopLines[self.direction]):
-                self.crossed = 1
-                vehicles[self.direction]['crossed'] += 1
-            if(self.willTurn==1):
-                if(self.crossed==0 or self.y>mid[self.direction]['y']):
-                    if((self.y>=self.stop or (currentGreen==3 and currentYellow==0) or self.crossed == 1) and (self.index==0 or self.y>(vehicles[self.direction][self.lane][self.index-1].y + vehicles[self.direction][self.lane][self.index-1].currentImage.get_rect().height +  gap2) or vehicles[self.direction][self.lane][self.index-1].turned==1)):
-                        self.y -= self.speed
-                else:   
-                    if(self.turned==0):
-                        self.rotateAngle += rotationAngle
-                        self.currentImage = pygame.transform.rotate(self.originalImage, -self.rotateAngle)
-                        self.x += 1
-                        self.y -= 1
-                        if(self.rotateAngle==90):
-                            self.turned = 1
-                    else:
-                        if(self.index==0 or self.x<(vehicles[self.direction][self.lane][self.index-1].x - vehicles[self.direction][self.lane][self.index-1].currentImage.get_rect().width - gap2) or self.y>(vehicles[self.direction][self.lane][self.index-1].y + gap2)):
-                            self.x += self.speed
-            else: 
-                if((self.y>=self.stop or self.crossed == 1 or (currentGreen==3 and currentYellow==0)) and (self.index==0 or self.y>(vehicles[self.direction][self.lane][self.index-1].y + vehicles[self.direction][self.lane][self.index-1].currentImage.get_rect().height + gap2) or (vehicles[self.direction][self.lane][self.index-1].turned==1))):                
-                    self.y -= self.speed
-
-# Initialization of signals with default values
-def initialize():
-    ts1 = TrafficSignal(0, defaultYellow, defaultGreen, defaultMinimum, defaultMaximum)
-    signals.append(ts1)
-    ts2 = TrafficSignal(ts1.red+ts1.yellow+ts1.green, defaultYellow, defaultGreen, defaultMinimum, defaultMaximum)
-    signals.append(ts2)
-    ts3 = TrafficSignal(defaultRed, defaultYellow, defaultGreen, defaultMinimum, defaultMaximum)
-    signals.append(ts3)
-    ts4 = TrafficSignal(defaultRed, defaultYellow, defaultGreen, defaultMinimum, defaultMaximum)
-    signals.append(ts4)
-    repeat()
-
-# Set time according to formula
-def setTime():
-    global noOfCars, noOfBikes, noOfBuses, noOfTrucks, noOfRickshaws, noOfLanes
-    global carTime, busTime, truckTime, rickshawTime, bikeTime
-    # os.system("say detecting vehicles, "+directionNumbers[(currentGreen+1)%noOfSignals])
-    print("Detecting vehicles, "+directionNumbers[(currentGreen+1)%noOfSignals])
-#    detection_result=detection(currentGreen,tfnet)
-#    greenTime = math.ceil(((noOfCars*carTime) + (noOfRickshaws*rickshawTime) + (noOfBuses*busTime) + (noOfBikes*bikeTime))/(noOfLanes+1))
-#    if(greenTime<defaultMinimum):
-#       greenTime = defaultMinimum
-#    elif(greenTime>defaultMaximum):
-#       greenTime = defaultMaximum
-    # greenTime = len(vehicles[currentGreen][0])+len(vehicles[currentGreen][1])+len(vehicles[currentGreen][2])
-    # noOfVehicles = len(vehicles[directionNumbers[nextGreen]][1])+len(vehicles[directionNumbers[nextGreen]][2])-vehicles[directionNumbers[nextGreen]]['crossed']
-    # print("no. of vehicles = ",noOfVehicles)
-    noOfCars, noOfBuses, noOfTrucks, noOfRickshaws, noOfBikes = 0,0,0,0,0
-    for j in range(len(vehicles[directionNumbers[nextGreen]][0])):
-        vehicle = vehicles[directionNumbers[nextGreen]][0][j]
-        if(vehicle.crossed==0):
-            vclass = vehicle.vehicleClass
-            # print(vclass)
-            noOfBikes += 1
-    for i in range(1,3):
-        for j in range(len(vehicles[directionNumbers[nextGreen]][i])):
-            vehicle = vehicles[directionNumbers[nextGreen]][i][j]
-            if(vehicle.crossed==0):
-                vclass = vehicle.vehicleClass
-                # print(vclass)
-                if(vclass=='car'):
-                    noOfCars += 1
-                elif(vclass=='bus'):
-                    noOfBuses += 1
-                elif(vclass=='truck'):
-                    noOfTrucks += 1
-                elif(vclass=='rickshaw'):
-                    noOfRickshaws += 1
-    # print(noOfCars)
-    greenTime = math.ceil(((noOfCars*carTime) + (noOfRickshaws*rickshawTime) + (noOfBuses*busTime) + (noOfTrucks*truckTime)+ (noOfBikes*bikeTime))/(noOfLanes+1))
-    # greenTime = math.ceil((noOfVehicles)/noOfLanes) 
-    print('Green Time: ',greenTime)
-    if(greenTime<defaultMinimum):
-        greenTime = defaultMinimum
-    elif(greenTime>defaultMaximum):
-        greenTime = defaultMaximum
-    # greenTime = random.randint(15,50)
-    signals[(currentGreen+1)%(noOfSignals)].green = greenTime
-   
-def repeat():
-    global currentGreen, currentYellow, nextGreen
-    while(signals[currentGreen].green>0):   # while the timer of current green signal is not zero
-        printStatus()
-        updateValues()
-        if(signals[(currentGreen+1)%(noOfSignals)].red==detectionTime):    # set time of next green signal 
-            thread = threading.Thread(name="detection",target=setTime, args=())
-            thread.daemon = True
-            thread.start()
-            # setTime()
-        time.sleep(1)
-    currentYellow = 1   # set yellow signal on
-    vehicleCountTexts[currentGreen] = "0"
-    # reset stop coordinates of lanes and vehicles 
-    for i in range(0,3):
-        stops[directionNumbers[currentGreen]][i] = defaultStop[directionNumbers[currentGreen]]
-        for vehicle in vehicles[directionNumbers[currentGreen]][i]:
-            vehicle.stop = defaultStop[directionNumbers[currentGreen]]
-    while(signals[currentGreen].yellow>0):  # while the timer of current yellow signal is not zero
-        printStatus()
-        updateValues()
-        time.sleep(1)
-    currentYellow = 0   # set yellow signal off
-    
-    # reset all signal times of current signal to default times
-    signals[currentGreen].green = defaultGreen
-    signals[currentGreen].yellow = defaultYellow
-    signals[currentGreen].red = defaultRed
-       
-    currentGreen = nextGreen # set next signal as green signal
-    nextGreen = (currentGreen+1)%noOfSignals    # set next green signal
-    signals[nextGreen].red = signals[currentGreen].yellow+signals[currentGreen].green    # set the red time of next to next signal as (yellow time + green time) of next signal
-    repeat()     
-
-# Print the signal timers on cmd
-def printStatus():                                                                                           
-	for i in range(0, noOfSignals):
-		if(i==currentGreen):
-			if(currentYellow==0):
-				print(" GREEN TS",i+1,"-> r:",signals[i].red," y:",signals[i].yellow," g:",signals[i].green)
-			else:
-				print("YELLOW TS",i+1,"-> r:",signals[i].red," y:",signals[i].yellow," g:",signals[i].green)
-		else:
-			print("   RED TS",i+1,"-> r:",signals[i].red," y:",signals[i].yellow," g:",signals[i].green)
-	print()
-
-# Update values of the signal timers after every second
-def updateValues():
-    for i in range(0, noOfSignals):
-        if(i==currentGreen):
-            if(currentYellow==0):
-                signals[i].green-=1
-                signals[i].totalGreenTime+=1
-            else:
-                signals[i].yellow-=1
-        else:
-            signals[i].red-=1
-
-# Generating vehicles in the simulation
-def generateVehicles():
-    while(True):
-        vehicle_type = random.randint(0,4)
-        if(vehicle_type==4):
-            lane_number = 0
-        else:
-            lane_number = random.randint(0,1) + 1
-        will_turn = 0
-        if(lane_number==2):
-            temp = random.randint(0,4)
-            if(temp<=2):
-                will_turn = 1
-            elif(temp>2):
-                will_turn = 0
-        temp = random.randint(0,999)
-        direction_number = 0
-        a = [400,800,900,1000]
-        if(temp<a[0]):
-            direction_number = 0
-        elif(temp<a[1]):
-            direction_number = 1
-        elif(temp<a[2]):
-            direction_number = 2
-        elif(temp<a[3]):
-            direction_number = 3
-        Vehicle(lane_number, vehicleTypes[vehicle_type], direction_number, directionNumbers[direction_number], will_turn)
-        time.sleep(0.75)
-
-def simulationTime():
-    global timeElapsed, simTime
-    while(True):
-        timeElapsed += 1
-        time.sleep(1)
-        if(timeElapsed==simTime):
-            totalVehicles = 0
-            print('Lane-wise Vehicle Counts')
-            for i in range(noOfSignals):
-                print('Lane',i+1,':',vehicles[directionNumbers[i]]['crossed'])
-                totalVehicles += vehicles[directionNumbers[i]]['crossed']
-            print('Total vehicles passed: ',totalVehicles)
-            print('Total time passed: ',timeElapsed)
-            print('No. of vehicles passed per unit time: ',(float(totalVehicles)/float(timeElapsed)))
-            os._exit(1)
-    
-
-def Main(args):
-    thread4 = threading.Thread(name="simulationTime",target=simulationTime, args=()) 
-    thread4.daemon = True
-    thread4.start()
-
-    thread2 = threading.Thread(name="initialization",target=initialize, args=())    # initialization
-    thread2.daemon = True
-    thread2.start()
-
-    # Colours 
+            detections.append((counts, result))
+        return detections
+
+    def annotate(self, result, frame):
+        """`frame` with the boxes of `result`, which may come from an earlier frame of the lane."""
+        with job_stats.timer('draw'):
+            return result.plot(img=frame)
+
+def load_image(path, size, color):
+    """pygame image at `path`, or a `size` rectangle of `color` when it cannot be read
+    (e.g. a checkout without the LFS objects)."""
+    try:
+        return pygame.image.load(path)
+    except (pygame.error, FileNotFoundError):
+        surface = pygame.Surface(size)
+        surface.fill(color)
+        return surface
+
+def vehicle_images():
+    images = {}
+    for direction in DIRECTION_NUMBERS.values():
+        for vehicleClass, (w, h) in FALLBACK_SIZES.items():
+            size = (h, w) if direction in ('up', 'down') else (w, h)
+            images[(direction, vehicleClass)] = load_image(f"images/{direction}/{vehicleClass}.png", size, VEHICLE_COLORS[vehicleClass])
+    return images
+
+def render(screen, sim, images, rotated, background, signalImages, font):
     black = (0, 0, 0)
     white = (255, 255, 255)
+    controller = sim.controller
+    signals = controller.signals
+
+    screen.blit(background,(0,0))   # display background in simulation
+    for i, (state, text) in enumerate(signal_states(controller)):  # display signal and its timer text
+        signals[i].signalText = text
+        screen.blit(signalImages[state], signalCoods[i])
+
+    # display signal timer and vehicle count
+    for i in range(0,NO_OF_SIGNALS):
+        screen.blit(font.render(str(signals[i].signalText), True, white, black), signalTimerCoods[i])
+        displayText = sim.crossed[i]
+        screen.blit(font.render(str(displayText), True, black, white), vehicleCountCoods[i])
+
+    timeElapsedText = font.render(("Time Elapsed: "+str(sim.time_elapsed)), True, black, white)
+    screen.blit(timeElapsedText,timeElapsedCoods)
+
+    # display the vehicles, rotating each turning sprite once per angle
+    for direction, vehicleClass, angle, x, y in sim.sprites():
+        key = (direction, vehicleClass)
+        image = images[key]
+        if angle:
+            rkey = key + (angle,)
+            if rkey not in rotated:
+                rotated[rkey] = pygame.transform.rotate(image, -angle)
+            image = rotated[rkey]
+        screen.blit(image, [x, y])
+
+def print_summary(summary):
+    print('Lane-wise Vehicle Counts')
+    for i in range(NO_OF_SIGNALS):
+        print('Lane',i+1,':',summary['crossed'][DIRECTION_NUMBERS[i]])
+    print('Total vehicles passed: ',summary['total'])
+    print('Total time passed: ',summary['time'])
+    print('No. of vehicles passed per unit time: ',summary['per_second'])
+
+def frames_due(sim, fps, frameCount):
+    """Frames of a `fps` recording due by now that are not written yet."""
+    due = int(sim.tick * fps / sim.ticks_per_second - 1e-9) + 1
+    return max(0, due - frameCount)
+
+def record_headless(sim, output_file, fps, recorder=None):
+    renderer = OffscreenRenderer()
+    fourcc = cv2.VideoWriter_fourcc(*'vp80')
+    out = cv2.VideoWriter(output_file, fourcc, float(fps), (SCREEN_WIDTH, SCREEN_HEIGHT))
+    frameCount = 0
+    maxFrames = int(RECORD_SECONDS * fps)
+
+    while not sim.finished:
+        sim.step()
+        if recorder:
+            recorder.record(sim)
+        if frameCount >= maxFrames:
+            continue
+        due = min(frames_due(sim, fps, frameCount), maxFrames - frameCount)
+        if not due:
+            continue
+        with job_stats.timer('draw'):
+            frame = renderer.render(sim)
+        # Frames above the tick rate repeat the same buffer
+        for _ in range(due):
+            with job_stats.timer('encode'):
+                out.write(frame)
+            frameCount += 1
+            job_stats.count('frames')
+        if frameCount >= maxFrames:
+            print(f"Recording complete. Saved to {output_file}")
+            out.release()
+
+    if frameCount < maxFrames:
+        out.release()
 
-    # Screensize 
-    screenWidth = 1400
-    screenHeight = 800
-    screenSize = (screenWidth, screenHeight)
+def run_gui(sim, output_file, fps, recorder=None):
+    pygame.init()
+    screenSize = (SCREEN_WIDTH, SCREEN_HEIGHT)
 
     # Setting background image i.e. image of intersection
-    background = pygame.image.load('images/mod_int.png')
+    background = load_image('images/mod_int.png', screenSize, BACKGROUND_COLOR)
 
     screen = pygame.display.set_mode(screenSize)
     pygame.display.set_caption("SIMULATION")
 
     # Loading signal images and font
-    redSignal = pygame.image.load('images/signals/red.png')
-    yellowSignal = pygame.image.load('images/signals/yellow.png')
-    greenSignal = pygame.image.load('images/signals/green.png')
+    signalImages = (load_image('images/signals/red.png', (30, 60), (255, 0, 0)),
+                    load_image('images/signals/yellow.png', (30, 60), (255, 255, 0)),
+                    load_image('images/signals/green.png', (30, 60), (0, 255, 0)))
     font = pygame.font.Font(None, 30)
-
-    thread3 = threading.Thread(name="generateVehicles",target=generateVehicles, args=())    # Generating vehicles
-    thread3.daemon = True
-    thread3.start()
+    images = vehicle_images()
+    rotated = {}
+    # The GUI runs in real time
+    clock = pygame.time.Clock()
 
     # Video Recording Setup
     fourcc = cv2.VideoWriter_fourcc(*'vp80')
-    output_file = getattr(args, 'output', 'simulation_output.webm')
-    out = cv2.VideoWriter(output_file, fourcc, 20.0, (screenWidth, screenHeight))
+    out = cv2.VideoWriter(output_file, fourcc, float(fps), screenSize)
     frameCount = 0
-    maxFrames = 600 # Record for about 30 seconds (20 fps * 30)
+    maxFrames = int(RECORD_SECONDS * fps)
 
-    while True:
+    while not sim.finished:
+        sim.step()
+        if recorder:
+            recorder.record(sim)
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 out.release()
                 sys.exit()
 
-        screen.blit(background,(0,0))   # display background in simulation
-        for i in range(0,noOfSignals):  # display signal and set timer according to current status: green, yello, or red
-            if(i==currentGreen):
-                if(currentYellow==1):
-                    if(signals[i].yellow==0):
-                        signals[i].signalText = "STOP"
-                    else:
-                        signals[i].signalText = signals[i].yellow
-                    screen.blit(yellowSignal, signalCoods[i])
-                else:
-                    if(signals[i].green==0):
-                        signals[i].signalText = "SLOW"
-                    else:
-                        signals[i].signalText = signals[i].green
-                    screen.blit(greenSignal, signalCoods[i])
-            else:
-                if(signals[i].red<=10):
-                    if(signals[i].red==0):
-                        signals[i].signalText = "GO"
-                    else:
-                        signals[i].signalText = signals[i].red
-                else:
-                    signals[i].signalText = "---"
-                screen.blit(redSignal, signalCoods[i])
-        signalTexts = ["","","",""]
-
-        # display signal timer and vehicle count
-        for i in range(0,noOfSignals):  
-            signalTexts[i] = font.render(str(signals[i].signalText), True, white, black)
-            screen.blit(signalTexts[i],signalTimerCoods[i]) 
-            displayText = vehicles[directionNumbers[i]]['crossed']
-            vehicleCountTexts[i] = font.render(str(displayText), True, black, white)
-            screen.blit(vehicleCountTexts[i],vehicleCountCoods[i])
-
-        timeElapsedText = font.render(("Time Elapsed: "+str(timeElapsed)), True, black, white)
-        screen.blit(timeElapsedText,(1100,50))
-
-        # display the vehicles
-        for vehicle in simulation:  
-            screen.blit(vehicle.currentImage, [vehicle.x, vehicle.y])
-            # vehicle.render(screen)
-            vehicle.move()
+        with job_stats.timer('draw'):
+            render(screen, sim, images, rotated, background, signalImages, font)
         pygame.display.update()
-        
-        # Capture frame
-        frame = pygame.surfarray.array3d(screen)
-        frame = frame.transpose([1, 0, 2]) # Pygame is (w, h, c), OpenCV needs (h, w, c)
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        out.write(frame)
-        
-        frameCount += 1
-        if frameCount >= maxFrames:
-            print(f"Recording complete. Saved to {output_file}")
-            out.release()
-            sys.exit()
+        clock.tick(sim.ticks_per_second)
+
+        due = min(frames_due(sim, fps, frameCount), maxFrames - frameCount)
+        if due:
+            # Capture frame
+            with job_stats.timer('draw'):
+                frame = pygame.surfarray.array3d(screen)
+                frame = frame.transpose([1, 0, 2]) # Pygame is (w, h, c), OpenCV needs (h, w, c)
+                frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+            for _ in range(due):
+                with job_stats.timer('encode'):
+                    out.write(frame)
+                frameCount += 1
+                job_stats.count('frames')
+            if frameCount >= maxFrames:
+                print(f"Recording complete. Saved to {output_file}")
+                out.release()
+
+    if frameCount < maxFrames:
+        out.release()
+
+def Main(args):
+    metrics = getattr(args, 'metrics', None)
+    if metrics:
+        metrics = npz_path(metrics)
+    metrics_only = getattr(args, 'metrics_only', False)
+    # Timer prints are for the GUI; headless runs report through the metrics
+    sim = Simulation(verbose=not (args.headless or metrics_only))
+    output_file = getattr(args, 'output', 'simulation_output.webm')
+    fps = getattr(args, 'fps', None) or sim.ticks_per_second
+    recorder = MetricsRecorder(sim) if metrics else None
+    if metrics_only:
+        while not sim.finished:
+            sim.step()
+            if recorder:
+                recorder.record(sim)
+    elif args.headless:
+        record_headless(sim, output_file, fps, recorder)
+    else:
+        run_gui(sim, output_file, fps, recorder)
+    summary = sim.summary()
+    print_summary(summary)
+    if metrics:
+        recorder.export(metrics, totals=summary)
+        print(f"Metrics saved to {metrics}")
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--videos', nargs='+', help='Path to input video files', default=[])
     parser.add_argument('--headless', action='store_true', help='Run in headless mode')
     parser.add_argument('--output', type=str, default='simulation_output.mp4', help='Output video path')
+    parser.add_argument('--fps', type=float, default=None, help='Frame rate of the simulation recording (default: the tick rate)')
+    parser.add_argument('--metrics', type=str, default=None, help='Write per-tick traffic metrics to this .npz (summary next to it as .json)')
+    parser.add_argument('--metrics-only', action='store_true', help='Simulate without rendering or recording a video')
     args = parser.parse_args()
 
     if args.headless:
@@ -551,125 +249,95 @@ if __name__ == '__main__':
 
     if len(args.videos) > 1:
         print("Starting Detection Mode with", len(args.videos), "videos")
-        
+
         # Initialize video writer for detection mode
         fourcc_det = cv2.VideoWriter_fourcc(*'vp80')
         os.makedirs(os.path.dirname(args.output) if os.path.dirname(args.output) else '.', exist_ok=True)
-        out_det = cv2.VideoWriter(args.output, fourcc_det, 20.0, (1280, 960))
+        fps_det = 20
+        out_det = cv2.VideoWriter(args.output, fourcc_det, float(fps_det), (1280, 960))
         maxFramesDet = 200 # Process 10 seconds worth of frames for POC speed
         frameCountDet = 0
 
-        # Initialize signals in thread to avoid blocking
-        thread_init = threading.Thread(name="initialization",target=initialize, args=())
-        thread_init.daemon = True
-        thread_init.start()
-        
+        # Green times come from the latest detections of each lane
+        laneCounts = {}
+        controller = SignalController(lambda lane: laneCounts.get(lane, {}), verbose=True)
+
         # Load model
         model_path = "../Models/yolov8x.pt"
-        detector = VehicleDetection(model_path)
-        
-        # Open video captures
-        caps = [cv2.VideoCapture(v) for v in args.videos]
-        
-        # Map videos to lanes (assuming order: right, down, left, up)
-        # If fewer videos than signals, we cycle or just use what we have
-        
-        # Track previous frames to avoid running YOLO on every frame
+        detector = VehicleDetection(model_path, batch=len(args.videos))
+        configure_threads()
+
+        # One reader thread per lane decodes in real time, like a camera, straight
+        # to the 640x480 analysis size and the output frame rate, and keeps only
+        # the newest frame (rewound at EOF)
+        readers = [LatestFrameReader(FrameSource(v, size=(640, 480), fps=fps_det, loop=True)) for v in args.videos]
+
+        # Map videos to lanes (assuming order: right, down, left, up); the first
+        # four are shown in a 2x2 grid written straight into the output frame
+        combined = np.zeros((960, 1280, 3), dtype=np.uint8)
+
+        # Run YOLO on every Nth frame; the frames in between show the last boxes
         skip_frames = 5
-        last_results = [None] * len(caps)
-        
+        detections = None
+
         while True:
+            # One simulated second of the signal cycle per second of output video
+            if frameCountDet % fps_det == 0:
+                controller.step()
+
             frames = []
-            is_detect_frame = (frameCountDet % skip_frames == 0)
-            
-            for i, cap in enumerate(caps):
-                ret, frame = cap.read()
+            for reader in readers:
+                # Wait for the first frame however long the decoder takes to start;
+                # later, a lane that has nothing new for a second shows its last frame
+                ret, frame = reader.read(timeout=1.0 if frameCountDet else None)
                 if not ret:
-                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                    ret, frame = cap.read()
-                
-                # Resize for display/processing if needed
-                frame = cv2.resize(frame, (640, 480))
-                
-                # Detect every Nth frame
-                if is_detect_frame or last_results[i] is None:
-                    counts, plot_frame = detector.detect(frame)
-                    last_results[i] = (counts, plot_frame)
-                else:
-                    counts, plot_frame = last_results[i]
-                
-                # Update global vehicle counts for the corresponding lane
-                # Mapping logic needs to be robust. For now, simple 1-to-1 mapping
-                lane_idx = i % 4
-                direction = directionNumbers[lane_idx]
-                
-                # Update global variables used by setTime()
-                # Note: setTime uses global noOfCars etc. which is a bit messy for multi-lane.
-                # We need to aggregate or set specific lane counts.
-                # The existing setTime() calculates greenTime based on 'nextGreen' lane.
-                # So we should store these counts in a structure that setTime can access.
-                
-                # For this implementation, let's just update the globals if this is the 'nextGreen' lane
-                if lane_idx == nextGreen:
-                    # global noOfCars, noOfBuses, noOfTrucks, noOfRickshaws, noOfBikes
-                    noOfCars = counts['car']
-                    noOfBuses = counts['bus']
-                    noOfTrucks = counts['truck']
-                    noOfRickshaws = counts['rickshaw']
-                    noOfBikes = counts['bike']
-                
+                    break
+                frames.append(frame)
+            if len(frames) < len(readers):
+                print("Could not read from all videos")
+                break
+
+            if frameCountDet % skip_frames == 0 or detections is None:
+                detections = detector.detect(frames)
+                # Simple 1-to-1 mapping of videos to lanes
+                for i, (counts, _) in enumerate(detections):
+                    laneCounts[i % 4] = counts
+
+            for i, frame in enumerate(frames[:4]):
+                plot_frame = detector.annotate(detections[i][1], frame)
+
                 # Overlay signal status on frame
-                sig = signals[lane_idx]
-                status_text = f"TS{lane_idx+1}: R={sig.red} Y={sig.yellow} G={sig.green}"
+                sig = controller.signals[i]
+                status_text = f"TS{i+1}: R={sig.red} Y={sig.yellow} G={sig.green}"
                 color = (0, 0, 255)
                 if sig.green > 0: color = (0, 255, 0)
                 elif sig.yellow > 0: color = (0, 255, 255)
-                
+
                 cv2.putText(plot_frame, status_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
-                frames.append(plot_frame)
-
-            # Display frames (grid layout)
-            # Create a combined image
-            if len(frames) > 0:
-                # Arrange in grid 2x2
-                top_row = np.hstack(frames[:2]) if len(frames) >= 2 else np.hstack([frames[0], np.zeros_like(frames[0])])
-                if len(frames) > 2:
-                    bottom_row = np.hstack(frames[2:])
-                    # Pad if odd number
-                    if len(frames) == 3:
-                        bottom_row = np.hstack([frames[2], np.zeros_like(frames[0])])
-                    combined = np.vstack([top_row, bottom_row])
-                else:
-                    combined = np.vstack([top_row, np.zeros_like(top_row)])
-                
-                # Resize to actual VideoWriter resolution if sizes differ slightly due to internal resizing
-                combined = cv2.resize(combined, (1280, 960))
-                
+                row, col = divmod(i, 2)
+                combined[row * 480:(row + 1) * 480, col * 640:(col + 1) * 640] = plot_frame
+
+            with job_stats.timer('encode'):
                 out_det.write(combined)
-                frameCountDet += 1
-                if frameCountDet >= maxFramesDet:
-                    print("Detection recording complete.")
-                    out_det.release()
-                    sys.exit()
-
-                if not args.headless:
-                    cv2.imshow("Traffic Control", combined)
+            frameCountDet += 1
+            job_stats.count('frames')
+            if frameCountDet >= maxFramesDet:
+                print("Detection recording complete.")
+                break
+
+            # highgui calls fail on opencv-python-headless
+            if not args.headless:
+                cv2.imshow("Traffic Control", combined)
                 if cv2.waitKey(1) & 0xFF == ord('q'):
-                    out_det.release()
                     break
-            
-            # Run signal logic
-            # The existing logic runs in threads (repeat, updateValues).
-            # We need to make sure they are running.
-            # initialize() starts repeat().
-            # We also need updateValues() to be called periodically or by the threads.
-            # The existing code has 'repeat' which sleeps and calls updateValues.
-            # So we just need to keep the main loop running.
-            pass
+
+        out_det.release()
+        for reader in readers:
+            reader.release()
+        dropped = sum(reader.dropped for reader in readers)
+        print(f"Frames decoded: {sum(reader.frames for reader in readers)}, dropped: {dropped}")
 
     else:
         print("Starting Simulation Mode")
+        configure_threads()
         Main(args)
-
-
-  
\ No newline at end of file
@@ -0,0 +1,608 @@
+import os
+import math
+import random
+
+import cv2
+import numpy as np
+
+# Simulated-clock intersection. Signal timers, vehicle arrivals and movement
+# advance in logical ticks (TICKS_PER_SECOND per simulated second) instead of
+# sleeping threads, so a headless 300 s scenario runs in well under a second.
+# The phases follow the original real-time loop: all signal timers count down
+# once per second, the green time of the next signal is set from its waiting
+# vehicles when its red timer reaches DETECTION_TIME, and every green is
+# followed by yellow before the next signal in turn goes green.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_DIR = os.path.join(BASE_DIR, 'images')
+# Movement steps per simulated second (also the frame rate of the recording)
+TICKS_PER_SECOND = int(os.environ.get('ITS_SIGNAL_TICKS_PER_SECOND', '20'))
+
+DEFAULT_RED = 150
+DEFAULT_YELLOW = 5
+DEFAULT_GREEN = 20
+DEFAULT_MINIMUM = 10
+DEFAULT_MAXIMUM = 60
+NO_OF_SIGNALS = 4
+SIM_TIME = 300
+# Red signal time at which the vehicles waiting for the next green are counted
+DETECTION_TIME = 5
+# Green seconds per waiting vehicle, shared by NO_OF_LANES + 1 lanes
+CLEAR_TIMES = {'car': 2, 'bike': 1, 'rickshaw': 2.25, 'bus': 2.5, 'truck': 2.5}
+NO_OF_LANES = 2
+# Coefficients of the green-time formula, overridable per controller
+DEFAULT_TIMING = dict(CLEAR_TIMES, lanes=NO_OF_LANES, minimum=DEFAULT_MINIMUM, maximum=DEFAULT_MAXIMUM)
+# Seconds between generated vehicles and the cumulative direction split out of
+# 1000 of the original generator (LegacyArrivals)
+ARRIVAL_INTERVAL = 0.75
+DIRECTION_SPLIT = [400, 800, 900, 1000]
+
+SPEEDS = {'car': 2.25, 'bus': 1.8, 'truck': 1.8, 'rickshaw': 2, 'bike': 2.5}  # pixels per tick
+VEHICLE_TYPES = {0: 'car', 1: 'bus', 2: 'truck', 3: 'rickshaw', 4: 'bike'}
+DIRECTION_NUMBERS = {0: 'right', 1: 'down', 2: 'left', 3: 'up'}
+
+SCREEN_WIDTH = 1400
+SCREEN_HEIGHT = 800
+
+# Coordinates of start, per lane
+START_X = {'right': [0, 0, 0], 'down': [755, 727, 697], 'left': [1400, 1400, 1400], 'up': [602, 627, 657]}
+START_Y = {'right': [348, 370, 398], 'down': [0, 0, 0], 'left': [498, 466, 436], 'up': [800, 800, 800]}
+# Coordinates of stop lines
+STOP_LINES = {'right': 590, 'down': 330, 'left': 800, 'up': 535}
+DEFAULT_STOP = {'right': 580, 'down': 320, 'left': 810, 'up': 545}
+# Where turning vehicles start to turn, and their shift per tick while turning
+MID = {'right': {'x': 705, 'y': 445}, 'down': {'x': 695, 'y': 450}, 'left': {'x': 695, 'y': 425}, 'up': {'x': 695, 'y': 400}}
+TURN_STEPS = {'right': (2, 1.8), 'down': (-2.5, 2), 'left': (-1.8, -2.5), 'up': (1, -1)}
+ROTATION_ANGLE = 3
+GAP = 15    # stopping gap
+GAP2 = 15   # moving gap
+
+# Sprite sizes of setup_assets.py (right/left; up/down are swapped), used when
+# the images cannot be read, e.g. in a checkout without the LFS objects
+FALLBACK_SIZES = {'car': (40, 20), 'bus': (80, 25), 'truck': (80, 25), 'rickshaw': (25, 15), 'bike': (20, 10)}
+_sprite_sizes = {}
+
+
+def sprite_size(direction, vehicle_class):
+    """(width, height) of the vehicle image for `direction`."""
+    key = (direction, vehicle_class)
+    if key not in _sprite_sizes:
+        image = cv2.imread(os.path.join(IMAGE_DIR, direction, f"{vehicle_class}.png"), cv2.IMREAD_UNCHANGED)
+        if image is not None:
+            _sprite_sizes[key] = (image.shape[1], image.shape[0])
+        else:
+            w, h = FALLBACK_SIZES[vehicle_class]
+            _sprite_sizes[key] = (h, w) if direction in ('up', 'down') else (w, h)
+    return _sprite_sizes[key]
+
+
+# |cos| and |sin| of every turning angle, exact at 0 and 90 degrees; the
+# rotated size is computed like pygame.transform.rotate does
+TURN_ANGLES = np.arange(0, 91, ROTATION_ANGLE)
+TURN_COS = np.abs(np.cos(np.radians(TURN_ANGLES)))
+TURN_SIN = np.abs(np.sin(np.radians(TURN_ANGLES)))
+TURN_COS[-1], TURN_SIN[-1] = 0.0, 1.0
+
+# Per-direction constants for the vectorized update, indexed by direction number
+_SIGN = np.array([1, 1, -1, -1])    # along x for right/left, y for down/up
+_HORIZONTAL = np.array([True, False, True, False])
+_STOP_LINE = np.array([STOP_LINES[d] for d in DIRECTION_NUMBERS.values()], dtype=float)
+_MID = np.array([MID['right']['x'], MID['down']['y'], MID['left']['x'], MID['up']['y']], dtype=float)
+_TURN_DX = np.array([TURN_STEPS[d][0] for d in DIRECTION_NUMBERS.values()])
+_TURN_DY = np.array([TURN_STEPS[d][1] for d in DIRECTION_NUMBERS.values()])
+# Direction of travel once turned
+_EXIT_DX = np.array([0, -1, 0, 1])
+_EXIT_DY = np.array([1, 0, -1, 0])
+# Gap tests on the exit road, as coefficients of (x, y, width, height) of the
+# vehicle and of the vehicle ahead: clear when either row gives sum + GAP2 < 0.
+# Right: y + h < y' - GAP2 or x + w < x' - GAP2; down: x > x' + w' + GAP2 or
+# y < y' - GAP2; left: y > y' + h' + GAP2 or x > x' + GAP2; up: x < x' - w' - GAP2
+# or y > y' + GAP2.
+_EXIT_GAP_A = np.array([[0, 1, 0, 1, 0, -1, 0, 0], [-1, 0, 0, 0, 1, 0, 1, 0],
+                        [0, -1, 0, 0, 0, 1, 0, 1], [1, 0, 0, 0, -1, 0, 1, 0]], dtype=float)
+_EXIT_GAP_B = np.array([[1, 0, 1, 0, -1, 0, 0, 0], [0, 1, 0, 0, 0, -1, 0, 0],
+                        [-1, 0, 0, 0, 1, 0, 0, 0], [0, -1, 0, 0, 0, 1, 0, 0]], dtype=float)
+_SPEEDS = np.array([SPEEDS[VEHICLE_TYPES[i]] for i in range(len(VEHICLE_TYPES))])
+BIKE = 4
+
+# Columns of the vehicle table of a Simulation, one row per vehicle
+VEHICLE_FIELDS = {
+    'x': np.float64, 'y': np.float64,
+    'width': np.float64, 'height': np.float64,            # current (rotated) sprite size
+    'base_width': np.float64, 'base_height': np.float64,
+    'speed': np.float64, 'stop': np.float64,
+    'direction': np.int8, 'lane': np.int8, 'vehicle_class': np.int8, 'angle': np.int16,
+    'crossed': np.bool_, 'will_turn': np.bool_, 'turned': np.bool_,
+    'leader': np.int32,                                     # row of the vehicle ahead in the lane, -1 if none
+    'active': np.bool_,
+    'waited': np.int32,                                     # ticks spent waiting before the stop line
+    # Per-direction constants, signed along the direction of travel
+    'sign': np.float64, 'horizontal': np.bool_, 'stop_line': np.float64, 'mid': np.float64,
+}
+
+
+def assign_lane(rng, vehicle_type):
+    """Lane and turn flag of a new vehicle: bikes use lane 0, the others lane 1
+    or 2 at random, and 3 in 5 of the vehicles in lane 2 turn."""
+    lane = 0 if vehicle_type == BIKE else rng.randint(0, 1) + 1
+    will_turn = 0
+    if lane == 2:
+        will_turn = 1 if rng.randint(0, 4) <= 2 else 0
+    return lane, will_turn
+
+
+class LegacyArrivals:
+    """The original generator: a vehicle every `interval` seconds, of a uniformly
+    drawn class, on a direction drawn from the cumulative `direction_split`.
+
+    Arrival generators keep no state of their own (the simulation's random
+    generator is the only one), so snapshots stay valid: take() returns the
+    (lane, vehicle type, direction number, will turn) of every vehicle arriving
+    at `tick`. See arrivals.py for more.
+    """
+
+    def __init__(self, interval=ARRIVAL_INTERVAL, direction_split=DIRECTION_SPLIT):
+        self.interval = interval
+        self.direction_split = list(direction_split)
+
+    def take(self, rng, tick, ticks_per_second):
+        spacing = self.interval * ticks_per_second
+        # Vehicle k arrives on the first tick at or after k * spacing
+        count = math.floor(tick / spacing + 1e-9) + 1
+        if tick:
+            count -= math.floor((tick - 1) / spacing + 1e-9) + 1
+        vehicles = []
+        for _ in range(count):
+            vehicle_type = rng.randint(0, 4)
+            lane, will_turn = assign_lane(rng, vehicle_type)
+            temp = rng.randint(0, 999)
+            direction_number = next(i for i, bound in enumerate(self.direction_split) if temp < bound)
+            vehicles.append((lane, vehicle_type, direction_number, will_turn))
+        return vehicles
+
+
+class TrafficSignal:
+    def __init__(self, red, yellow, green, minimum, maximum):
+        self.red = red
+        self.yellow = yellow
+        self.green = green
+        self.minimum = minimum
+        self.maximum = maximum
+        self.signalText = "30"
+        self.totalGreenTime = 0
+
+
+class SignalController:
+    """Signal cycle of one intersection, advanced one second per step().
+
+    All state is on the instance, so any number of intersections can run in
+    one process. `counts(signal_index)` returns the waiting vehicles per class
+    of an approach and sets its green time when its red timer reaches
+    DETECTION_TIME; `on_yellow(signal_index)` is called when a green turns
+    yellow. `timing` overrides entries of DEFAULT_TIMING. `plan(signal_index,
+    green_time)`, when set, gets the formula's green time and returns the one
+    to use (see rollouts.py).
+    """
+
+    def __init__(self, counts, on_yellow=None, timing=None, plan=None, verbose=False):
+        unknown = set(timing or {}) - set(DEFAULT_TIMING)
+        if unknown:
+            raise ValueError(f"Unknown timing parameters: {', '.join(sorted(unknown))}")
+        self.timing = dict(DEFAULT_TIMING, **(timing or {}))
+        # Timers count whole seconds; a fractional one never reaches the detection time
+        for name in ('lanes', 'minimum', 'maximum'):
+            if float(self.timing[name]) != int(self.timing[name]):
+                raise ValueError(f"Timing parameter {name} must be a whole number: {self.timing[name]}")
+            self.timing[name] = int(self.timing[name])
+        self.counts = counts
+        self.on_yellow = on_yellow
+        self.plan = plan
+        self.verbose = verbose
+        minimum, maximum = self.timing['minimum'], self.timing['maximum']
+        self.signals = [TrafficSignal(0, DEFAULT_YELLOW, DEFAULT_GREEN, minimum, maximum)]
+        self.signals.append(TrafficSignal(self.signals[0].yellow + self.signals[0].green,
+                                          DEFAULT_YELLOW, DEFAULT_GREEN, minimum, maximum))
+        for _ in range(NO_OF_SIGNALS - 2):
+            self.signals.append(TrafficSignal(DEFAULT_RED, DEFAULT_YELLOW, DEFAULT_GREEN, minimum, maximum))
+        self.current_green = 0
+        self.next_green = 1
+        self.current_yellow = 0
+
+    @property
+    def green(self):
+        """Index of the signal showing green, or -1 during yellow."""
+        return self.current_green if self.current_yellow == 0 else -1
+
+    def step(self):
+        """One second of the cycle. Phase changes take no time: the timers of
+        the new phase start counting in the same second."""
+        while True:
+            signal = self.signals[self.current_green]
+            if self.current_yellow == 0:
+                if signal.green > 0:
+                    if self.verbose:
+                        self.print_status()
+                    self.update_values()
+                    if self.signals[self.next_green].red == DETECTION_TIME:
+                        self.set_time()
+                    return
+                self.current_yellow = 1
+                if self.on_yellow:
+                    self.on_yellow(self.current_green)
+            else:
+                if signal.yellow > 0:
+                    if self.verbose:
+                        self.print_status()
+                    self.update_values()
+                    return
+                self.current_yellow = 0
+                # Reset the timers of the signal that was green and hand over
+                signal.green = DEFAULT_GREEN
+                signal.yellow = DEFAULT_YELLOW
+                signal.red = DEFAULT_RED
+                self.current_green = self.next_green
+                self.next_green = (self.current_green + 1) % NO_OF_SIGNALS
+                current = self.signals[self.current_green]
+                self.signals[self.next_green].red = current.yellow + current.green
+
+    def update_values(self):
+        for i, signal in enumerate(self.signals):
+            if i == self.current_green:
+                if self.current_yellow == 0:
+                    signal.green -= 1
+                    signal.totalGreenTime += 1
+                else:
+                    signal.yellow -= 1
+            else:
+                signal.red -= 1
+
+    def set_time(self):
+        """Green time of the next signal from the vehicles waiting for it."""
+        if self.verbose:
+            print("Detecting vehicles, " + DIRECTION_NUMBERS[self.next_green])
+        counts = self.counts(self.next_green)
+        timing = self.timing
+        green_time = math.ceil(sum(counts.get(c, 0) * timing[c] for c in CLEAR_TIMES) / (timing['lanes'] + 1))
+        if self.verbose:
+            print('Green Time: ', green_time)
+        signal = self.signals[self.next_green]
+        green_time = min(max(green_time, signal.minimum), signal.maximum)
+        if self.plan:
+            green_time = self.plan(self.next_green, green_time)
+        signal.green = green_time
+
+    def state(self):
+        signals = [(s.red, s.yellow, s.green, s.minimum, s.maximum, s.totalGreenTime) for s in self.signals]
+        return {'signals': signals, 'current_green': self.current_green, 'next_green': self.next_green,
+                'current_yellow': self.current_yellow}
+
+    def load_state(self, state):
+        for signal, values in zip(self.signals, state['signals']):
+            signal.red, signal.yellow, signal.green, signal.minimum, signal.maximum, signal.totalGreenTime = values
+        self.current_green = state['current_green']
+        self.next_green = state['next_green']
+        self.current_yellow = state['current_yellow']
+
+    def print_status(self):
+        for i, signal in enumerate(self.signals):
+            if i == self.current_green:
+                state = " GREEN" if self.current_yellow == 0 else "YELLOW"
+            else:
+                state = "   RED"
+            print(f"{state} TS {i + 1} -> r: {signal.red}  y: {signal.yellow}  g: {signal.green}")
+        print()
+
+
+class Simulation:
+    """One intersection with generated traffic on a simulated clock; call
+    step() once per tick.
+
+    Vehicles are rows of a table of NumPy columns (VEHICLE_FIELDS) and move
+    in one vectorized update per tick. All vehicles see the positions of the
+    vehicles ahead as they were at the start of the tick. A vehicle waits
+    while it stands before the stop line; the queue of an approach is its
+    waiting vehicles. snapshot() and from_snapshot() save and restore the
+    complete state, including the random generator, so forks replay the same
+    arrivals.
+    """
+
+    def __init__(self, sim_time=SIM_TIME, ticks_per_second=TICKS_PER_SECOND, seed=None, verbose=False, capacity=256,
+                 timing=None, arrivals=None):
+        self.sim_time = sim_time
+        self.ticks_per_second = ticks_per_second
+        self.rng = random.Random(seed)
+        self.arrivals = arrivals or LegacyArrivals()
+        self.tick = 0
+        self.controller = SignalController(self.waiting_counts, on_yellow=self.release_stops, timing=timing,
+                                           verbose=verbose)
+        self.signals = self.controller.signals
+
+        # Rows in use, live or free; retired rows are reused before the table grows
+        self.count = 0
+        self.free = []
+        self.columns = {name: np.zeros(capacity, dtype) for name, dtype in VEHICLE_FIELDS.items()}
+        # Row of the last vehicle of each lane, per direction
+        self.last_in_lane = np.full((NO_OF_SIGNALS, 3), -1, dtype=np.int32)
+        # Vehicles that arrived and that crossed the stop line, per direction, with their waiting ticks
+        self.arrived = np.zeros(NO_OF_SIGNALS, dtype=np.int64)
+        self.crossed = np.zeros(NO_OF_SIGNALS, dtype=np.int64)
+        # Waiting vehicles per direction at the last tick
+        self.queue = np.zeros(NO_OF_SIGNALS, dtype=np.int64)
+        self.wait_ticks = 0
+        self.max_queue = 0
+        # Waiting ticks of all vehicles, crossed or not
+        self.delay_ticks = 0
+
+    @property
+    def time_elapsed(self):
+        return self.tick // self.ticks_per_second
+
+    @property
+    def finished(self):
+        return self.time_elapsed >= self.sim_time
+
+    def step(self):
+        """Advance one tick: signal timers on whole seconds, then arrivals, then movement."""
+        if self.tick % self.ticks_per_second == 0:
+            self.retire()
+            self.controller.step()
+        self.advance()
+
+    def advance(self):
+        """Arrivals and movement of the current tick; the rest of step() after the
+        signal timers, where a snapshot taken by a planner resumes."""
+        for vehicle in self.arrivals.take(self.rng, self.tick, self.ticks_per_second):
+            self.add_vehicle(*vehicle)
+        self.move(self.controller.green)
+        self.tick += 1
+
+    def run(self, seconds=None):
+        """Step until `seconds` more simulated seconds have passed (default: to sim_time)."""
+        end = self.sim_time if seconds is None else self.time_elapsed + seconds
+        end_tick = end * self.ticks_per_second
+        while self.tick < end_tick:
+            self.step()
+        return self.summary()
+
+    def move(self, green):
+        """Stop-line, gap and turn rules of the original sprites, for all vehicles at once.
+        Distances along the direction of travel are signed, so one comparison
+        covers all four approaches."""
+        n = self.count
+        if not n:
+            return
+        c = self.columns
+        x, y = c['x'][:n], c['y'][:n]
+        width, height = c['width'][:n], c['height'][:n]
+        crossed, turned = c['crossed'][:n], c['turned'][:n]
+        sign, horizontal = c['sign'][:n], c['horizontal'][:n]
+
+        pos = np.where(horizontal, x, y)
+        size = np.where(horizontal, width, height)
+        # Front of the vehicle and rear of the vehicle ahead, along the direction of travel
+        forward = sign > 0
+        front = sign * (pos + size * forward)
+        leader = c['leader'][:n]
+        alone = leader < 0
+        ahead = np.maximum(leader, 0)
+        rear = sign * (pos[ahead] + size[ahead] * ~forward[ahead])
+
+        crossing = (front > c['stop_line'][:n]) & ~crossed
+        if crossing.any():
+            self.crossed += np.bincount(c['direction'][:n][crossing], minlength=NO_OF_SIGNALS)
+            self.wait_ticks += int(c['waited'][:n][crossing].sum())
+            crossed |= crossing
+        turning = (front >= c['mid'][:n]) & crossed & c['will_turn'][:n]
+
+        # Approach: move up to the stop position unless green or crossed, keeping the gap
+        go = ((front <= sign * c['stop'][:n]) | (c['direction'][:n] == green) | crossed)
+        go &= alone | (front < rear - GAP2) | turned[ahead]
+        go &= ~turning
+        step = c['speed'][:n] * sign * go
+        x += step * horizontal
+        y += step * ~horizontal
+
+        waiting = ~(go | crossed)
+        c['waited'][:n] += waiting
+        directions = c['direction'][:n][waiting]
+        self.delay_ticks += directions.size
+        self.queue = np.bincount(directions, minlength=NO_OF_SIGNALS)
+        queue = self.queue.max()
+        if queue > self.max_queue:
+            self.max_queue = int(queue)
+
+        if turning.any():
+            self._turn(np.flatnonzero(turning))
+
+    def _turn(self, rows):
+        """Rotate vehicles in the middle of their turn a step further, and move
+        the ones that have turned along the exit road while it is clear."""
+        c = self.columns
+        x, y, width, height = c['x'], c['y'], c['width'], c['height']
+        turned = c['turned'][rows]
+
+        done = rows[turned]
+        if done.size:
+            direction = c['direction'][done]
+            leader = c['leader'][done]
+            ahead = np.maximum(leader, 0)
+            geometry = np.stack([x[done], y[done], width[done], height[done],
+                                 x[ahead], y[ahead], width[ahead], height[ahead]], axis=1)
+            clear = (((geometry * _EXIT_GAP_A[direction]).sum(axis=1) + GAP2 < 0)
+                     | ((geometry * _EXIT_GAP_B[direction]).sum(axis=1) + GAP2 < 0)
+                     | (leader < 0))
+            moving = done[clear]
+            speed = c['speed'][moving]
+            d = direction[clear]
+            x[moving] += speed * _EXIT_DX[d]
+            y[moving] += speed * _EXIT_DY[d]
+
+        rotating = rows[~turned]
+        if rotating.size:
+            angle = c['angle'][rotating] + ROTATION_ANGLE
+            c['angle'][rotating] = angle
+            k = angle // ROTATION_ANGLE
+            base_w, base_h = c['base_width'][rotating], c['base_height'][rotating]
+            width[rotating] = np.floor(TURN_COS[k] * base_w + TURN_SIN[k] * base_h)
+            height[rotating] = np.floor(TURN_SIN[k] * base_w + TURN_COS[k] * base_h)
+            d = c['direction'][rotating]
+            x[rotating] += _TURN_DX[d]
+            y[rotating] += _TURN_DY[d]
+            c['turned'][rotating] = angle == 90
+
+    def release_stops(self, signal_index):
+        """Green is over: waiting vehicles of the approach stop at the stop line again."""
+        n = self.count
+        stop = self.columns['stop'][:n]
+        stop[self.columns['direction'][:n] == signal_index] = DEFAULT_STOP[DIRECTION_NUMBERS[signal_index]]
+
+    def waiting_counts(self, signal_index):
+        """Vehicles of the approach that have not crossed the stop line, per class.
+        Lane 0 only carries bikes."""
+        n = self.count
+        c = self.columns
+        waiting = (c['direction'][:n] == signal_index) & ~c['crossed'][:n]
+        lanes = c['lane'][:n][waiting]
+        classes = c['vehicle_class'][:n][waiting]
+        per_class = np.bincount(classes[(lanes > 0) & (classes != BIKE)], minlength=len(VEHICLE_TYPES))
+        counts = {VEHICLE_TYPES[i]: int(per_class[i]) for i in VEHICLE_TYPES}
+        counts['bike'] = int(np.count_nonzero(lanes == 0))
+        return counts
+
+    def retire(self):
+        """Free the rows of vehicles that crossed and left the screen. Freed
+        rows stay in the table as crossed, stopped vehicles, which the update
+        leaves alone, until add_vehicle() reuses them."""
+        n = self.count
+        c = self.columns
+        x, y = c['x'][:n], c['y'][:n]
+        gone = c['active'][:n] & c['crossed'][:n] & (
+            (x > SCREEN_WIDTH) | (x + c['width'][:n] < 0) | (y > SCREEN_HEIGHT) | (y + c['height'][:n] < 0))
+        if not gone.any():
+            return
+        rows = np.flatnonzero(gone)
+        c['active'][rows] = False
+        c['speed'][rows] = 0
+        c['will_turn'][rows] = False
+        # Nothing is ahead of the vehicles that followed them any more
+        leader = c['leader'][:n]
+        leader[np.isin(leader, rows)] = -1
+        self.last_in_lane[np.isin(self.last_in_lane, rows)] = -1
+        self.free.extend(rows.tolist())
+
+    def add_vehicle(self, lane, vehicle_type, direction_number, will_turn):
+        """Place a vehicle at the spawn point of its lane and return its row."""
+        c = self.columns
+        if self.free:
+            row = self.free.pop()
+        else:
+            if self.count == len(c['x']):
+                for name, column in c.items():
+                    c[name] = np.concatenate([column, np.zeros_like(column)])
+            row = self.count
+            self.count += 1
+        self.arrived[direction_number] += 1
+        direction = DIRECTION_NUMBERS[direction_number]
+        width, height = sprite_size(direction, VEHICLE_TYPES[vehicle_type])
+        leader = int(self.last_in_lane[direction_number, lane])
+        self.last_in_lane[direction_number, lane] = row
+
+        x, y = START_X[direction][lane], START_Y[direction][lane]
+        if leader >= 0:
+            # Spawn behind the vehicle ahead while it is still near the start
+            if direction == 'right':
+                x = min(x, c['x'][leader] - width - GAP)
+            elif direction == 'left':
+                x = max(x, c['x'][leader] + c['width'][leader] + GAP)
+            elif direction == 'down':
+                y = min(y, c['y'][leader] - height - GAP)
+            else:
+                y = max(y, c['y'][leader] + c['height'][leader] + GAP)
+
+        queued = leader >= 0 and not c['crossed'][leader]
+        # Stop behind the vehicle ahead while it waits
+        if direction == 'right':
+            stop = c['stop'][leader] - c['width'][leader] - GAP if queued else DEFAULT_STOP[direction]
+        elif direction == 'left':
+            stop = c['stop'][leader] + c['width'][leader] + GAP if queued else DEFAULT_STOP[direction]
+        elif direction == 'down':
+            stop = c['stop'][leader] - c['height'][leader] - GAP if queued else DEFAULT_STOP[direction]
+        else:
+            stop = c['stop'][leader] + c['height'][leader] + GAP if queued else DEFAULT_STOP[direction]
+
+        sign = _SIGN[direction_number]
+        values = {
+            'x': x, 'y': y,
+            'width': width, 'height': height, 'base_width': width, 'base_height': height,
+            'speed': _SPEEDS[vehicle_type], 'stop': stop,
+            'direction': direction_number, 'lane': lane, 'vehicle_class': vehicle_type, 'angle': 0,
+            'crossed': False, 'will_turn': bool(will_turn), 'turned': False, 'leader': leader, 'active': True,
+            'waited': 0,
+            'sign': sign, 'horizontal': _HORIZONTAL[direction_number],
+            'stop_line': sign * _STOP_LINE[direction_number], 'mid': sign * _MID[direction_number],
+        }
+        for name, value in values.items():
+            c[name][row] = value
+        return row
+
+    def sprites(self):
+        """(direction, vehicle class, rotation angle, x, y) of every vehicle, for drawing."""
+        c = self.columns
+        rows = np.flatnonzero(c['active'][:self.count])
+        for d, k, angle, x, y in zip(c['direction'][rows].tolist(), c['vehicle_class'][rows].tolist(),
+                                     c['angle'][rows].tolist(), c['x'][rows].tolist(), c['y'][rows].tolist()):
+            yield DIRECTION_NUMBERS[d], VEHICLE_TYPES[k], angle, x, y
+
+    def snapshot(self):
+        """Complete state as plain values, NumPy arrays and the (stateless) arrival
+        generator; picklable, about 15 KB at 100 vehicles."""
+        n = self.count
+        return {
+            'config': {'sim_time': self.sim_time, 'ticks_per_second': self.ticks_per_second,
+                       'timing': dict(self.controller.timing), 'arrivals': self.arrivals},
+            'tick': self.tick,
+            'rng': self.rng.getstate(),
+            'controller': self.controller.state(),
+            'columns': {name: column[:n].copy() for name, column in self.columns.items()},
+            'free': list(self.free),
+            'last_in_lane': self.last_in_lane.copy(),
+            'arrived': self.arrived.copy(),
+            'crossed': self.crossed.copy(),
+            'queue': self.queue.copy(),
+            'wait_ticks': self.wait_ticks,
+            'max_queue': self.max_queue,
+            'delay_ticks': self.delay_ticks,
+        }
+
+    @classmethod
+    def from_snapshot(cls, state, verbose=False):
+        """A new simulation continuing from `state`; it has no planner."""
+        columns = state['columns']
+        n = len(columns['x'])
+        sim = cls(seed=0, verbose=verbose, capacity=max(n, 1), **state['config'])
+        sim.tick = state['tick']
+        sim.rng.setstate(state['rng'])
+        sim.controller.load_state(state['controller'])
+        for name, values in columns.items():
+            sim.columns[name][:n] = values
+        sim.count = n
+        sim.free = list(state['free'])
+        sim.last_in_lane[:] = state['last_in_lane']
+        sim.arrived[:] = state['arrived']
+        sim.crossed[:] = state['crossed']
+        sim.queue[:] = state['queue']
+        sim.wait_ticks = state['wait_ticks']
+        sim.max_queue = state['max_queue']
+        sim.delay_ticks = state['delay_ticks']
+        return sim
+
+    def fork(self):
+        return Simulation.from_snapshot(self.snapshot())
+
+    def summary(self):
+        crossed = {DIRECTION_NUMBERS[i]: int(self.crossed[i]) for i in range(NO_OF_SIGNALS)}
+        total = sum(crossed.values())
+        elapsed = max(1, self.time_elapsed)
+        average_wait = self.wait_ticks / self.ticks_per_second / total if total else 0.0
+        return {'crossed': crossed, 'total': total, 'time': self.time_elapsed, 'per_second': total / elapsed,
+                'average_wait': average_wait, 'max_queue': self.max_queue}
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from simulation import Simulation, LegacyArrivals, DEFAULT_TIMING, SIM_TIME
+from arrivals import PoissonArrivals, TraceArrivals
+
+# Parameter sweep of the green-time formula: every combination of the grid
+# runs headless under each arrival profile and seed across a process pool,
+# and configurations are ranked by their mean average wait, throughput or
+# worst queue.
+#
+#   python sweep.py --grid car=1.5,2,2.5 lanes=1,2,3 minimum=5,10 --seeds 4
+#   python sweep.py --grid maximum=40,60,90 --profiles default peak --output sweep.json
+#   python sweep.py --grid minimum=5,10 --trace vehicle_testing.csv --profiles trace
+
+# Arrival profiles. Legacy ones: seconds between vehicles and cumulative
+# direction split out of 1000; Poisson ones: vehicles per hour for right,
+# down, left and up (the default profile is about 1920, 1920, 480, 480).
+PROFILES = {
+    'light': LegacyArrivals(1.5),
+    'default': LegacyArrivals(0.75),
+    'peak': LegacyArrivals(0.4),
+    'unbalanced': LegacyArrivals(0.75, [550, 900, 950, 1000]),
+    'poisson': PoissonArrivals([1920, 1920, 480, 480]),
+    # Off-peak, a peak from 60s to 180s, then off-peak again
+    'rush': PoissonArrivals([1920, 1920, 480, 480], schedule=[(0, 0.6), (60, 1.6), (180, 0.6)]),
+    # More heavy vehicles
+    'freight': PoissonArrivals([1920, 1920, 480, 480], mix={'car': 3, 'bus': 2, 'truck': 3, 'rickshaw': 1, 'bike': 1}),
+}
+# Timing parameters that must be whole numbers
+INTEGER_PARAMETERS = ('lanes', 'minimum', 'maximum')
+OBJECTIVES = {
+    # name: (result key, True when higher is better)
+    'wait': ('average_wait', False),
+    'throughput': ('throughput', True),
+    'queue': ('max_queue', False),
+}
+
+
+def parse_grid(specs):
+    """['car=1.5,2', 'lanes=2,3'] -> {'car': [1.5, 2.0], 'lanes': [2, 3]}"""
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        if name not in DEFAULT_TIMING or not values:
+            raise ValueError(f"Expected NAME=V1,V2,... with NAME one of {', '.join(DEFAULT_TIMING)}: {spec}")
+        grid[name] = [float(v) for v in values.split(',')]
+        if name in INTEGER_PARAMETERS:
+            # Signal timers count whole seconds
+            if any(not v.is_integer() for v in grid[name]):
+                raise ValueError(f"{name} takes whole numbers: {spec}")
+            grid[name] = [int(v) for v in grid[name]]
+    return grid
+
+
+def configurations(grid):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def run_simulation(timing, arrivals, seed, sim_time):
+    return Simulation(sim_time=sim_time, seed=seed, timing=timing, arrivals=arrivals).run()
+
+
+def _run_task(task):
+    index, timing, arrivals, seed, sim_time = task
+    return index, run_simulation(timing, arrivals, seed, sim_time)
+
+
+def sweep(grid, profiles=('default',), seeds=(0,), sim_time=SIM_TIME, workers=None, objective='wait', trace=None):
+    """Run every configuration of `grid` under every profile and seed.
+    Returns the per-configuration means, ranked best first, and the best one.
+    The 'trace' profile replays `trace` (a TraceArrivals)."""
+    key, higher_is_better = OBJECTIVES[objective]
+    configs = configurations(grid)
+    generators = {profile: trace if profile == 'trace' else PROFILES[profile] for profile in profiles}
+    tasks = [(i, timing, generators[profile], seed, sim_time)
+             for i, timing in enumerate(configs) for profile in profiles for seed in seeds]
+    workers = workers or os.cpu_count() or 1
+    runs = [[] for _ in configs]
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        chunksize = max(1, len(tasks) // (workers * 4))
+        for index, summary in pool.map(_run_task, tasks, chunksize=chunksize):
+            runs[index].append(summary)
+
+    results = []
+    for timing, summaries in zip(configs, runs):
+        results.append({
+            'timing': dict(DEFAULT_TIMING, **timing),
+            'runs': len(summaries),
+            'throughput': sum(s['per_second'] for s in summaries) / len(summaries),
+            'average_wait': sum(s['average_wait'] for s in summaries) / len(summaries),
+            'max_queue': max(s['max_queue'] for s in summaries),
+        })
+    results.sort(key=lambda r: r[key], reverse=higher_is_better)
+    return {'objective': objective, 'profiles': list(profiles), 'seeds': list(seeds), 'sim_time': sim_time,
+            'results': results, 'best': results[0] if results else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep the green-time parameters of the signal simulation")
+    parser.add_argument('--grid', nargs='+', default=[], metavar='NAME=V1,V2',
+                        help=f"Values per parameter ({', '.join(DEFAULT_TIMING)}); others keep their defaults")
+    parser.add_argument('--profiles', nargs='+', default=['default'], choices=sorted(PROFILES) + ['trace'])
+    parser.add_argument('--trace', default=None, help="ANPR-ATCC vehicle_testing.csv replayed by the 'trace' profile")
+    parser.add_argument('--seeds', type=int, default=3, help="Seeds 0..N-1 per configuration and profile")
+    parser.add_argument('--time', type=int, default=SIM_TIME, help="Simulated seconds per run")
+    parser.add_argument('--workers', type=int, default=None, help="Processes (default: CPU count)")
+    parser.add_argument('--objective', default='wait', choices=sorted(OBJECTIVES))
+    parser.add_argument('--top', type=int, default=10, help="Configurations to print")
+    parser.add_argument('--output', default=None, help="Write all results as JSON")
+    args = parser.parse_args()
+
+    try:
+        grid = parse_grid(args.grid)
+    except ValueError as e:
+        parser.error(str(e))
+    trace = None
+    if 'trace' in args.profiles:
+        if not args.trace:
+            parser.error("The trace profile needs --trace")
+        trace = TraceArrivals.from_csv(args.trace, repeat=True)
+    start = time.perf_counter()
+    report = sweep(grid, args.profiles, range(args.seeds), args.time, args.workers, args.objective, trace)
+    elapsed = time.perf_counter() - start
+    runs = sum(r['runs'] for r in report['results'])
+    print(f"{runs} runs of {args.time}s in {elapsed:.1f}s")
+
+    names = list(grid) or ['lanes']
+    print(''.join(f"{name:>10}" for name in names) + f"{'veh/s':>10}{'wait s':>10}{'max queue':>11}")
+    for r in report['results'][:args.top]:
+        print(''.join(f"{r['timing'][name]:>10g}" for name in names)
+              + f"{r['throughput']:>10.3f}{r['average_wait']:>10.1f}{r['max_queue']:>11}")
+    print(f"Best ({args.objective}): {json.dumps(report['best']['timing'])}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
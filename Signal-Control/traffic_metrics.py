@@ -0,0 +1,105 @@
+import os
+import json
+
+import numpy as np
+
+from simulation import DIRECTION_NUMBERS, NO_OF_SIGNALS
+
+# Per-tick time series of a Simulation: queue length, arrivals and departures
+# per approach, the signal phase, and whether each green was used. The arrays
+# are allocated for the whole run up front; export() writes them as one
+# compressed .npz with a JSON summary next to it (the part returned by the
+# job API). Phase p means signal p // 2 shows green (p even) or yellow (odd).
+
+
+def phase_of(controller):
+    return 2 * controller.current_green + controller.current_yellow
+
+
+class MetricsRecorder:
+    def __init__(self, sim, ticks=None):
+        if ticks is None:
+            ticks = max(1, sim.sim_time * sim.ticks_per_second - sim.tick)
+        self.ticks_per_second = sim.ticks_per_second
+        self.start_tick = sim.tick
+        self.count = 0
+        self.queue = np.zeros((ticks, NO_OF_SIGNALS), dtype=np.int16)
+        self.arrivals = np.zeros((ticks, NO_OF_SIGNALS), dtype=np.int16)
+        self.departures = np.zeros((ticks, NO_OF_SIGNALS), dtype=np.int16)
+        self.phase = np.zeros(ticks, dtype=np.int8)
+        # Green shown while the approach had vehicles waiting or crossing
+        self.green_used = np.zeros((ticks, NO_OF_SIGNALS), dtype=np.bool_)
+        self._arrived = sim.arrived.copy()
+        self._crossed = sim.crossed.copy()
+
+    def record(self, sim):
+        """Add the tick `sim` has just stepped through."""
+        i = self.count
+        if i == len(self.phase):
+            for name in ('queue', 'arrivals', 'departures', 'phase', 'green_used'):
+                column = getattr(self, name)
+                setattr(self, name, np.concatenate([column, np.zeros_like(column)]))
+        self.queue[i] = sim.queue
+        self.arrivals[i] = sim.arrived - self._arrived
+        self.departures[i] = sim.crossed - self._crossed
+        self._arrived[:] = sim.arrived
+        self._crossed[:] = sim.crossed
+        controller = sim.controller
+        self.phase[i] = phase_of(controller)
+        green = controller.green
+        if green >= 0 and (self.queue[i, green] or self.departures[i, green]):
+            self.green_used[i, green] = True
+        self.count = i + 1
+
+    def series(self):
+        n = self.count
+        return {'queue': self.queue[:n], 'arrivals': self.arrivals[:n], 'departures': self.departures[:n],
+                'phase': self.phase[:n], 'green_used': self.green_used[:n]}
+
+    def summary(self):
+        series = self.series()
+        seconds = self.count / self.ticks_per_second
+        phase = series['phase']
+        green_ticks = np.bincount(phase[phase % 2 == 0] // 2, minlength=NO_OF_SIGNALS)
+        used_ticks = series['green_used'].sum(axis=0)
+        approaches = {}
+        for i in range(NO_OF_SIGNALS):
+            approaches[DIRECTION_NUMBERS[i]] = {
+                'arrivals': int(series['arrivals'][:, i].sum()),
+                'departures': int(series['departures'][:, i].sum()),
+                'mean_queue': round(float(series['queue'][:, i].mean()), 2) if self.count else 0.0,
+                'max_queue': int(series['queue'][:, i].max()) if self.count else 0,
+                'green_seconds': round(green_ticks[i] / self.ticks_per_second, 2),
+                'green_utilization': round(used_ticks[i] / green_ticks[i], 3) if green_ticks[i] else 0.0,
+            }
+        return {'seconds': seconds, 'ticks_per_second': self.ticks_per_second,
+                'phase_changes': int(np.count_nonzero(np.diff(phase))), 'approaches': approaches}
+
+    def export(self, path, totals=None):
+        """Write the series to `path` (.npz) and the summary, with the simulation's
+        `totals` if given, to the same name with .json; returns the summary."""
+        path = npz_path(path)
+        summary = self.summary()
+        if totals is not None:
+            summary['totals'] = totals
+        np.savez_compressed(path, ticks_per_second=self.ticks_per_second, start_tick=self.start_tick,
+                            **self.series())
+        with open(summary_path(path), 'w') as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+
+def npz_path(path):
+    """`path` as np.savez writes it: with .npz appended unless it has it."""
+    return path if path.endswith('.npz') else path + '.npz'
+
+
+def summary_path(path):
+    base, _ = os.path.splitext(path)
+    return base + '.json'
+
+
+def load_series(path):
+    """The arrays written by MetricsRecorder.export()."""
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
@@ -1,14 +1,21 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
 import shutil
 import subprocess
 import sys
-import importlib
+import json
 import threading
 import uuid
 import time
+import math
+import metrics
+import pipelines
+from job_runner import MAX_CONCURRENT_JOBS, JobControl
+from job_queue import FINISHED_STATUSES, get_broker
+from cost_model import CostModel, job_units, wait_seconds
+from pipelines import ANPR_RESULTS_DIR, PRELOAD_MODELS, job_timeout, preload_models, run_job, to_payload_path
 
 app = Flask(__name__)
 # Allow broad CORS during development to avoid "Failed to fetch" due to origin/preflight issues
@@ -41,168 +48,280 @@ os.makedirs(SIGNAL_RESULTS_DIR, exist_ok=True)
 ALLOWED_VIDEO_EXTS = {"mp4", "mov", "avi", "mkv", "webm"}
 ALLOWED_IMAGE_EXTS = {"png", "jpg", "jpeg", "gif", "bmp", "webp"}
 
-# In-memory job store
-JOBS = {}
-
-def run_anpr_pipeline(job_id, anpr_dir):
-    try:
-        JOBS[job_id]['status'] = 'processing'
-        
-        # Step 1: main.py
-        res1 = subprocess.run([sys.executable, 'main.py'], cwd=anpr_dir, check=False, capture_output=True, text=True)
-        if res1.returncode != 0:
-            JOBS[job_id]['status'] = 'failed'
-            JOBS[job_id]['error'] = f"main.py failed: {res1.stderr}"
-            return
-
-        # Step 2: add_missing_data.py
-        res2 = subprocess.run([sys.executable, 'add_missing_data.py'], cwd=anpr_dir, check=False, capture_output=True, text=True)
-        if res2.returncode != 0:
-            JOBS[job_id]['status'] = 'failed'
-            JOBS[job_id]['error'] = f"add_missing_data.py failed: {res2.stderr}"
-            return
-
-        # Step 3: visualize.py
-        res3 = subprocess.run([sys.executable, 'visualize.py'], cwd=anpr_dir, check=False, capture_output=True, text=True)
-        if res3.returncode != 0:
-            JOBS[job_id]['status'] = 'failed'
-            JOBS[job_id]['error'] = f"visualize.py failed: {res3.stderr}"
-            return
-
-        # Success
-        output_annotated_path = os.path.join(VIDEOS_DIR, 'Results', 'output_annotated.webm')
-        if not os.path.isfile(output_annotated_path):
-            JOBS[job_id]['status'] = 'failed'
-            JOBS[job_id]['error'] = "Output video not found"
-            return
+# local: jobs run in threads of this process; queue: jobs are put on the broker
+# (ITS_BROKER_URL) and run by worker.py processes, possibly on other nodes
+EXECUTION = os.environ.get('ITS_EXECUTION', 'local')
+BROKER = get_broker() if EXECUTION == 'queue' else None
 
-        JOBS[job_id]['status'] = 'completed'
-        JOBS[job_id]['result_url'] = "/media/anpr-atcc/Results/output_annotated.webm"
+# In-memory job store (local execution)
+JOBS = {}
+# JobControl per job id (cancellation and time limit); kept out of JOBS, which is returned as JSON
+JOB_CONTROLS = {}
 
-    except Exception as e:
-        JOBS[job_id]['status'] = 'failed'
-        JOBS[job_id]['error'] = str(e)
+# Admission control: uploads are refused with 429 once the estimated wait for a
+# free job slot exceeds this many seconds (0 = accept everything). Per-pipeline
+# overrides: ITS_ANPR_MAX_QUEUE_SECONDS, ITS_ACCIDENT_MAX_QUEUE_SECONDS, ...
+MAX_QUEUE_SECONDS = int(os.environ.get('ITS_MAX_QUEUE_SECONDS', '1800'))
+COST_MODEL = CostModel()
+ADMISSION_LOCK = threading.Lock()
 
-def run_accident_pipeline(job_id, cmd, output_video_path, output_filename):
+def create_job(job_type):
+    job_id = str(uuid.uuid4())
+    JOBS[job_id] = {'status': 'queued', 'type': job_type, 'created_at': time.time()}
+    return job_id
+
+def get_job(job_id):
+    if BROKER is not None:
+        return BROKER.get(job_id)
+    return JOBS.get(job_id)
+
+def queue_wait_seconds():
+    now = time.time()
+    running, queued = [], []
+    if BROKER is not None:
+        jobs = BROKER.active()
+        slots = max(1, BROKER.total_slots())
+    else:
+        jobs = [job for job in list(JOBS.values()) if job['status'] not in FINISHED_STATUSES]
+        slots = MAX_CONCURRENT_JOBS
+    for job in jobs:
+        if 'estimate_seconds' not in job:
+            continue
+        if 'started_at' not in job:
+            queued.append(job['estimate_seconds'])
+        else:
+            running.append(max(0.0, job['estimate_seconds'] - (now - job['started_at'])))
+    return wait_seconds(running, queued, slots)
+
+def admit_job(job_type, video_paths=None):
+    """Create a job if the queue has room for it.
+    Returns (job_id, None), or (None, response) with the 400/429 response to send.
+    """
     try:
-        JOBS[job_id]['status'] = 'processing'
-        print(f"Running command: {' '.join(cmd)}")
-        
-        res = subprocess.run(cmd, check=False, capture_output=True, text=True)
-        
-        if res.returncode != 0:
-            JOBS[job_id]['status'] = 'failed'
-            JOBS[job_id]['error'] = f"Accident detection failed: {res.stderr}"
-            return
-
-        if not os.path.isfile(output_video_path):
-            JOBS[job_id]['status'] = 'failed'
-            JOBS[job_id]['error'] = "Output video not generated"
-            return
-
-        JOBS[job_id]['status'] = 'completed'
-        JOBS[job_id]['result_url'] = f"/media/accident/Results/{output_filename}"
-
+        units = job_units(video_paths)
     except Exception as e:
-        JOBS[job_id]['status'] = 'failed'
-        JOBS[job_id]['error'] = str(e)
-
-def run_emergency_pipeline(job_id, cmd, output_video_path, output_filename):
-    try:
-        JOBS[job_id]['status'] = 'processing'
-        print(f"Running emergency command: {' '.join(cmd)}")
-        
-        res = subprocess.run(cmd, check=False, capture_output=True, text=True)
-        
-        if res.returncode != 0 and not os.path.isfile(output_video_path):
-            JOBS[job_id]['status'] = 'failed'
-            JOBS[job_id]['error'] = f"Emergency detection failed: {res.stderr}"
-            return
-
-        if not os.path.isfile(output_video_path):
-            JOBS[job_id]['status'] = 'failed'
-            JOBS[job_id]['error'] = "Output video not generated"
-            return
+        return None, (jsonify({"error": f"Could not read video: {e}"}), 400)
+
+    pipeline = job_type.split('_')[0]
+    limit = int(os.environ.get(f"ITS_{pipeline.upper()}_MAX_QUEUE_SECONDS", MAX_QUEUE_SECONDS))
+    with ADMISSION_LOCK:
+        estimate = COST_MODEL.estimate(job_type, units)
+        wait = queue_wait_seconds()
+        if limit and wait > limit:
+            response = jsonify({"error": "Too many jobs queued, try again later",
+                                "queue_seconds": round(wait, 1), "limit_seconds": limit})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(int(math.ceil(wait - limit)) + 1)
+            return None, response
+        job_id = create_job(job_type)
+        JOBS[job_id].update({
+            'cost_units': round(units, 2),
+            'estimate_seconds': round(estimate, 1),
+            'queue_seconds': round(wait, 1),
+            'eta': round(time.time() + wait + estimate),
+        })
+    return job_id, None
+
+def job_response(job_id):
+    job = get_job(job_id)
+    return {"jobId": job_id, "status": job['status'], "estimate_seconds": job['estimate_seconds'],
+            "queue_seconds": job['queue_seconds'], "eta": job['eta']}
+
+def record_throughput(job):
+    if job['status'] == 'completed' and 'started_at' in job and 'cost_units' in job:
+        COST_MODEL.observe(job['type'], job['cost_units'], time.time() - job['started_at'])
+
+def run_local_job(job_id, job_type, payload):
+    run_job(JOBS[job_id], job_type, payload, JOB_CONTROLS[job_id])
+    record_throughput(JOBS[job_id])
+    metrics.observe_job(JOBS[job_id])
+
+def submit_job(job_id, payload):
+    """Start an admitted job in a local thread or hand it to the workers.
+    Paths in `payload` go through to_payload_path().
+    """
+    job_type = JOBS[job_id]['type']
+    if BROKER is not None:
+        BROKER.enqueue(job_id, job_type, payload, JOBS.pop(job_id))
+        return
+    JOB_CONTROLS[job_id] = JobControl(job_timeout(job_type))
+    thread = threading.Thread(target=run_local_job, args=(job_id, job_type, payload))
+    thread.start()
 
-        JOBS[job_id]['status'] = 'completed'
-        JOBS[job_id]['result_url'] = f"/media/emergency/Results/{output_filename}"
-
-    except Exception as e:
-        JOBS[job_id]['status'] = 'failed'
-        JOBS[job_id]['error'] = str(e)
+if PRELOAD_MODELS and EXECUTION == 'local':
+    pipelines.PRELOAD_MODELS = preload_models()
 
 @app.route("/api/status/<job_id>", methods=["GET"])
 def get_status(job_id):
-    job = JOBS.get(job_id)
+    job = get_job(job_id)
     if not job:
         return jsonify({"error": "Job not found"}), 404
     return jsonify(job)
 
+@app.route("/api/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    """Cancel a queued or running job; its process tree is killed and partial outputs removed."""
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if job['status'] in FINISHED_STATUSES:
+        return jsonify({"error": f"Job already {job['status']}", "status": job['status']}), 409
+    if BROKER is not None:
+        # Queued jobs are cancelled in the broker, running ones by their worker's next heartbeat
+        status = BROKER.request_cancel(job_id)
+        return jsonify({"jobId": job_id, "status": status}), 200 if status == 'cancelled' else 202
+    JOB_CONTROLS[job_id].stop('cancelled')
+    if job['status'] == 'queued':
+        job['status'] = 'cancelled'
+        job['error'] = "Job cancelled"
+        return jsonify({"jobId": job_id, "status": "cancelled"}), 200
+    return jsonify({"jobId": job_id, "status": "cancelling"}), 202
+
+UPLOAD_ENDPOINTS = {
+    'upload_anpr_atcc': 'anpr',
+    'upload_accident': 'accident',
+    'upload_emergency': 'emergency',
+    'signal_upload': 'signal_detection',
+}
+
+@app.after_request
+def count_upload_bytes(response):
+    job_type = UPLOAD_ENDPOINTS.get(request.endpoint)
+    if job_type and response.status_code == 202 and request.content_length:
+        metrics.UPLOAD_BYTES.inc(request.content_length, type=job_type)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus scrape target; job counters are those of this process."""
+    if BROKER is not None:
+        jobs = BROKER.active()
+        slots = BROKER.total_slots()
+    else:
+        jobs = [job for job in list(JOBS.values()) if job['status'] not in FINISHED_STATUSES]
+        slots = MAX_CONCURRENT_JOBS
+    by_state = {}
+    for job in jobs:
+        key = (job['type'], job['status'])
+        by_state[key] = by_state.get(key, 0) + 1
+    gauges = [
+        ('its_jobs', "Queued and processing jobs",
+         [({'type': job_type, 'status': status}, n) for (job_type, status), n in sorted(by_state.items())]),
+        ('its_queue_wait_estimate_seconds', "Estimated wait for a free job slot", [({}, queue_wait_seconds())]),
+        ('its_job_slots', "Job slots of this process (local) or of all live workers (queue)", [({}, slots)]),
+    ]
+    return Response(metrics.render(gauges), content_type=metrics.CONTENT_TYPE)
+
+# Health probe: runs once at boot and then refreshes in the background, so the
+# endpoint never pays for importing the heavy ML dependencies.
+HEALTH_REFRESH_SECONDS = int(os.environ.get('ITS_HEALTH_REFRESH', '300'))
+HEALTH_DEPENDENCIES = ['flask', 'flask_cors', 'ultralytics', 'easyocr', 'cv2', 'numpy', 'scipy', 'pandas']
+# Imports run in a throwaway interpreter to keep torch & co. out of the web process
+DEPENDENCY_PROBE = (
+    "import importlib, json, sys\n"
+    "res = {}\n"
+    "for mod in sys.argv[1:]:\n"
+    "    try:\n"
+    "        importlib.import_module(mod)\n"
+    "        res[mod] = True\n"
+    "    except Exception as e:\n"
+    "        res[mod] = f'Error: {e}'\n"
+    "print(json.dumps(res))\n"
+)
+HEALTH_STATE = {'result': None, 'pid': None}
+HEALTH_LOCK = threading.Lock()
+
+def probe_dependencies(modules):
+    try:
+        res = subprocess.run([sys.executable, '-c', DEPENDENCY_PROBE] + modules,
+                             check=False, capture_output=True, text=True, timeout=300)
+        return json.loads(res.stdout.strip().splitlines()[-1])
+    except Exception as e:
+        return {mod: f"Error: {e}" for mod in modules}
+
+def probe_anpr_atcc():
+    """Verifies directories, models, scripts, dependencies, and pipeline outputs.
+    Does not execute the heavy pipeline.
+    """
+    base_dir = BASE_DIR
+    anpr_dir = os.path.join(base_dir, 'ANPR-ATCC')
+    models_dir = os.path.join(base_dir, 'Models')
+    data_dir = os.path.join(base_dir, 'Data', 'ANPR-ATCC')
+    results_dir = os.path.join(data_dir, 'Results')
+    interp_dir = os.path.join(results_dir, 'Interpolated_Results')
+
+    # Directory and file existence checks
+    checks = {
+        'dirs': {
+            'backend': os.path.isdir(base_dir),
+            'anpr_dir': os.path.isdir(anpr_dir),
+            'models_dir': os.path.isdir(models_dir),
+            'data_dir': os.path.isdir(data_dir),
+            'results_dir': os.path.isdir(results_dir),
+            'interpolated_dir': os.path.isdir(interp_dir),
+        },
+        'scripts': {
+            'main.py': os.path.isfile(os.path.join(anpr_dir, 'main.py')),
+            'add_missing_data.py': os.path.isfile(os.path.join(anpr_dir, 'add_missing_data.py')),
+            'visualize.py': os.path.isfile(os.path.join(anpr_dir, 'visualize.py')),
+        },
+        'models': {
+            'yolov8x.pt': os.path.isfile(os.path.join(models_dir, 'yolov8x.pt')),
+            'License-Plate.pt': os.path.isfile(os.path.join(models_dir, 'License-Plate.pt')),
+        },
+        'artifacts': {
+            'input_video': os.path.isfile(os.path.join(data_dir, 'anpr_atcc.mp4')),
+            'main_csv': os.path.isfile(os.path.join(results_dir, 'main.csv')),
+            'interpolated_csv': os.path.isfile(os.path.join(interp_dir, 'vehicle_testing.csv')),
+            'annotated_video': os.path.isfile(os.path.join(results_dir, 'output_annotated.webm')),
+        },
+        # Dependency import checks
+        'dependencies': probe_dependencies(HEALTH_DEPENDENCIES),
+    }
+
+    # Aggregate overall status
+    def all_true(d):
+        return all((v if isinstance(v, bool) else False) for v in d.values())
+
+    ok = (
+        all_true(checks['dirs']) and
+        all_true(checks['scripts']) and
+        all_true(checks['models']) and
+        all(isinstance(v, bool) and v for v in checks['dependencies'].values())
+    )
+    return {'ok': bool(ok), **checks, 'probed_at': time.time()}
+
+def health_probe_loop():
+    while True:
+        try:
+            result = probe_anpr_atcc()
+        except Exception as e:
+            result = {'ok': False, 'error': str(e), 'probed_at': time.time()}
+        HEALTH_STATE['result'] = result
+        time.sleep(HEALTH_REFRESH_SECONDS)
+
+@app.before_request
+def start_health_probe():
+    # Started by the first request of each process, never at import: with
+    # preload_app the import runs in the gunicorn master, and a thread running
+    # subprocesses there would be forked into every worker
+    with HEALTH_LOCK:
+        if HEALTH_STATE['pid'] == os.getpid():
+            return
+        HEALTH_STATE['pid'] = os.getpid()
+    thread = threading.Thread(target=health_probe_loop, name="health-probe", daemon=True)
+    thread.start()
+
 @app.route("/api/anpr-atcc/health", methods=["GET"])
 def health_anpr_atcc():
     """Lightweight health-check for ANPR-ATCC pipeline.
-    Verifies directories, models, scripts, dependencies, and pipeline outputs.
-    Does not execute the heavy pipeline.
+    Answers from the cached background probe.
     """
-    try:
-        base_dir = BASE_DIR
-        anpr_dir = os.path.join(base_dir, 'ANPR-ATCC')
-        models_dir = os.path.join(base_dir, 'Models')
-        data_dir = os.path.join(base_dir, 'Data', 'ANPR-ATCC')
-        results_dir = os.path.join(data_dir, 'Results')
-        interp_dir = os.path.join(results_dir, 'Interpolated_Results')
-
-        # Directory and file existence checks
-        checks = {
-            'dirs': {
-                'backend': os.path.isdir(base_dir),
-                'anpr_dir': os.path.isdir(anpr_dir),
-                'models_dir': os.path.isdir(models_dir),
-                'data_dir': os.path.isdir(data_dir),
-                'results_dir': os.path.isdir(results_dir),
-                'interpolated_dir': os.path.isdir(interp_dir),
-            },
-            'scripts': {
-                'main.py': os.path.isfile(os.path.join(anpr_dir, 'main.py')),
-                'add_missing_data.py': os.path.isfile(os.path.join(anpr_dir, 'add_missing_data.py')),
-                'visualize.py': os.path.isfile(os.path.join(anpr_dir, 'visualize.py')),
-            },
-            'models': {
-                'yolov8x.pt': os.path.isfile(os.path.join(models_dir, 'yolov8x.pt')),
-                'License-Plate.pt': os.path.isfile(os.path.join(models_dir, 'License-Plate.pt')),
-            },
-            'artifacts': {
-                'input_video': os.path.isfile(os.path.join(data_dir, 'anpr_atcc.mp4')),
-                'main_csv': os.path.isfile(os.path.join(results_dir, 'main.csv')),
-                'interpolated_csv': os.path.isfile(os.path.join(interp_dir, 'vehicle_testing.csv')),
-                'annotated_video': os.path.isfile(os.path.join(results_dir, 'output_annotated.webm')),
-            },
-            'dependencies': {}
-        }
-
-        # Dependency import checks
-        deps = ['flask', 'flask_cors', 'ultralytics', 'easyocr', 'cv2', 'numpy', 'scipy', 'pandas']
-        for mod in deps:
-            try:
-                importlib.import_module(mod)
-                checks['dependencies'][mod] = True
-            except Exception as e:
-                checks['dependencies'][mod] = f"Error: {e}"
-
-        # Aggregate overall status
-        def all_true(d):
-            return all((v if isinstance(v, bool) else False) for v in d.values())
-
-        ok = (
-            all_true(checks['dirs']) and
-            all_true(checks['scripts']) and
-            all_true(checks['models']) and
-            all(isinstance(v, bool) and v for v in checks['dependencies'].values())
-        )
-
-        return jsonify({'ok': bool(ok), **checks}), 200
-    except Exception as e:
-        return jsonify({'ok': False, 'error': str(e)}), 500
+    result = HEALTH_STATE['result']
+    if result is None:
+        return jsonify({'ok': False, 'pending': True}), 200
+    status = 200 if 'error' not in result else 500
+    return jsonify(result), status
 
 @app.route("/api/anpr-atcc/upload", methods=["POST"])
 @app.route("/anpr-atcc/", methods=["POST"])  # alias for frontend expectation
@@ -218,27 +337,27 @@ def upload_anpr_atcc():
     base, ext = os.path.splitext(filename)
     ext_no_dot = ext[1:].lower() if ext.startswith('.') else ext.lower()
 
-    # Decide fixed target filenames per type
-    # Video flow: save as anpr_atcc.mp4 regardless of source extension
+    # Video flow: each job gets its own copy of the upload and its own results directory
     if ext_no_dot in ALLOWED_VIDEO_EXTS:
-        fixed_video_name = "anpr_atcc.mp4"
-        fixed_video_path = os.path.join(VIDEOS_DIR, fixed_video_name)
         # Save upload to a temp path first
         temp_upload_path = os.path.join(VIDEOS_DIR, filename)
         f.save(temp_upload_path)
-        # For demo, copy/uploaded file to fixed filename (in real case, transcode to mp4)
-        if os.path.abspath(temp_upload_path) != os.path.abspath(fixed_video_path):
-            shutil.copyfile(temp_upload_path, fixed_video_path)
-        
-        # Start Async Job
-        job_id = str(uuid.uuid4())
-        JOBS[job_id] = {'status': 'queued', 'type': 'anpr'}
-        
-        anpr_dir = os.path.join(os.path.dirname(__file__), 'ANPR-ATCC')
-        thread = threading.Thread(target=run_anpr_pipeline, args=(job_id, anpr_dir))
-        thread.start()
 
-        return jsonify({"jobId": job_id, "status": "queued"}), 202
+        job_id, rejected = admit_job('anpr', [temp_upload_path])
+        if rejected:
+            os.remove(temp_upload_path)
+            return rejected
+
+        # For demo, keep the upload as is (in real case, transcode to mp4)
+        input_video_path = os.path.join(VIDEOS_DIR, f"anpr_atcc_{job_id}.mp4")
+        os.replace(temp_upload_path, input_video_path)
+        results_dir = os.path.join(ANPR_RESULTS_DIR, job_id)
+
+        submit_job(job_id, {'input': to_payload_path(input_video_path),
+                            'results': to_payload_path(results_dir),
+                            'result_url': f"/media/anpr-atcc/Results/{job_id}/output_annotated.webm"})
+
+        return jsonify(job_response(job_id)), 202
 
     # Image flow: save as anpr_atcc.jpg regardless of source extension
     if ext_no_dot in ALLOWED_IMAGE_EXTS:
@@ -280,22 +399,16 @@ def upload_accident():
         output_video_path = os.path.join(ACCIDENT_RESULTS_DIR, output_filename)
 
         # Start Async Job
-        job_id = str(uuid.uuid4())
-        JOBS[job_id] = {'status': 'queued', 'type': 'accident'}
-
-        accident_script = os.path.join(BASE_DIR, 'Accident-Detection', 'accident_detector.py')
-        cmd = [
-            sys.executable, 
-            accident_script, 
-            '--video', input_video_path,
-            '--output', output_video_path,
-            '--conf', '0.5' 
-        ]
-        
-        thread = threading.Thread(target=run_accident_pipeline, args=(job_id, cmd, output_video_path, output_filename))
-        thread.start()
-
-        return jsonify({"jobId": job_id, "status": "queued"}), 202
+        job_id, rejected = admit_job('accident', [input_video_path])
+        if rejected:
+            os.remove(input_video_path)
+            return rejected
+
+        submit_job(job_id, {'input': to_payload_path(input_video_path),
+                            'output': to_payload_path(output_video_path),
+                            'output_filename': output_filename})
+
+        return jsonify(job_response(job_id)), 202
 
     return jsonify({"error": "Only videos are supported for accident detection currently"}), 400
 
@@ -320,74 +433,37 @@ def upload_emergency():
         output_filename = f"processed_{base}.webm"
         output_video_path = os.path.join(EMERGENCY_RESULTS_DIR, output_filename)
 
-        job_id = str(uuid.uuid4())
-        JOBS[job_id] = {'status': 'queued', 'type': 'emergency'}
+        job_id, rejected = admit_job('emergency', [input_video_path])
+        if rejected:
+            os.remove(input_video_path)
+            return rejected
 
-        emergency_script = os.path.join(BASE_DIR, 'Emergency-Vehicle', 'emergency_detector.py')
-        cmd = [
-            sys.executable, 
-            emergency_script, 
-            '--video', input_video_path,
-            '--output', output_video_path,
-            '--conf', '0.5' 
-        ]
-        
-        thread = threading.Thread(target=run_emergency_pipeline, args=(job_id, cmd, output_video_path, output_filename))
-        thread.start()
+        submit_job(job_id, {'input': to_payload_path(input_video_path),
+                            'output': to_payload_path(output_video_path),
+                            'output_filename': output_filename})
 
-        return jsonify({"jobId": job_id, "status": "queued"}), 202
+        return jsonify(job_response(job_id)), 202
 
     return jsonify({"error": "Only videos are supported for emergency detection currently"}), 400
 
-def run_signal_pipeline(job_id, cmd, output_path, output_filename):
-    try:
-        JOBS[job_id]['status'] = 'processing'
-        print(f"Running signal command: {' '.join(cmd)}")
-        
-        # Signal control script might need to be run from its directory to find images
-        cwd = os.path.dirname(cmd[1])
-        
-        res = subprocess.run(cmd, cwd=cwd, check=False, capture_output=True, text=True)
-        
-        if res.returncode != 0:
-            # It might exit with non-zero if sys.exit() is called, but let's check output
-            print(f"Signal script output: {res.stdout}")
-            print(f"Signal script error: {res.stderr}")
-            # If output file exists, we might consider it success
-        
-        if not os.path.isfile(output_path):
-            JOBS[job_id]['status'] = 'failed'
-            JOBS[job_id]['error'] = "Output video not generated"
-            return
-
-        JOBS[job_id]['status'] = 'completed'
-        JOBS[job_id]['result_url'] = f"/media/signal/{output_filename}"
-
-    except Exception as e:
-        JOBS[job_id]['status'] = 'failed'
-        JOBS[job_id]['error'] = str(e)
-
 @app.route("/api/signal/sample", methods=["POST"])
 def signal_sample():
-    job_id = str(uuid.uuid4())
-    JOBS[job_id] = {'status': 'queued', 'type': 'signal_sample'}
+    # metrics_only=1: per-tick traffic metrics without rendering a video
+    metrics_only = request.values.get('metrics_only', '').lower() in ('1', 'true', 'yes')
+    job_id, rejected = admit_job('signal_metrics' if metrics_only else 'signal_sample')
+    if rejected:
+        return rejected
     
     output_filename = f"simulation_{job_id}.webm"
     output_path = os.path.join(SIGNAL_RESULTS_DIR, output_filename)
+    metrics_filename = f"simulation_{job_id}_metrics.npz"
+    metrics_path = os.path.join(SIGNAL_RESULTS_DIR, metrics_filename)
+
+    submit_job(job_id, {'output': to_payload_path(output_path), 'output_filename': output_filename,
+                        'metrics': to_payload_path(metrics_path), 'metrics_filename': metrics_filename,
+                        'metrics_only': metrics_only})
     
-    script_path = os.path.join(SIGNAL_DIR, 'signalcontrol.py')
-    
-    cmd = [
-        sys.executable,
-        script_path,
-        '--headless',
-        '--output', output_path
-    ]
-    
-    thread = threading.Thread(target=run_signal_pipeline, args=(job_id, cmd, output_path, output_filename))
-    thread.start()
-    
-    return jsonify({"jobId": job_id, "status": "queued"}), 202
+    return jsonify(job_response(job_id)), 202
 
 @app.route("/api/signal/upload", methods=["POST"])
 def signal_upload():
@@ -398,37 +474,29 @@ def signal_upload():
     if not files:
         return jsonify({"error": "No files uploaded"}), 400
 
-    job_id = str(uuid.uuid4())
-    JOBS[job_id] = {'status': 'queued', 'type': 'signal_detection'}
+    files = [f for f in files if f.filename]
+    if len(files) < 2:
+        return jsonify({"error": "Please upload at least 2 videos for detection mode"}), 400
+
+    # Detection mode processes a fixed number of frames, so the cost does not depend on the uploads
+    job_id, rejected = admit_job('signal_detection')
+    if rejected:
+        return rejected
     
     video_paths = []
     for f in files:
-        if f.filename:
-            filename = secure_filename(f.filename)
-            save_path = os.path.join(SIGNAL_RESULTS_DIR, f"{job_id}_{filename}")
-            f.save(save_path)
-            video_paths.append(save_path)
-            
-    if len(video_paths) < 2:
-        return jsonify({"error": "Please upload at least 2 videos for detection mode"}), 400
+        filename = secure_filename(f.filename)
+        save_path = os.path.join(SIGNAL_RESULTS_DIR, f"{job_id}_{filename}")
+        f.save(save_path)
+        video_paths.append(save_path)
 
     output_filename = f"detection_{job_id}.webm"
     output_path = os.path.join(SIGNAL_RESULTS_DIR, output_filename)
+
+    submit_job(job_id, {'output': to_payload_path(output_path), 'output_filename': output_filename,
+                        'videos': [to_payload_path(p) for p in video_paths]})
     
-    script_path = os.path.join(SIGNAL_DIR, 'signalcontrol.py')
-    
-    cmd = [
-        sys.executable,
-        script_path,
-        '--headless',
-        '--output', output_path,
-        '--videos'
-    ] + video_paths
-    
-    thread = threading.Thread(target=run_signal_pipeline, args=(job_id, cmd, output_path, output_filename))
-    thread.start()
-    
-    return jsonify({"jobId": job_id, "status": "queued"}), 202
+    return jsonify(job_response(job_id)), 202
 
 @app.route("/media/signal/<path:filename>", methods=["GET", "OPTIONS"])
 def serve_signal(filename):
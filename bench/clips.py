@@ -0,0 +1,89 @@
+import os
+import argparse
+import cv2
+import numpy as np
+
+# Synthetic traffic clips for the benchmarks: a road with lane markings and
+# vehicles (coloured boxes with a white plate) driving across, drawn with
+# OpenCV like setup_assets.py draws the simulator sprites.
+
+VEHICLE_COLORS = [(255, 0, 0), (0, 255, 255), (255, 0, 255), (0, 165, 255), (0, 255, 0)]
+
+
+def draw_road(width, height):
+    road = np.zeros((height, width, 3), np.uint8)
+    road[:] = (50, 50, 50)  # Dark gray
+    lanes = 4
+    for lane in range(1, lanes):
+        y = height * lane // lanes
+        for x in range(0, width, 60):
+            cv2.line(road, (x, y), (x + 30, y), (255, 255, 255), 2)
+    cv2.line(road, (0, 2), (width, 2), (255, 255, 255), 3)
+    cv2.line(road, (0, height - 3), (width, height - 3), (255, 255, 255), 3)
+    return road
+
+
+def draw_vehicle(frame, x, y, w, h, color, plate):
+    cv2.rectangle(frame, (x, y), (x + w, y + h), color, -1)
+    cv2.rectangle(frame, (x + w // 8, y + h // 8), (x + w // 3, y + h - h // 8), (40, 40, 40), -1)  # windscreen
+    px1, py1 = x + w // 3, y + 2 * h // 3
+    px2, py2 = x + w - w // 3, y + h - 2
+    cv2.rectangle(frame, (px1, py1), (px2, py2), (255, 255, 255), -1)
+    cv2.putText(frame, plate, (px1 + 2, py2 - 3), cv2.FONT_HERSHEY_SIMPLEX,
+                max(0.3, (py2 - py1) / 30), (0, 0, 0), 1, cv2.LINE_AA)
+
+
+def make_clip(path, frames=300, size=(1280, 720), fps=30, vehicles=6, seed=0):
+    """Write a clip of `frames` frames and return its path."""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    road = draw_road(width, height)
+    w, h = width // 8, height // 8
+    cars = []
+    for i in range(vehicles):
+        lane = i % 4
+        cars.append({
+            'x': float(rng.uniform(0, width)),
+            'y': int(height * lane / 4 + (height / 4 - h) / 2),
+            'speed': float(rng.uniform(3, 9)) * (1 if lane < 2 else -1),
+            'color': VEHICLE_COLORS[i % len(VEHICLE_COLORS)],
+            'plate': f"AB{10 + i}CDE",
+        })
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not out.isOpened():
+        raise RuntimeError(f"Could not open video writer for {path}")
+    for _ in range(frames):
+        frame = road.copy()
+        for car in cars:
+            car['x'] += car['speed']
+            if car['x'] > width:
+                car['x'] = -w
+            elif car['x'] < -w:
+                car['x'] = width
+            draw_vehicle(frame, int(car['x']), car['y'], w, h, car['color'], car['plate'])
+        # Sensor noise, so the encoder cannot skip static regions entirely
+        noise = rng.integers(0, 8, frame.shape, dtype=np.uint8)
+        out.write(cv2.add(frame, noise))
+    out.release()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic traffic clip")
+    parser.add_argument('output', help="Output .mp4 path")
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--size', default='1280x720', help="WIDTHxHEIGHT")
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--vehicles', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split('x'))
+    make_clip(args.output, args.frames, (width, height), args.fps, args.vehicles, args.seed)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
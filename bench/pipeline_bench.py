@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from clips import make_clip
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+import job_stats
+from pipelines import ANPR_DIR, SIGNAL_DIR
+
+# End-to-end throughput of every pipeline on synthetic clips, with the real
+# weights ("real") and with the stub detector of stub_models.py ("stub", which
+# leaves decode, drawing, encoding and bookkeeping). Steps run as separate
+# processes like jobs do; their stage timers come back through ITS_JOB_STATS
+# and the peak RSS from wait4() (largest process in the step's tree).
+#
+#   python bench/pipeline_bench.py --output bench.json
+#   python bench/pipeline_bench.py --baseline bench.json --threshold 0.1
+
+PIPELINES = ('anpr', 'accident', 'emergency', 'signal')
+MODES = ('stub', 'real')
+
+
+def pipeline_steps(pipeline, clip, workdir, workers):
+    """(cmd, cwd) of each step, the same commands pipelines.py runs for a job."""
+    py = sys.executable
+    if pipeline == 'anpr':
+        results = os.path.join(workdir, 'anpr-results')
+        return [([py, 'main.py', '--workers', str(workers), '--video', clip, '--results', results], ANPR_DIR),
+                ([py, 'add_missing_data.py', '--results', results], ANPR_DIR),
+                ([py, 'visualize.py', '--video', clip, '--results', results], ANPR_DIR)]
+    if pipeline == 'accident':
+        return [([py, os.path.join(BASE_DIR, 'Accident-Detection', 'accident_detector.py'), '--video', clip,
+                  '--output', os.path.join(workdir, 'accident.webm'), '--conf', '0.5', '--workers', str(workers)], None)]
+    if pipeline == 'emergency':
+        return [([py, os.path.join(BASE_DIR, 'Emergency-Vehicle', 'emergency_detector.py'), '--video', clip,
+                  '--output', os.path.join(workdir, 'emergency.webm'), '--conf', '0.5'], None)]
+    if pipeline == 'signal':
+        # Detection mode with the clip on all four lanes
+        return [([py, os.path.join(SIGNAL_DIR, 'signalcontrol.py'), '--headless',
+                  '--output', os.path.join(workdir, 'signal.webm'), '--videos'] + [clip] * 4, SIGNAL_DIR)]
+    raise ValueError(f"Unknown pipeline: {pipeline}")
+
+
+def run_step(cmd, cwd, env, log_path):
+    fd, stats_path = tempfile.mkstemp(prefix='its_bench_', suffix='.json')
+    os.close(fd)
+    os.remove(stats_path)
+    start = time.perf_counter()
+    with open(log_path, 'a') as log:
+        log.write(f"$ {' '.join(cmd)}\n")
+        log.flush()
+        proc = subprocess.Popen(cmd, cwd=cwd, env=dict(env, ITS_JOB_STATS=stats_path),
+                                stdout=log, stderr=subprocess.STDOUT)
+        _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - start
+    stats = {}
+    try:
+        with open(stats_path) as f:
+            job_stats.merge_snapshots(stats, json.load(f))
+        os.remove(stats_path)
+    except (OSError, ValueError):
+        pass
+    return {'returncode': proc.returncode, 'wall_seconds': wall,
+            'peak_rss_mb': round(rusage.ru_maxrss / 1024, 1), 'stats': stats}
+
+
+def bench_pipeline(pipeline, mode, clip, workdir, workers):
+    env = dict(os.environ)
+    env.pop('ITS_STUB_MODELS', None)
+    if mode == 'stub':
+        env['ITS_STUB_MODELS'] = '1'
+        # Tracker checkpoints pickle ultralytics objects, which the stub does not have
+        env['ITS_ANPR_CHECKPOINT_EVERY'] = '0'
+    log_path = os.path.join(workdir, f"{pipeline}-{mode}.log")
+
+    steps = []
+    stats = {}
+    for cmd, cwd in pipeline_steps(pipeline, clip, workdir, workers):
+        step = run_step(cmd, cwd, env, log_path)
+        job_stats.merge_snapshots(stats, step.pop('stats'))
+        steps.append(dict(step, step=os.path.basename(cmd[1])))
+        if step['returncode'] != 0:
+            break
+
+    wall = sum(step['wall_seconds'] for step in steps)
+    result = job_stats.breakdown(stats, wall)
+    result.update({
+        'frames': int(stats.get('counters', {}).get('frames', 0)),
+        'peak_rss_mb': max(step['peak_rss_mb'] for step in steps),
+        'steps': [dict(step, wall_seconds=round(step['wall_seconds'], 3)) for step in steps],
+    })
+    failed = [step for step in steps if step['returncode'] != 0]
+    if failed:
+        result['error'] = f"{failed[0]['step']} exited with {failed[0]['returncode']}"
+    elif not result['frames']:
+        # The detectors print model loading errors and exit 0
+        result['error'] = "no frames processed"
+    if 'error' in result:
+        with open(log_path) as f:
+            result['log_tail'] = f.read()[-2000:]
+    return result
+
+
+def compare(report, baseline, threshold):
+    """Regressions of `report` against `baseline`: fps (or wall time when no frames
+    are counted) and peak RSS worse by more than `threshold` (a fraction)."""
+    regressions = []
+    for key, result in report['results'].items():
+        base = baseline.get('results', {}).get(key)
+        if not base or 'error' in result or 'error' in base:
+            continue
+        if result.get('fps') and base.get('fps'):
+            if result['fps'] < base['fps'] * (1 - threshold):
+                regressions.append(f"{key}: {result['fps']} fps, baseline {base['fps']} fps")
+        elif result['wall_seconds'] > base['wall_seconds'] * (1 + threshold):
+            regressions.append(f"{key}: {result['wall_seconds']}s, baseline {base['wall_seconds']}s")
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + threshold):
+            regressions.append(f"{key}: peak RSS {result['peak_rss_mb']} MB, baseline {base['peak_rss_mb']} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark on synthetic clips")
+    parser.add_argument('--pipelines', nargs='+', default=list(PIPELINES), choices=PIPELINES)
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=MODES,
+                        help="stub: stand-in detector (ITS_STUB_MODELS), real: the weights in Models/")
+    parser.add_argument('--frames', type=int, default=300, help="Frames per synthetic clip")
+    parser.add_argument('--size', default='1280x720', help="Clip size WIDTHxHEIGHT")
+    parser.add_argument('--workers', type=int, default=1, help="--workers for ANPR and accident detection")
+    parser.add_argument('--workdir', default=None, help="Clips, outputs and logs (default: a temporary directory)")
+    parser.add_argument('--output', default=None, help="Write the JSON report to this path")
+    parser.add_argument('--baseline', default=None, help="Compare against this earlier report")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Allowed slowdown/growth vs the baseline (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='its_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    width, height = (int(v) for v in args.size.lower().split('x'))
+    clip = make_clip(os.path.join(workdir, 'traffic.mp4'), args.frames, (width, height))
+
+    report = {
+        'meta': {'host': platform.node(), 'python': platform.python_version(), 'cpus': os.cpu_count(),
+                 'frames': args.frames, 'size': args.size, 'workers': args.workers,
+                 'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        'results': {},
+    }
+    print(f"{'pipeline':<20}{'fps':>10}{'wall s':>10}{'peak MB':>10}  top stages")
+    for pipeline in args.pipelines:
+        for mode in args.modes:
+            key = f"{pipeline}:{mode}"
+            result = bench_pipeline(pipeline, mode, clip, workdir, args.workers)
+            report['results'][key] = result
+            if 'error' in result:
+                last_line = (result['log_tail'].strip().splitlines() or [''])[-1]
+                print(f"{key:<20}  error: {result['error']} ({last_line})")
+                continue
+            top = ', '.join(f"{name} {stage['percent']}%" for name, stage in list(result['stages'].items())[:3])
+            print(f"{key:<20}{result.get('fps', '-'):>10}{result['wall_seconds']:>10}{result['peak_rss_mb']:>10}  {top}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} of {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Child script: import the app, then time the first health response and the
+# wait until the background probe has produced a full result.
+HEALTH_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+client = app.app.test_client()
+res = client.get('/api/anpr-atcc/health')
+t2 = time.perf_counter()
+while res.get_json().get('pending'):
+    time.sleep(0.05)
+    res = client.get('/api/anpr-atcc/health')
+t3 = time.perf_counter()
+print(json.dumps({'import_app': t1 - t0, 'first_health': t2 - t1, 'probe_ready': t3 - t1}))
+"""
+
+IMPORT_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {path!r})
+t0 = time.perf_counter()
+import {module}
+print(json.dumps({{'import': time.perf_counter() - t0}}))
+"""
+
+
+def run_child(script, cwd):
+    start = time.perf_counter()
+    res = subprocess.run([sys.executable, '-c', script], cwd=cwd, check=True, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    return wall, json.loads(res.stdout.strip().splitlines()[-1])
+
+
+def summarize(values):
+    return {'mean_s': round(statistics.mean(values), 4), 'min_s': round(min(values), 4),
+            'max_s': round(max(values), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process boot and first health response benchmark")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', default=None, help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    samples = {'process_boot': [], 'import_app': [], 'first_health': [], 'probe_ready': [], 'import_anpr_util': []}
+    anpr_dir = os.path.join(BASE_DIR, 'ANPR-ATCC')
+    for _ in range(args.runs):
+        wall, timings = run_child(HEALTH_SCRIPT, BASE_DIR)
+        # interpreter start-up plus importing the app
+        samples['process_boot'].append(wall - timings['probe_ready'])
+        for key in ('import_app', 'first_health', 'probe_ready'):
+            samples[key].append(timings[key])
+        _, timings = run_child(IMPORT_SCRIPT.format(path=anpr_dir, module='util'), anpr_dir)
+        samples['import_anpr_util'].append(timings['import'])
+
+    report = {name: summarize(values) for name, values in samples.items()}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
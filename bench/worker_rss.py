@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import subprocess
+import urllib.request
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # pid (comm) state ppid ...; comm may contain spaces
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def memory_kb(pid):
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    shared = fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+    return {'rss_mb': round(fields.get('Rss', 0) / 1024, 1),
+            'pss_mb': round(fields.get('Pss', 0) / 1024, 1),
+            'shared_mb': round(shared / 1024, 1)}
+
+
+def measure(preload_app, workers, port, timeout):
+    env = dict(os.environ, ITS_PRELOAD_MODELS='1', ITS_PRELOAD_APP='1' if preload_app else '0')
+    cmd = [sys.executable, '-m', 'gunicorn', '-b', f"127.0.0.1:{port}", '-w', str(workers), 'app:app']
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                # The port answers as soon as the first worker is up; wait for
+                # every worker to finish importing the app as well
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=2)
+                if len(child_pids(proc.pid)) >= workers:
+                    break
+            except OSError:
+                pass
+            time.sleep(1)
+        time.sleep(2 if preload_app else min(timeout, 30))
+        worker_stats = [memory_kb(pid) for pid in child_pids(proc.pid)]
+        return {
+            'preload_app': preload_app,
+            'master': memory_kb(proc.pid),
+            'workers': worker_stats,
+            'total_pss_mb': round(sum(w['pss_mb'] for w in worker_stats) + memory_kb(proc.pid)['pss_mb'], 1),
+        }
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker memory of gunicorn with model preload on and off")
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--port', type=int, default=7861)
+    parser.add_argument('--timeout', type=int, default=300, help="Seconds to wait for the workers to boot")
+    parser.add_argument('--output', default=None, help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    report = [measure(preload, args.workers, args.port, args.timeout) for preload in (False, True)]
+    for run in report:
+        label = 'preload on ' if run['preload_app'] else 'preload off'
+        for i, worker in enumerate(run['workers']):
+            print(f"{label} worker {i}: RSS {worker['rss_mb']} MB, PSS {worker['pss_mb']} MB, shared {worker['shared_mb']} MB")
+        print(f"{label} total PSS (master + workers): {run['total_pss_mb']} MB")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import os
+import json
+import heapq
+import threading
+
+from frame_source import probe_video
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Measured seconds per cost unit, kept across restarts
+THROUGHPUT_FILE = os.environ.get('ITS_THROUGHPUT_FILE', os.path.join(BASE_DIR, 'Data', 'throughput.json'))
+# A cost unit is one 1280x720 frame; jobs without an input video count as one unit
+REFERENCE_PIXELS = 1280 * 720
+# Weight of the newest measurement in the moving average
+EWMA_ALPHA = 0.3
+# Starting points until a pipeline has completed a job on this host
+DEFAULT_SECONDS_PER_UNIT = {
+    'anpr': 0.6,
+    'accident': 0.08,
+    'emergency': 0.08,
+    'signal_sample': 90.0,
+    'signal_metrics': 5.0,
+    'signal_detection': 120.0,
+}
+
+
+def job_units(video_paths=None):
+    """Frames x resolution of the inputs in 720p-frame units, from a header probe only."""
+    if not video_paths:
+        return 1.0
+    units = 0.0
+    for path in video_paths:
+        info = probe_video(path)
+        frames = info['frames']
+        if frames <= 0:
+            raise ValueError(f"Could not determine frame count of {os.path.basename(path)}")
+        units += frames * max(1, info['width'] * info['height']) / REFERENCE_PIXELS
+    return units
+
+
+def wait_seconds(running, queued, slots):
+    """Time until a slot frees up for a new job.
+    `running` holds the remaining seconds of running jobs, `queued` the
+    estimates of queued jobs in FIFO order; slots are filled greedily.
+    """
+    free_at = sorted(running)[:slots] + [0.0] * max(0, slots - len(running))
+    heapq.heapify(free_at)
+    for estimate in queued:
+        heapq.heappush(free_at, heapq.heappop(free_at) + estimate)
+    return free_at[0]
+
+
+class CostModel:
+    """Per-pipeline seconds-per-unit, updated with an EWMA of completed jobs."""
+
+    def __init__(self, path=THROUGHPUT_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.rates = dict(DEFAULT_SECONDS_PER_UNIT)
+        self.mtime = None
+        self.refresh()
+
+    def refresh(self):
+        """Pick up rates saved by other processes (queue workers) since the last read."""
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self.mtime:
+                return
+            with open(self.path) as f:
+                self.rates.update(json.load(f))
+            self.mtime = mtime
+        except (OSError, ValueError):
+            pass
+
+    def estimate(self, job_type, units):
+        self.refresh()
+        return self.rates.get(job_type, 1.0) * units
+
+    def observe(self, job_type, units, seconds):
+        if units <= 0 or seconds <= 0:
+            return
+        with self.lock:
+            self.refresh()
+            rate = seconds / units
+            previous = self.rates.get(job_type)
+            self.rates[job_type] = rate if previous is None else EWMA_ALPHA * rate + (1 - EWMA_ALPHA) * previous
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(self.rates, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Could not save throughput estimates: {e}")
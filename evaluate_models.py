@@ -0,0 +1,183 @@
+# Accuracy-vs-speed regression report for quantized model variants: runs each
+# model in every backend[:precision] variant on reference clips and compares
+# detections, per-class counts and plate reads against the reference variant.
+#
+#   python evaluate_models.py --clips a.mp4 b.mp4 --variants torch onnx:int8 openvino:fp16 openvino:int8
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+
+from frame_source import FrameSource
+from model_loader import MODELS_DIR, load_model, parse_variant
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ANPR-ATCC'))
+from parallel import box_iou
+
+# COCO vehicle classes used by ANPR and signal-control counting
+VEHICLE_CLASSES = [2, 3, 5, 7]
+CLASS_FILTERS = {'yolov8x.pt': VEHICLE_CLASSES}
+PLATE_MODEL = 'License-Plate.pt'
+IOU_MATCH = 0.5
+
+
+def load_frames(clips, fps, max_frames):
+    frames = []
+    for clip in clips:
+        source = FrameSource(clip, fps=fps, max_frames=max_frames, reuse_buffer=False)
+        frames.extend(source)
+        source.release()
+    return frames
+
+
+def run_model(model, frames, class_filter=None):
+    detections, timings = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        result = model(frame, verbose=False)[0]
+        timings.append((time.perf_counter() - start) * 1000)
+        rows = []
+        for x1, y1, x2, y2, conf, cls in result.boxes.data.tolist():
+            if class_filter is None or int(cls) in class_filter:
+                rows.append((x1, y1, x2, y2, conf, int(cls)))
+        detections.append(rows)
+    return detections, timings
+
+
+def match_detections(reference, candidate):
+    """Greedy same-class IoU matching; returns [(ref_index, cand_index)]."""
+    pairs = []
+    for i, ref in enumerate(reference):
+        for j, cand in enumerate(candidate):
+            if ref[5] == cand[5]:
+                overlap = box_iou(ref, cand)
+                if overlap >= IOU_MATCH:
+                    pairs.append((overlap, i, j))
+    matches, used_ref, used_cand = [], set(), set()
+    for _, i, j in sorted(pairs, reverse=True):
+        if i not in used_ref and j not in used_cand:
+            matches.append((i, j))
+            used_ref.add(i)
+            used_cand.add(j)
+    return matches
+
+
+def read_plates(frames, detections):
+    from util import prepare_license_plate_crop, read_license_plate
+    texts = []
+    for frame, rows in zip(frames, detections):
+        frame_texts = []
+        for x1, y1, x2, y2, _, _ in rows:
+            text, _ = read_license_plate(prepare_license_plate_crop(frame, x1, y1, x2, y2))
+            frame_texts.append(text)
+        texts.append(frame_texts)
+    return texts
+
+
+def compare(reference, candidate, ref_plates=None, cand_plates=None):
+    tp = n_ref = n_cand = 0
+    count_error = 0
+    plates_total = plates_equal = 0
+    for f, (ref, cand) in enumerate(zip(reference, candidate)):
+        matches = match_detections(ref, cand)
+        tp += len(matches)
+        n_ref += len(ref)
+        n_cand += len(cand)
+        ref_counts, cand_counts = Counter(r[5] for r in ref), Counter(c[5] for c in cand)
+        count_error += sum(abs(ref_counts[k] - cand_counts[k]) for k in set(ref_counts) | set(cand_counts))
+        if ref_plates is not None:
+            for i, j in matches:
+                if ref_plates[f][i] not in (None, 'None'):
+                    plates_total += 1
+                    plates_equal += ref_plates[f][i] == cand_plates[f][j]
+
+    precision = tp / n_cand if n_cand else 1.0
+    recall = tp / n_ref if n_ref else 1.0
+    row = {
+        'precision': round(precision, 4),
+        'recall': round(recall, 4),
+        'f1': round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+        'count_mae': round(count_error / max(1, len(reference)), 4),
+        'detections': n_cand,
+        'reference_detections': n_ref,
+    }
+    if ref_plates is not None:
+        row['plate_agreement'] = round(plates_equal / plates_total, 4) if plates_total else None
+    return row
+
+
+def evaluate(models, clips, variants, reference_variant, fps, max_frames, imgsz):
+    frames = load_frames(clips, fps, max_frames)
+    print(f"Loaded {len(frames)} frames from {len(clips)} clip(s)")
+    report = {'frames': len(frames), 'clips': clips, 'reference': reference_variant, 'models': {}}
+
+    for weights_path in models:
+        name = os.path.basename(weights_path)
+        class_filter = CLASS_FILTERS.get(name)
+        is_plate_model = name == PLATE_MODEL
+        rows = {}
+
+        ref_backend, ref_precision = parse_variant(reference_variant)
+        ref_model = load_model(weights_path, backend=ref_backend, precision=ref_precision, imgsz=imgsz)
+        run_model(ref_model, frames[:3], class_filter)  # warm-up
+        reference, ref_timings = run_model(ref_model, frames, class_filter)
+        ref_plates = read_plates(frames, reference) if is_plate_model else None
+        rows[reference_variant] = {'latency_ms': round(sum(ref_timings) / len(ref_timings), 2),
+                                   **compare(reference, reference, ref_plates, ref_plates)}
+
+        for variant in variants:
+            if variant == reference_variant:
+                continue
+            backend, precision = parse_variant(variant)
+            try:
+                model = load_model(weights_path, backend=backend, precision=precision, imgsz=imgsz)
+                if (model.inference_backend, model.inference_precision) != (backend, precision):
+                    raise RuntimeError("variant unavailable, loader fell back to "
+                                       f"{model.inference_backend}:{model.inference_precision}")
+                run_model(model, frames[:3], class_filter)
+                candidate, timings = run_model(model, frames, class_filter)
+                cand_plates = read_plates(frames, candidate) if is_plate_model else None
+                rows[variant] = {'latency_ms': round(sum(timings) / len(timings), 2),
+                                 **compare(reference, candidate, ref_plates, cand_plates)}
+                rows[variant]['speedup'] = round(rows[reference_variant]['latency_ms'] / rows[variant]['latency_ms'], 2)
+            except Exception as e:
+                rows[variant] = {'error': str(e)}
+        report['models'][name] = rows
+    return report
+
+
+def print_report(report):
+    print(f"\n{'model':<34}{'variant':<16}{'ms/frame':>10}{'speedup':>9}{'prec':>8}{'recall':>8}{'f1':>8}{'cnt MAE':>9}{'plates':>8}")
+    for name, rows in report['models'].items():
+        for variant, row in rows.items():
+            if 'error' in row:
+                print(f"{name:<34}{variant:<16}  error: {row['error']}")
+                continue
+            plates = row.get('plate_agreement')
+            print(f"{name:<34}{variant:<16}{row['latency_ms']:>10}{row.get('speedup', 1.0):>9}"
+                  f"{row['precision']:>8}{row['recall']:>8}{row['f1']:>8}{row['count_mae']:>9}"
+                  f"{'' if plates is None else plates:>8}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare quantized model variants against the full-precision models")
+    parser.add_argument('--clips', nargs='+', required=True, help="Reference video clips")
+    parser.add_argument('--models', nargs='+', default=None, help="Weights to evaluate (default: every .pt in Models/)")
+    parser.add_argument('--variants', nargs='+', default=['torch', 'onnx', 'onnx:int8', 'openvino:fp16', 'openvino:int8'],
+                        help="backend[:precision] variants to evaluate")
+    parser.add_argument('--reference', default='torch', help="Variant treated as ground truth")
+    parser.add_argument('--fps', type=float, default=2.0, help="Frames per second sampled from each clip")
+    parser.add_argument('--max-frames', type=int, default=100, help="Frames sampled per clip")
+    parser.add_argument('--imgsz', type=int, default=640, help="Inference/export image size")
+    parser.add_argument('--output', default=None, help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    models = args.models or sorted(os.path.join(MODELS_DIR, f) for f in os.listdir(MODELS_DIR) if f.endswith('.pt'))
+    report = evaluate(models, args.clips, args.variants, args.reference, args.fps, args.max_frames, args.imgsz)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
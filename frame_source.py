@@ -0,0 +1,327 @@
+import os
+import json
+import time
+import shutil
+import threading
+import subprocess
+import cv2
+import numpy as np
+
+import job_stats
+
+# Decoder selection: "ffmpeg", "opencv" or "auto" (ffmpeg when the binary is on PATH)
+DEFAULT_DECODER = os.environ.get('ITS_DECODER', 'auto')
+# 0 lets ffmpeg pick the number of decoding threads
+DEFAULT_DECODE_THREADS = int(os.environ.get('ITS_DECODE_THREADS', '0'))
+
+
+def ffmpeg_available():
+    return shutil.which('ffmpeg') is not None
+
+
+def _parse_rate(rate):
+    try:
+        num, den = rate.split('/')
+        return float(num) / float(den) if float(den) else 0.0
+    except (ValueError, AttributeError):
+        return 0.0
+
+
+def _rotation(stream):
+    """Display rotation in degrees of an ffprobe stream entry: the display
+    matrix side data, or the rotate tag of older muxers."""
+    for side_data in stream.get('side_data_list', []):
+        if 'rotation' in side_data:
+            return int(float(side_data['rotation']))
+    return int(float(stream.get('tags', {}).get('rotate', 0)))
+
+
+def probe_video(video_path):
+    """Return {'width', 'height', 'fps', 'frames'} for the first video stream.
+    Uses ffprobe when available and falls back to OpenCV container properties.
+    Width and height are those of the decoded frames: both decoders apply the
+    stream's display rotation, so a portrait phone video comes out portrait.
+    """
+    if shutil.which('ffprobe'):
+        cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+               '-show_entries', 'stream=width,height,avg_frame_rate,r_frame_rate,nb_frames:'
+                                'stream_tags=rotate:stream_side_data=rotation:format=duration',
+               '-of', 'json', video_path]
+        res = subprocess.run(cmd, check=False, capture_output=True, text=True)
+        if res.returncode == 0:
+            try:
+                data = json.loads(res.stdout)
+                stream = data['streams'][0]
+                fps = _parse_rate(stream.get('avg_frame_rate')) or _parse_rate(stream.get('r_frame_rate'))
+                frames = int(stream.get('nb_frames') or 0)
+                if frames <= 0:
+                    duration = float(data.get('format', {}).get('duration') or 0)
+                    frames = int(round(duration * fps))
+                width, height = int(stream['width']), int(stream['height'])
+                if _rotation(stream) % 180:
+                    width, height = height, width
+                return {'width': width, 'height': height, 'fps': fps, 'frames': frames}
+            except (KeyError, IndexError, ValueError):
+                pass
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if int(cap.get(cv2.CAP_PROP_ORIENTATION_META)) % 180:
+            # Whether the properties are rotated depends on the OpenCV build,
+            # so take the size of a decoded frame
+            ret, frame = cap.read()
+            if ret:
+                height, width = frame.shape[:2]
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return {'width': width, 'height': height,
+                'fps': float(cap.get(cv2.CAP_PROP_FPS)),
+                'frames': int(cap.get(cv2.CAP_PROP_FRAME_COUNT))}
+    finally:
+        cap.release()
+
+
+def parse_size(value):
+    """Parse a "WIDTHxHEIGHT" string (as used by the --size CLI flags)."""
+    if not value:
+        return None
+    w, h = value.lower().split('x')
+    return int(w), int(h)
+
+
+class FrameSource:
+    """Decoded BGR frames of a video, optionally scaled and frame-rate sampled.
+
+    With the ffmpeg backend scaling and sampling happen inside the decoder and
+    every frame is an ndarray view over the pipe read buffer, so nothing is
+    copied after the pipe read. When ``reuse_buffer`` is true the same buffer
+    backs every frame: consumers that keep frames past the next read must copy
+    them (or construct the source with ``reuse_buffer=False``).
+    """
+
+    def __init__(self, video_path, size=None, fps=None, start_frame=0, max_frames=None,
+                 threads=None, backend=None, reuse_buffer=True, loop=False):
+        self.video_path = video_path
+        info = probe_video(video_path)
+        self.src_width = info['width']
+        self.src_height = info['height']
+        self.src_fps = info['fps'] if info['fps'] > 0 else 30.0
+        self.src_frames = info['frames']
+
+        self.width, self.height = size if size else (self.src_width, self.src_height)
+        self.fps = min(float(fps), self.src_fps) if fps else self.src_fps
+        self.start_frame = int(start_frame)
+        self.max_frames = max_frames
+        self.threads = DEFAULT_DECODE_THREADS if threads is None else int(threads)
+        self.reuse_buffer = reuse_buffer
+        self.loop = loop
+
+        backend = backend or DEFAULT_DECODER
+        if backend == 'auto':
+            backend = 'ffmpeg' if ffmpeg_available() else 'opencv'
+        self.backend = backend
+
+        # Source frame index of the most recently returned frame
+        self.frame_index = self.start_frame - 1
+        # Frames returned in this pass over the video, and in all passes
+        self._emitted = 0
+        self._total = 0
+        self._proc = None
+        self._cap = None
+        self._buffer = None
+        self._src_pos = 0
+        self._next_keep = 0.0
+
+    def isOpened(self):
+        return self.src_width > 0 and self.src_height > 0
+
+    @property
+    def step(self):
+        """Source frames per emitted frame."""
+        return self.src_fps / self.fps
+
+    def _frame_bytes(self):
+        return self.width * self.height * 3
+
+    def _open(self):
+        if self.backend == 'ffmpeg':
+            filters = []
+            if self.fps < self.src_fps:
+                filters.append(f"fps={self.fps}")
+            if (self.width, self.height) != (self.src_width, self.src_height):
+                filters.append(f"scale={self.width}:{self.height}:flags=area")
+            cmd = ['ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error',
+                   '-threads', str(self.threads)]
+            if self.start_frame > 0:
+                # Input-side seek: ffmpeg jumps to the preceding keyframe and
+                # decodes forward, so the first output frame is start_frame
+                cmd += ['-ss', f"{self.start_frame / self.src_fps:.6f}"]
+            cmd += ['-i', self.video_path, '-an', '-sn', '-dn']
+            if filters:
+                cmd += ['-vf', ','.join(filters)]
+            if self.max_frames is not None:
+                cmd += ['-frames:v', str(int(self.max_frames) - self._total)]
+            cmd += ['-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1']
+            # Unbuffered pipe so readinto() lands straight in the frame buffer
+            self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+        else:
+            self._cap = cv2.VideoCapture(self.video_path)
+            if self.start_frame > 0:
+                self._cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+            self._src_pos = 0
+            self._next_keep = 0.0
+
+    def _read_ffmpeg(self):
+        if self._buffer is None or not self.reuse_buffer:
+            self._buffer = bytearray(self._frame_bytes())
+        view = memoryview(self._buffer)
+        filled = 0
+        while filled < len(view):
+            n = self._proc.stdout.readinto(view[filled:])
+            if not n:
+                return None
+            filled += n
+        return np.frombuffer(self._buffer, dtype=np.uint8).reshape(self.height, self.width, 3)
+
+    def _read_opencv(self):
+        while True:
+            ret, frame = self._cap.read()
+            if not ret:
+                return None
+            pos = self._src_pos
+            self._src_pos += 1
+            # Keep the first frame at or after each sampling instant
+            if pos + 1e-6 < self._next_keep:
+                continue
+            self._next_keep += self.step
+            if frame.shape[1] != self.width or frame.shape[0] != self.height:
+                frame = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+            return frame
+
+    def read(self):
+        """cv2.VideoCapture-style read returning (ok, frame)."""
+        with job_stats.timer('decode'):
+            return self._read()
+
+    def _read(self):
+        if self.max_frames is not None and self._total >= self.max_frames:
+            return False, None
+        if self._proc is None and self._cap is None:
+            self._open()
+        frame = self._read_ffmpeg() if self.backend == 'ffmpeg' else self._read_opencv()
+        if frame is None:
+            self.release()
+            if self.loop and self._emitted > 0:
+                self._emitted = 0
+                self._open()
+                frame = self._read_ffmpeg() if self.backend == 'ffmpeg' else self._read_opencv()
+            if frame is None:
+                return False, None
+        self.frame_index = self.start_frame + int(round(self._emitted * self.step))
+        self._emitted += 1
+        self._total += 1
+        return True, frame
+
+    def __iter__(self):
+        while True:
+            ret, frame = self.read()
+            if not ret:
+                break
+            yield frame
+
+    def release(self):
+        if self._proc is not None:
+            if self._proc.poll() is None:
+                self._proc.kill()
+            self._proc.stdout.close()
+            self._proc.wait()
+            self._proc = None
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def __del__(self):
+        try:
+            self.release()
+        except Exception:
+            pass
+
+
+class LatestFrameReader:
+    """Decodes a FrameSource on a background thread and keeps only its newest
+    frame, like a live camera. read() returns the newest frame not returned
+    yet; frames the consumer was too slow for are dropped. With ``realtime``
+    the thread keeps to the source frame rate, so a video file plays like a
+    camera instead of being decoded as fast as possible.
+    """
+
+    def __init__(self, source, realtime=True):
+        # Frames are handed to another thread, so each needs its own buffer
+        source.reuse_buffer = False
+        self.source = source
+        self.realtime = realtime
+        self.frames = 0
+        self.dropped = 0
+        self._frame = None
+        self._taken = 0
+        self._done = False
+        self._stopped = threading.Event()
+        self._ready = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"reader-{os.path.basename(source.video_path)}",
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        interval = 1.0 / self.source.fps if self.realtime else 0.0
+        next_time = time.perf_counter()
+        try:
+            while not self._stopped.is_set():
+                ret, frame = self.source.read()
+                if not ret:
+                    break
+                with self._ready:
+                    if self.frames > self._taken:
+                        self.dropped += 1
+                    self._frame = frame
+                    self.frames += 1
+                    self._ready.notify_all()
+                if interval:
+                    next_time += interval
+                    delay = next_time - time.perf_counter()
+                    if delay > 0:
+                        self._stopped.wait(delay)
+                    else:
+                        next_time = time.perf_counter()  # behind: do not catch up in a burst
+        finally:
+            with self._ready:
+                self._done = True
+                self._ready.notify_all()
+
+    def read(self, timeout=None):
+        """(ok, frame): waits up to `timeout` seconds for a frame newer than the
+        last one returned, then returns the newest frame there is. Fails once the
+        source has ended and its last frame was returned."""
+        with self._ready:
+            self._ready.wait_for(lambda: self.frames > self._taken or self._done, timeout)
+            if self._frame is None or (self._done and self.frames == self._taken):
+                return False, None
+            self._taken = self.frames
+            return True, self._frame
+
+    def release(self):
+        self._stopped.set()
+        self._thread.join()
+        self.source.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,14 @@
+import os
+
+# With ITS_PRELOAD_MODELS=1 the app module loads the models at import; preloading
+# the app in the master makes every worker inherit them copy-on-write.
+preload_app = os.environ.get('ITS_PRELOAD_APP', os.environ.get('ITS_PRELOAD_MODELS', '0')) == '1'
+
+
+def post_fork(server, worker):
+    # Thread pools are never started in the master, so each worker sizes its own;
+    # with preloaded models jobs are forked from the worker, which then stays on
+    # one thread (see job_runner.fork_safe)
+    from job_runner import configure_threads
+    import pipelines
+    configure_threads(1 if pipelines.PRELOAD_MODELS else None)
@@ -0,0 +1,342 @@
+import os
+import json
+import time
+import sqlite3
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# sqlite:///path/to/jobs.db (default) or redis://host:port/db
+BROKER_URL = os.environ.get('ITS_BROKER_URL', f"sqlite:///{os.path.join(BASE_DIR, 'Data', 'jobs.db')}")
+# A claimed job whose worker has not sent a heartbeat for this long is queued again
+WORKER_TIMEOUT_SECONDS = int(os.environ.get('ITS_WORKER_TIMEOUT', '60'))
+FINISHED_STATUSES = {'completed', 'failed', 'cancelled', 'timed_out'}
+
+# Broker job states (the user-facing status lives in the job record):
+#   queued  - waiting for a worker
+#   claimed - taken by a worker, kept alive by its heartbeats
+#   done    - record has a finished status
+
+# RedisBroker.claim in one step: takes the oldest queued job of the wanted types
+# (ARGV[4...], any when none) off the queue and marks it claimed, so two workers
+# never get the same job. Ids of finished or cancelled jobs met on the way are dropped.
+CLAIM_SCRIPT = """
+local ids = redis.call('LRANGE', KEYS[1], 0, -1)
+for _, id in ipairs(ids) do
+    local key = ARGV[1] .. id
+    local job = redis.call('HMGET', key, 'state', 'cancel', 'type')
+    if job[1] ~= 'queued' or job[2] == '1' then
+        redis.call('LREM', KEYS[1], 1, id)
+    else
+        local wanted = #ARGV == 3
+        for i = 4, #ARGV do
+            if ARGV[i] == job[3] then
+                wanted = true
+            end
+        end
+        if wanted then
+            redis.call('LREM', KEYS[1], 1, id)
+            redis.call('HSET', key, 'state', 'claimed', 'worker', ARGV[2], 'heartbeat', ARGV[3])
+            return id
+        end
+    end
+end
+return false
+"""
+
+
+class SqliteBroker:
+    """Job queue in a single SQLite file, for workers on one host or a shared local volume.
+    SQLite locking is unreliable on network file systems; use Redis across nodes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, type TEXT, payload TEXT, record TEXT,"
+                       " state TEXT, worker TEXT, cancel INTEGER DEFAULT 0, created REAL, heartbeat REAL)")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created)")
+            db.execute("CREATE TABLE IF NOT EXISTS workers (id TEXT PRIMARY KEY, slots INTEGER, heartbeat REAL)")
+
+    def _connect(self):
+        # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return _Connection(db)
+
+    def enqueue(self, job_id, job_type, payload, record):
+        with self._connect() as db:
+            db.execute("INSERT INTO jobs (id, type, payload, record, state, created) VALUES (?, ?, ?, ?, 'queued', ?)",
+                       (job_id, job_type, json.dumps(payload), json.dumps(record), time.time()))
+
+    def claim(self, worker_id, types=None):
+        """Take the oldest queued job; returns {'id', 'type', 'payload', 'record'} or None."""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            query = "SELECT * FROM jobs WHERE state = 'queued' AND cancel = 0"
+            args = []
+            if types:
+                query += f" AND type IN ({','.join('?' * len(types))})"
+                args = list(types)
+            row = db.execute(query + " ORDER BY created LIMIT 1", args).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            db.execute("UPDATE jobs SET state = 'claimed', worker = ?, heartbeat = ? WHERE id = ?",
+                       (worker_id, time.time(), row['id']))
+            db.execute("COMMIT")
+        return {'id': row['id'], 'type': row['type'],
+                'payload': json.loads(row['payload']), 'record': json.loads(row['record'])}
+
+    def update(self, job_id, fields):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT record FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return
+            record = json.loads(row['record'])
+            record.update(fields)
+            state_sql = ", state = 'done'" if record.get('status') in FINISHED_STATUSES else ""
+            db.execute(f"UPDATE jobs SET record = ?{state_sql} WHERE id = ?", (json.dumps(record), job_id))
+            db.execute("COMMIT")
+
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT record FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row['record']) if row else None
+
+    def active(self):
+        """Records of queued and claimed jobs, oldest first."""
+        with self._connect() as db:
+            rows = db.execute("SELECT record FROM jobs WHERE state != 'done' ORDER BY created").fetchall()
+        return [json.loads(row['record']) for row in rows]
+
+    def request_cancel(self, job_id):
+        """Cancel a queued job directly or flag a claimed one for its worker; returns the new status."""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT state, record FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            record = json.loads(row['record'])
+            if row['state'] == 'queued':
+                record.update({'status': 'cancelled', 'error': "Job cancelled"})
+                db.execute("UPDATE jobs SET state = 'done', record = ? WHERE id = ?", (json.dumps(record), job_id))
+                status = 'cancelled'
+            elif row['state'] == 'claimed':
+                db.execute("UPDATE jobs SET cancel = 1 WHERE id = ?", (job_id,))
+                status = 'cancelling'
+            else:
+                status = record.get('status')
+            db.execute("COMMIT")
+        return status
+
+    def cancel_requested(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT cancel FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row['cancel'])
+
+    def heartbeat(self, worker_id, slots, job_ids):
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("INSERT OR REPLACE INTO workers (id, slots, heartbeat) VALUES (?, ?, ?)", (worker_id, slots, now))
+            for job_id in job_ids:
+                db.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ?", (now, job_id, worker_id))
+            db.execute("COMMIT")
+
+    def unregister(self, worker_id):
+        with self._connect() as db:
+            db.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+    def requeue_stale(self, timeout=WORKER_TIMEOUT_SECONDS):
+        """Put jobs of workers that stopped sending heartbeats back in the queue.
+        Jobs whose cancellation was requested are finished as cancelled instead.
+        Returns the ids of the requeued jobs.
+        """
+        cutoff = time.time() - timeout
+        requeued = []
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            rows = db.execute("SELECT id, record, cancel FROM jobs WHERE state = 'claimed' AND heartbeat < ?",
+                              (cutoff,)).fetchall()
+            for row in rows:
+                record = json.loads(row['record'])
+                if row['cancel']:
+                    record.update({'status': 'cancelled', 'error': "Job cancelled"})
+                    db.execute("UPDATE jobs SET state = 'done', record = ? WHERE id = ?", (json.dumps(record), row['id']))
+                    continue
+                record['status'] = 'queued'
+                record.pop('started_at', None)
+                db.execute("UPDATE jobs SET state = 'queued', worker = NULL, record = ? WHERE id = ?",
+                           (json.dumps(record), row['id']))
+                requeued.append(row['id'])
+            db.execute("COMMIT")
+        return requeued
+
+    def total_slots(self, timeout=WORKER_TIMEOUT_SECONDS):
+        with self._connect() as db:
+            row = db.execute("SELECT SUM(slots) AS slots FROM workers WHERE heartbeat >= ?",
+                             (time.time() - timeout,)).fetchone()
+        return row['slots'] or 0
+
+
+class _Connection:
+    """sqlite3 connection that is closed (not just committed) when the with block ends."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self.db.in_transaction:
+            self.db.execute("ROLLBACK")
+        self.db.close()
+
+
+class RedisBroker:
+    """Same interface on a Redis-compatible server (redis, valkey, keydb), for workers on several nodes."""
+
+    def __init__(self, url, prefix='its'):
+        import redis
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._claim = self.client.register_script(CLAIM_SCRIPT)
+
+    def _key(self, *parts):
+        return ':'.join((self.prefix,) + parts)
+
+    def enqueue(self, job_id, job_type, payload, record):
+        pipe = self.client.pipeline()
+        pipe.hset(self._key('job', job_id), mapping={
+            'type': job_type, 'payload': json.dumps(payload), 'record': json.dumps(record),
+            'state': 'queued', 'cancel': 0, 'created': time.time()})
+        pipe.rpush(self._key('queue'), job_id)
+        pipe.zadd(self._key('active'), {job_id: time.time()})
+        pipe.execute()
+
+    def claim(self, worker_id, types=None):
+        job_id = self._claim(keys=[self._key('queue')],
+                             args=[self._key('job', ''), worker_id, time.time()] + list(types or []))
+        if job_id is None:
+            return None
+        job = self.client.hgetall(self._key('job', job_id))
+        return {'id': job_id, 'type': job['type'],
+                'payload': json.loads(job['payload']), 'record': json.loads(job['record'])}
+
+    def update(self, job_id, fields):
+        import redis
+        key = self._key('job', job_id)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.hget(key, 'record')
+                    if raw is None:
+                        return
+                    record = json.loads(raw)
+                    record.update(fields)
+                    pipe.multi()
+                    pipe.hset(key, 'record', json.dumps(record))
+                    if record.get('status') in FINISHED_STATUSES:
+                        pipe.hset(key, 'state', 'done')
+                        pipe.zrem(self._key('active'), job_id)
+                    pipe.execute()
+                    return
+                except redis.WatchError:
+                    continue
+
+    def get(self, job_id):
+        raw = self.client.hget(self._key('job', job_id), 'record')
+        return json.loads(raw) if raw else None
+
+    def active(self):
+        records = []
+        for job_id in self.client.zrange(self._key('active'), 0, -1):
+            record = self.get(job_id)
+            if record is not None:
+                records.append(record)
+        return records
+
+    def request_cancel(self, job_id):
+        key = self._key('job', job_id)
+        state = self.client.hget(key, 'state')
+        if state is None:
+            return None
+        if state == 'queued':
+            self.update(job_id, {'status': 'cancelled', 'error': "Job cancelled"})
+            return 'cancelled'
+        if state == 'claimed':
+            self.client.hset(key, 'cancel', 1)
+            return 'cancelling'
+        return self.get(job_id).get('status')
+
+    def cancel_requested(self, job_id):
+        return self.client.hget(self._key('job', job_id), 'cancel') == '1'
+
+    def heartbeat(self, worker_id, slots, job_ids):
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.hset(self._key('workers'), worker_id, json.dumps({'slots': slots, 'heartbeat': now}))
+        for job_id in job_ids:
+            pipe.hset(self._key('job', job_id), 'heartbeat', now)
+        pipe.execute()
+
+    def unregister(self, worker_id):
+        self.client.hdel(self._key('workers'), worker_id)
+
+    def requeue_stale(self, timeout=WORKER_TIMEOUT_SECONDS):
+        import redis
+        cutoff = time.time() - timeout
+        requeued = []
+        for job_id in self.client.zrange(self._key('active'), 0, -1):
+            key = self._key('job', job_id)
+            # Watched, so a heartbeat or another worker's requeue in between wins
+            with self.client.pipeline() as pipe:
+                try:
+                    pipe.watch(key)
+                    job = pipe.hgetall(key)
+                    if job.get('state') != 'claimed' or float(job.get('heartbeat', 0)) >= cutoff:
+                        continue
+                    record = json.loads(job['record'])
+                    if job.get('cancel') == '1':
+                        # claim skips cancelled ids, so a requeued one would stay active forever
+                        record.update({'status': 'cancelled', 'error': "Job cancelled"})
+                        pipe.multi()
+                        pipe.hset(key, mapping={'state': 'done', 'record': json.dumps(record)})
+                        pipe.zrem(self._key('active'), job_id)
+                        pipe.execute()
+                        continue
+                    record['status'] = 'queued'
+                    record.pop('started_at', None)
+                    pipe.multi()
+                    pipe.hset(key, mapping={'state': 'queued', 'record': json.dumps(record)})
+                    pipe.hdel(key, 'worker')
+                    pipe.lpush(self._key('queue'), job_id)
+                    pipe.execute()
+                    requeued.append(job_id)
+                except redis.WatchError:
+                    continue
+        return requeued
+
+    def total_slots(self, timeout=WORKER_TIMEOUT_SECONDS):
+        cutoff = time.time() - timeout
+        slots = 0
+        for raw in self.client.hvals(self._key('workers')):
+            worker = json.loads(raw)
+            if worker['heartbeat'] >= cutoff:
+                slots += worker['slots']
+        return slots
+
+
+def get_broker(url=None):
+    url = url or BROKER_URL
+    if url.startswith('redis://') or url.startswith('rediss://'):
+        return RedisBroker(url)
+    if url.startswith('sqlite:///'):
+        return SqliteBroker(url[len('sqlite:///'):])
+    raise ValueError(f"Unsupported broker URL: {url}")
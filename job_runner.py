@@ -0,0 +1,336 @@
+import os
+import sys
+import json
+import time
+import runpy
+import signal
+import tempfile
+import traceback
+import threading
+import subprocess
+
+import job_stats
+
+# Jobs allowed to run at once; the CPUs are split evenly between them so that
+# concurrent jobs do not each start thread pools sized to every core
+MAX_CONCURRENT_JOBS = max(1, int(os.environ.get('ITS_MAX_CONCURRENT_JOBS', '2')))
+# Pin each job to its own block of CPUs (Linux only)
+PIN_CPUS = os.environ.get('ITS_PIN_CPUS', '0') == '1'
+# Read by OpenMP/BLAS runtimes at start-up, before torch or numpy are imported
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                   'NUMEXPR_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS')
+
+# Seconds between SIGTERM and SIGKILL when a job is stopped
+KILL_GRACE_SECONDS = float(os.environ.get('ITS_KILL_GRACE', '5'))
+
+_slot_lock = threading.Lock()
+_slot_semaphore = threading.Semaphore(MAX_CONCURRENT_JOBS)
+_free_slots = list(range(MAX_CONCURRENT_JOBS))
+
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def thread_budget():
+    """Threads this process may use: ITS_NUM_THREADS when set by the job runner, else every CPU."""
+    return int(os.environ.get('ITS_NUM_THREADS', '0')) or len(available_cpus())
+
+
+def configure_threads(threads=None):
+    """(Re)size the torch and OpenCV thread pools of this process.
+    Call after fork, or in a pipeline once its model is loaded (and so torch
+    imported): pools are created lazily, so a child that never inherited a
+    running pool starts its own cleanly. ONNX Runtime and OpenVINO sessions
+    take the budget when load_model() creates them.
+    """
+    threads = threads or thread_budget()
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(threads)
+    if 'cv2' in sys.modules:
+        sys.modules['cv2'].setNumThreads(threads)
+
+
+def fork_safe():
+    """Whether children forked from this process get working thread pools.
+    ONNX Runtime and OpenVINO pools do not survive fork, and GNU OpenMP hangs
+    in a child whose parent ran a parallel region on more than one thread, so
+    a process that forks jobs keeps torch at one thread (see
+    pipelines.preload_models) and never loads the exported runtimes.
+    """
+    if 'onnxruntime' in sys.modules or 'openvino' in sys.modules:
+        return False
+    torch = sys.modules.get('torch')
+    return torch is None or torch.get_num_threads() == 1
+
+
+class JobSlot:
+    """One of MAX_CONCURRENT_JOBS execution slots with its thread budget and CPU set."""
+
+    def __init__(self, index):
+        cpus = available_cpus()
+        per_slot = max(1, len(cpus) // MAX_CONCURRENT_JOBS)
+        self.index = index
+        self.threads = per_slot
+        self.cpus = None
+        if PIN_CPUS and len(cpus) >= MAX_CONCURRENT_JOBS:
+            self.cpus = cpus[index * per_slot:(index + 1) * per_slot]
+
+    def thread_env(self):
+        env = {name: str(self.threads) for name in THREAD_ENV_VARS}
+        env['ITS_NUM_THREADS'] = str(self.threads)
+        return env
+
+    def env(self):
+        return {**os.environ, **self.thread_env()}
+
+    def apply(self):
+        """Apply the budget to the current (child) process."""
+        os.environ.update(self.thread_env())
+        if self.cpus and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, self.cpus)
+        configure_threads(self.threads)
+
+
+def acquire_slot():
+    """Block until a job slot is free and return it."""
+    _slot_semaphore.acquire()
+    with _slot_lock:
+        return JobSlot(_free_slots.pop(0))
+
+
+def release_slot(slot):
+    with _slot_lock:
+        _free_slots.append(slot.index)
+        _free_slots.sort()
+    _slot_semaphore.release()
+
+
+class JobStopped(Exception):
+    """Raised by run_command() once a job was cancelled or ran out of time."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _kill_group(pgid, grace=KILL_GRACE_SECONDS):
+    """SIGTERM the process group, then SIGKILL whatever is left after `grace` seconds
+    (SIGKILL at once with grace=0)."""
+    def send(sig):
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(pgid, sig)
+            else:
+                os.kill(pgid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+    if not grace and hasattr(signal, 'SIGKILL'):
+        send(signal.SIGKILL)
+        return
+    send(signal.SIGTERM)
+    if hasattr(signal, 'SIGKILL'):
+        timer = threading.Timer(grace, send, (signal.SIGKILL,))
+        timer.daemon = True
+        timer.start()
+
+
+def _die_with_parent(parent_pid):
+    """Have Linux SIGKILL this (child) process when its parent dies, so a job
+    started in its own session does not outlive a worker that crashed or was
+    killed. The parent may already be gone by the time this runs."""
+    if not sys.platform.startswith('linux'):
+        return
+    import ctypes
+    PR_SET_PDEATHSIG = 1
+    ctypes.CDLL(None).prctl(PR_SET_PDEATHSIG, signal.SIGKILL)
+    if os.getppid() != parent_pid:
+        os._exit(1)
+
+
+class JobControl:
+    """Cancellation and wall-clock limit for one job.
+    Every command run through run_command(control=...) is started in its own
+    process group, so stop() takes down the script together with its pool
+    workers and ffmpeg children.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.reason = None
+        self.started = None
+        self._pgids = set()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def start(self):
+        self.started = time.time()
+        if self.timeout:
+            self._timer = threading.Timer(self.timeout, self.stop, ('timed_out',))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def finish(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def stop(self, reason='cancelled', grace=KILL_GRACE_SECONDS):
+        """Stop the job's processes; grace=0 kills them at once, for a process
+        about to exit (even when the job was already being stopped)."""
+        with self._lock:
+            if self.reason is not None and grace:
+                return
+            if self.reason is None:
+                self.reason = reason
+            pgids = list(self._pgids)
+        for pgid in pgids:
+            _kill_group(pgid, grace)
+
+    def check(self):
+        if self.reason is not None:
+            raise JobStopped(self.reason)
+
+    def _attach(self, pgid):
+        with self._lock:
+            self._pgids.add(pgid)
+            stopped = self.reason is not None
+        if stopped:  # stopped while the process was being started
+            _kill_group(pgid)
+
+    def _detach(self, pgid):
+        with self._lock:
+            self._pgids.discard(pgid)
+
+
+def _exec_script_in_child(cmd, cwd, stdout_fd, stderr_fd, slot=None, stats_path=None, parent_pid=None):
+    os.dup2(stdout_fd, 1)
+    os.dup2(stderr_fd, 2)
+    code = 0
+    try:
+        os.setpgid(0, 0)
+        _die_with_parent(parent_pid)
+        job_stats.STATS.reset()
+        if stats_path:
+            os.environ['ITS_JOB_STATS'] = stats_path
+            job_stats.start_profiling()
+        if cwd:
+            os.chdir(cwd)
+        script = os.path.abspath(cmd[1])
+        sys.argv = [script] + list(cmd[2:])
+        sys.path.insert(0, os.path.dirname(script))
+        if slot is not None:
+            slot.apply()
+        else:
+            configure_threads()
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        if not isinstance(e.code, (int, type(None))):
+            print(e.code, file=sys.stderr)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        # os._exit skips atexit handlers
+        try:
+            job_stats.flush()
+        except Exception:
+            traceback.print_exc()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def run_forked(cmd, cwd=None, slot=None, control=None, stats_path=None):
+    """Run `python script args...` in a forked child of this process.
+    Models preloaded here are inherited copy-on-write instead of being
+    loaded again by a fresh interpreter. Only the calling thread exists in the
+    child, so this process must be fork_safe(). Returns a CompletedProcess.
+    """
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        parent_pid = os.getpid()
+        pid = os.fork()
+        if pid == 0:
+            _exec_script_in_child(cmd, cwd, out.fileno(), err.fileno(), slot, stats_path, parent_pid)
+        try:
+            os.setpgid(pid, pid)  # also set here, so a stop right after fork finds the group
+        except OSError:
+            pass
+        if control is not None:
+            control._attach(pid)
+        try:
+            _, status = os.waitpid(pid, 0)
+        finally:
+            if control is not None:
+                control._detach(pid)
+        returncode = os.waitstatus_to_exitcode(status)
+        out.seek(0)
+        err.seek(0)
+        return subprocess.CompletedProcess(cmd, returncode,
+                                           out.read().decode(errors='replace'),
+                                           err.read().decode(errors='replace'))
+
+
+def _read_stats(stats_path, stats):
+    try:
+        with open(stats_path) as f:
+            job_stats.merge_snapshots(stats, json.load(f))
+    except (OSError, ValueError):
+        pass  # the script does not report stats, or died before writing them
+    finally:
+        if os.path.exists(stats_path):
+            os.remove(stats_path)
+
+
+def run_command(cmd, cwd=None, fork=False, slot=None, control=None, stats=None):
+    """subprocess.run(cmd, capture_output=True, text=True) for pipeline jobs.
+    With `fork` python scripts run in a forked child instead (see run_forked).
+    A JobSlot limits the child to its thread budget and CPU set; a JobControl
+    can stop it, in which case JobStopped is raised. Counters and timers the
+    child records through job_stats are added to the `stats` dict.
+    """
+    if control is not None:
+        control.check()
+    stats_path = None
+    if stats is not None:
+        fd, stats_path = tempfile.mkstemp(prefix='its_stats_', suffix='.json')
+        os.close(fd)
+        os.remove(stats_path)
+    if fork and not fork_safe():
+        print("Not forking: this process has thread pools a child cannot inherit, starting a new interpreter")
+        fork = False
+    if fork and hasattr(os, 'fork') and cmd[0] == sys.executable and len(cmd) > 1:
+        res = run_forked(cmd, cwd, slot, control, stats_path)
+    else:
+        env, preexec_fn = None, None
+        if slot is not None:
+            env = slot.env()
+        if os.name == 'posix':
+            cpus = slot.cpus if slot is not None and hasattr(os, 'sched_setaffinity') else None
+            parent_pid = os.getpid()
+
+            def preexec_fn():
+                if cpus:
+                    os.sched_setaffinity(0, cpus)
+                _die_with_parent(parent_pid)
+        if stats_path:
+            env = dict(env or os.environ, ITS_JOB_STATS=stats_path)
+        proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                env=env, preexec_fn=preexec_fn, start_new_session=os.name == 'posix')
+        if control is not None:
+            control._attach(proc.pid)
+        try:
+            stdout, stderr = proc.communicate()
+        finally:
+            if control is not None:
+                control._detach(proc.pid)
+        res = subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+    if stats_path:
+        _read_stats(stats_path, stats)
+    if control is not None:
+        control.check()
+    return res
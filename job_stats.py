@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import tracemalloc
+import multiprocessing
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Counters and stage timers of a pipeline process. The job runner points
+# ITS_JOB_STATS at a file per command; the totals are written there when the
+# process exits and end up in the job record and the /metrics endpoint.
+#
+# Stages: decode, inference, ocr, draw, encode. Two heavier captures can be
+# switched on for the pipeline processes of all jobs:
+#   ITS_PROFILE=1      sample the main thread's stack every ITS_PROFILE_INTERVAL
+#                      seconds; collapsed stacks (flamegraph.pl / speedscope
+#                      input) go to ITS_PROFILE_DIR, the hottest lines to the job
+#   ITS_TRACEMALLOC=1  trace Python allocations; the snapshot is dumped next to
+#                      the profiles and the largest allocation sites reported
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.environ.get('ITS_PROFILE_DIR', os.path.join(BASE_DIR, 'Data', 'Profiles'))
+PROFILE_INTERVAL = float(os.environ.get('ITS_PROFILE_INTERVAL', '0.01'))
+TOP_ENTRIES = 15
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread."""
+
+    def __init__(self, interval=PROFILE_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = defaultdict(int)
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def summary(self):
+        """Lines that were on top of the stack most often."""
+        leaves = defaultdict(int)
+        for stack, n in list(self.stacks.items()):
+            leaves[stack.rsplit(';', 1)[-1]] += n
+        top = sorted(leaves.items(), key=lambda item: -item[1])[:TOP_ENTRIES]
+        total = max(1, self.samples)
+        return {'samples': self.samples, 'interval': self.interval,
+                'top': [{'line': line, 'samples': n, 'percent': round(100.0 * n / total, 1)} for line, n in top]}
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, n in sorted(self.stacks.items()):
+                f.write(f"{stack} {n}\n")
+
+
+class JobStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.timers = defaultdict(float)
+        self.sampler = None
+        self.outputs = {}
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            self.timers[name] += seconds
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def start_profiling(self):
+        """Start the captures enabled by ITS_PROFILE / ITS_TRACEMALLOC in this process."""
+        if os.environ.get('ITS_PROFILE', '0') == '1' and self.sampler is None:
+            self.sampler = StackSampler()
+            self.sampler.start()
+        if os.environ.get('ITS_TRACEMALLOC', '0') == '1' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _write_profiles(self):
+        name = f"{os.path.splitext(os.path.basename(sys.argv[0]))[0] or 'python'}_{os.getpid()}"
+        if self.sampler is not None:
+            self.sampler.stop()
+        if self.sampler is None and not tracemalloc.is_tracing():
+            return
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if self.sampler is not None:
+            self.outputs['profile'] = os.path.join(PROFILE_DIR, f"{name}.collapsed")
+            self.sampler.write(self.outputs['profile'])
+        if tracemalloc.is_tracing():
+            self.outputs['tracemalloc'] = os.path.join(PROFILE_DIR, f"{name}.tracemalloc")
+            tracemalloc.take_snapshot().dump(self.outputs['tracemalloc'])
+
+    def snapshot(self):
+        with self.lock:
+            snapshot = {'counters': dict(self.counters), 'timers': dict(self.timers)}
+        if self.sampler is not None:
+            snapshot['profile'] = dict(self.sampler.summary(), script=os.path.basename(sys.argv[0]),
+                                       output=self.outputs.get('profile'))
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            stats = tracemalloc.take_snapshot().statistics('lineno')[:TOP_ENTRIES]
+            snapshot['memory'] = {
+                'script': os.path.basename(sys.argv[0]),
+                'current_bytes': current, 'peak_bytes': peak,
+                'top': [{'line': f"{os.path.basename(s.traceback[0].filename)}:{s.traceback[0].lineno}",
+                         'bytes': s.size, 'count': s.count} for s in stats],
+                'output': self.outputs.get('tracemalloc'),
+            }
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add a snapshot taken in another process, e.g. a segment worker."""
+        with self.lock:
+            for name, value in snapshot.get('counters', {}).items():
+                self.counters[name] += value
+            for name, value in snapshot.get('timers', {}).items():
+                self.timers[name] += value
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.timers.clear()
+
+    def flush(self, path=None):
+        path = path or os.environ.get('ITS_JOB_STATS')
+        if not path:
+            return
+        try:
+            self._write_profiles()
+        except OSError as e:
+            print(f"Could not write profiles: {e}")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+
+def merge_snapshots(total, snapshot):
+    """Sum `snapshot` into the plain dict `total` (same layout as JobStats.snapshot()).
+    Profiles and memory reports are per process and collected in lists.
+    """
+    for section in ('counters', 'timers'):
+        values = total.setdefault(section, {})
+        for name, value in snapshot.get(section, {}).items():
+            values[name] = values.get(name, 0.0) + value
+    for section, collected in (('profile', 'profiles'), ('memory', 'memory')):
+        if section in snapshot:
+            total.setdefault(collected, []).append(snapshot[section])
+    return total
+
+
+def breakdown(stats, wall_seconds):
+    """Per-stage seconds and share of a job's stats. Stages of parallel segment
+    workers add up to more than the wall time; shares are then of their sum.
+    """
+    timers = stats.get('timers', {})
+    base = max(wall_seconds, sum(timers.values()), 1e-9)
+    stages = {name: {'seconds': round(seconds, 3), 'percent': round(100.0 * seconds / base, 1)}
+              for name, seconds in sorted(timers.items(), key=lambda item: -item[1])}
+    other = base - sum(timers.values())
+    stages['other'] = {'seconds': round(other, 3), 'percent': round(100.0 * other / base, 1)}
+    result = {'wall_seconds': round(wall_seconds, 3), 'stages': stages}
+    frames = stats.get('counters', {}).get('frames')
+    if frames and wall_seconds > 0:
+        result['fps'] = round(frames / wall_seconds, 2)
+    return result
+
+
+STATS = JobStats()
+count = STATS.count
+timer = STATS.timer
+add_time = STATS.add_time
+flush = STATS.flush
+start_profiling = STATS.start_profiling
+
+atexit.register(flush)
+# Pipeline processes started by the job runner; segment workers report through
+# their parent and forked children are started by job_runner itself
+if os.environ.get('ITS_JOB_STATS') and multiprocessing.parent_process() is None:
+    start_profiling()
@@ -0,0 +1,110 @@
+import threading
+
+# Prometheus text exposition for the web process (/metrics in app.py) and queue
+# workers (ITS_WORKER_METRICS_PORT). Values are per process: with several
+# gunicorn workers or queue workers, scrape each one and sum in the query.
+
+SECONDS_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 14400)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{name}="{str(value)}"' for name, value in labels)
+    return '{' + pairs + '}'
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple((name, labels[name]) for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_label_text(key)} {_format(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple((name, labels[name]) for name in self.labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_label_text(key + (('le', _format(bound)),))} {count}")
+                lines.append(f"{self.name}_sum{_label_text(key)} {_format(total)}")
+                lines.append(f"{self.name}_count{_label_text(key)} {counts[-1]}")
+        return lines
+
+
+JOBS_FINISHED = Counter('its_jobs_finished_total', "Jobs that reached a final status", ('type', 'status'))
+QUEUE_WAIT = Histogram('its_job_queue_wait_seconds', "Time from upload to the start of processing", ('type',))
+RUN_TIME = Histogram('its_job_run_seconds', "Processing time of finished jobs", ('type',))
+UPLOAD_BYTES = Counter('its_upload_bytes_total', "Bytes received by accepted uploads", ('type',))
+FRAMES = Counter('its_frames_processed_total', "Video frames processed by the pipelines", ('type',))
+STAGE_SECONDS = Counter('its_stage_seconds_total', "Time spent per pipeline stage (inference, ocr, encode)",
+                        ('type', 'stage'))
+METRICS = [JOBS_FINISHED, QUEUE_WAIT, RUN_TIME, UPLOAD_BYTES, FRAMES, STAGE_SECONDS]
+
+
+def observe_job(job):
+    """Record a job that has finished; `job` is its record after run_job()."""
+    job_type = job['type']
+    JOBS_FINISHED.inc(type=job_type, status=job['status'])
+    if 'started_at' in job:
+        if 'created_at' in job:
+            QUEUE_WAIT.observe(max(0.0, job['started_at'] - job['created_at']), type=job_type)
+        if 'finished_at' in job:
+            RUN_TIME.observe(max(0.0, job['finished_at'] - job['started_at']), type=job_type)
+    stats = job.get('stats') or {}
+    frames = stats.get('counters', {}).get('frames')
+    if frames:
+        FRAMES.inc(frames, type=job_type)
+    for stage, seconds in stats.get('timers', {}).items():
+        STAGE_SECONDS.inc(seconds, type=job_type, stage=stage)
+
+
+def render(gauges=()):
+    """Exposition text of all metrics plus `gauges`, a list of (name, help, [(labels, value)])."""
+    lines = []
+    for name, help_text, samples in gauges:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for labels, value in samples:
+            lines.append(f"{name}{_label_text(sorted(labels.items()))} {_format(value)}")
+    for metric in METRICS:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
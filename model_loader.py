@@ -0,0 +1,328 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import importlib.util
+
+try:
+    import fcntl
+except ImportError:  # Windows: exports are not guarded against concurrent processes
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(BASE_DIR, 'Models')
+
+# "auto" picks torch on CUDA hosts, otherwise OpenVINO, then ONNX Runtime, then torch.
+# Both settings can be overridden per pipeline, e.g. ITS_ANPR_BACKEND / ITS_SIGNAL_PRECISION.
+DEFAULT_BACKEND = os.environ.get('ITS_INFERENCE_BACKEND', 'auto')
+DEFAULT_PRECISION = os.environ.get('ITS_PRECISION', 'fp32')
+BACKENDS = ('torch', 'onnx', 'openvino')
+PRECISIONS = ('fp32', 'fp16', 'int8')
+EXPORT_FORMATS = {'onnx': 'onnx', 'openvino': 'openvino'}
+CACHE_DIR_NAME = '.cache'
+# Calibration dataset yaml for OpenVINO INT8 export (ultralytics defaults to coco8)
+CALIBRATION_DATA = os.environ.get('ITS_CALIBRATION_DATA')
+# Benchmarks only: fast stand-in models instead of the weights (see stub_models.py)
+STUB_MODELS = os.environ.get('ITS_STUB_MODELS', '0') == '1'
+
+# Models loaded by preload_model(); load_model() hands these out instead of
+# loading again, so processes forked after preloading share their pages
+_PRELOADED = {}
+
+
+def cuda_available():
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
+
+
+def available_backends():
+    backends = ['torch']
+    if importlib.util.find_spec('onnxruntime') is not None:
+        backends.append('onnx')
+    if importlib.util.find_spec('openvino') is not None:
+        backends.append('openvino')
+    return backends
+
+
+def _pipeline_setting(pipeline, name):
+    if pipeline:
+        return os.environ.get(f"ITS_{pipeline.upper()}_{name}")
+    return None
+
+
+def resolve_precision(precision=None, pipeline=None):
+    return precision or _pipeline_setting(pipeline, 'PRECISION') or DEFAULT_PRECISION
+
+
+def resolve_backend(backend=None, pipeline=None):
+    backend = backend or _pipeline_setting(pipeline, 'BACKEND') or DEFAULT_BACKEND
+    if backend != 'auto':
+        return backend
+    if cuda_available():
+        return 'torch'
+    available = available_backends()
+    for candidate in ('openvino', 'onnx'):
+        if candidate in available:
+            return candidate
+    return 'torch'
+
+
+def _cache_dir(weights_path):
+    path = os.path.join(os.path.dirname(os.path.abspath(weights_path)), CACHE_DIR_NAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def weights_hash(weights_path):
+    """SHA-256 of the weights file, memoised per (size, mtime) in the cache dir."""
+    stat = os.stat(weights_path)
+    key = f"{os.path.basename(weights_path)}:{stat.st_size}:{int(stat.st_mtime)}"
+    index_path = os.path.join(_cache_dir(weights_path), 'hashes.json')
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    if key in index:
+        return index[key]
+
+    digest = hashlib.sha256()
+    with open(weights_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    index[key] = digest.hexdigest()
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, index_path)
+    return index[key]
+
+
+def export_path(weights_path, backend, imgsz=640, precision='fp32', batch=1):
+    stem = os.path.splitext(os.path.basename(weights_path))[0]
+    name = f"{stem}-{weights_hash(weights_path)[:12]}-{imgsz}-{precision}"
+    if batch > 1:
+        name += f"-b{batch}"
+    if backend == 'openvino':
+        return os.path.join(_cache_dir(weights_path), f"{name}_openvino_model")
+    return os.path.join(_cache_dir(weights_path), f"{name}.{backend}")
+
+
+def _quantize_onnx(src_path, dst_path, precision):
+    import onnx
+    if precision == 'int8':
+        # Dynamic quantization: INT8 weights, activations quantized at runtime, no calibration set needed
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(src_path, dst_path, weight_type=QuantType.QUInt8)
+    else:
+        from onnxconverter_common import float16
+        model = float16.convert_float_to_float16(onnx.load(src_path), keep_io_types=True)
+        onnx.save(model, dst_path)
+
+
+def export_model(weights_path, backend, imgsz=640, precision='fp32', batch=1):
+    """Export weights to `backend` at `precision` once and return the cached artifact path.
+    Exports have a fixed batch size: `batch` images per call."""
+    target = export_path(weights_path, backend, imgsz, precision, batch)
+    if os.path.exists(target):
+        return target
+
+    lock = open(f"{target}.lock", 'w')
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(target):  # exported by another process while we waited
+            return target
+        tmp_target = f"{target}.{os.getpid()}.tmp"
+        if backend == 'onnx' and precision != 'fp32':
+            # Quantize from the cached FP32 export
+            _quantize_onnx(export_model(weights_path, backend, imgsz, batch=batch), tmp_target, precision)
+            os.replace(tmp_target, target)
+            return target
+
+        from ultralytics import YOLO
+        print(f"Exporting {os.path.basename(weights_path)} to {backend} {precision} (one-off)...")
+        kwargs = {}
+        if batch > 1:
+            kwargs['batch'] = batch
+        if precision == 'fp16':
+            kwargs['half'] = True
+        elif precision == 'int8':
+            kwargs['int8'] = True
+            if CALIBRATION_DATA:
+                kwargs['data'] = CALIBRATION_DATA
+        exported = YOLO(weights_path).export(format=EXPORT_FORMATS[backend], imgsz=imgsz, verbose=False, **kwargs)
+        # ultralytics writes next to the weights; move the result into the cache atomically
+        shutil.move(str(exported), tmp_target)
+        os.replace(tmp_target, target)
+        return target
+    finally:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
+
+
+def load_model(weights_path, backend=None, task='detect', imgsz=640, precision=None, pipeline=None, batch=1):
+    """Load a YOLO model through the configured inference backend and precision.
+    .pt weights are exported (and quantized) on first use and the export is
+    reused afterwards; any failure falls back to the FP32 PyTorch weights.
+    `pipeline` selects the ITS_<PIPELINE>_BACKEND/_PRECISION overrides; exports
+    take exactly `batch` images per call (PyTorch models take any number).
+    """
+    if STUB_MODELS:
+        from stub_models import StubModel
+        return StubModel(weights_path)
+
+    from ultralytics import YOLO
+
+    backend = resolve_backend(backend, pipeline)
+    precision = resolve_precision(precision, pipeline)
+    if backend not in BACKENDS:
+        print(f"Unknown inference backend '{backend}', using torch")
+        backend = 'torch'
+    if precision not in PRECISIONS:
+        print(f"Unknown precision '{precision}', using fp32")
+        precision = 'fp32'
+
+    key = (os.path.abspath(weights_path), backend, precision, imgsz, task, 1 if backend == 'torch' else batch)
+    if key in _PRELOADED:
+        return _PRELOADED[key]
+
+    if backend != 'torch' and os.path.isfile(weights_path) and weights_path.endswith('.pt'):
+        try:
+            path = export_model(weights_path, backend, imgsz, precision, batch)
+            model = YOLO(path, task=task)
+            model.inference_backend = backend
+            model.inference_precision = precision
+            limit_session_threads(model, path, imgsz, batch)
+            return model
+        except Exception as e:
+            print(f"Could not load {os.path.basename(weights_path)} with {backend} {precision}, falling back to torch: {e}")
+
+    model = YOLO(weights_path)
+    model.inference_precision = 'fp32'
+    if cuda_available():
+        try:
+            model.to('cuda')
+            if precision == 'fp16':
+                model.overrides['half'] = True
+                model.inference_precision = 'fp16'
+        except Exception:
+            pass
+    elif precision != 'fp32':
+        print(f"{precision} is not supported for PyTorch on CPU, using fp32")
+    model.inference_backend = 'torch'
+    return model
+
+
+def limit_session_threads(model, path, imgsz=640, batch=1, threads=None):
+    """Rebuild the ONNX Runtime / OpenVINO session of an exported `model` with
+    the thread budget of this process (ITS_NUM_THREADS, see job_runner).
+    ultralytics creates the session on the first predict with one thread per
+    core, so this runs that predict on a blank frame first."""
+    from job_runner import available_cpus, thread_budget
+    threads = threads or thread_budget()
+    if threads >= len(available_cpus()):
+        return
+    import numpy as np
+    model([np.zeros((imgsz, imgsz, 3), dtype=np.uint8)] * batch, verbose=False)
+    runtime = model.predictor.model
+    try:
+        if model.inference_backend == 'onnx':
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+            runtime.session = onnxruntime.InferenceSession(path, options, providers=runtime.session.get_providers())
+        else:
+            import openvino
+            config = {'PERFORMANCE_HINT': getattr(runtime, 'inference_mode', 'LATENCY'),
+                      'INFERENCE_NUM_THREADS': threads}
+            runtime.ov_compiled_model = openvino.Core().compile_model(runtime.ov_model, device_name='CPU',
+                                                                      config=config)
+    except Exception as e:
+        print(f"Could not limit {os.path.basename(path)} to {threads} threads: {e}")
+
+
+def preload_model(weights_path, pipeline=None, task='detect', imgsz=640):
+    """Load a model once into this process for later load_model() calls.
+    Only PyTorch models are preloaded: ONNX Runtime and OpenVINO build their
+    session on the first predict, in each process, and their thread pools do
+    not survive fork; None is returned for those backends."""
+    backend = resolve_backend(None, pipeline)
+    precision = resolve_precision(None, pipeline)
+    if backend not in BACKENDS:
+        backend = 'torch'
+    if backend != 'torch':
+        return None
+    if precision not in PRECISIONS:
+        precision = 'fp32'
+    key = (os.path.abspath(weights_path), backend, precision, imgsz, task, 1)
+    if key not in _PRELOADED:
+        _PRELOADED[key] = load_model(weights_path, backend, task, imgsz, precision)
+    return _PRELOADED[key]
+
+
+def parse_variant(variant):
+    """Parse "backend[:precision]", e.g. "onnx:int8"."""
+    backend, _, precision = variant.partition(':')
+    return backend, precision or 'fp32'
+
+
+def compare_latency(weights_paths, variants=None, runs=20, imgsz=640):
+    """Mean/p90 single-frame latency (ms) per model and backend[:precision] variant on a 1280x720 frame."""
+    import numpy as np
+
+    frame = np.random.default_rng(0).integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+    report = {}
+    for weights_path in weights_paths:
+        name = os.path.basename(weights_path)
+        report[name] = {}
+        for variant in variants or available_backends():
+            backend, precision = parse_variant(variant)
+            try:
+                model = load_model(weights_path, backend=backend, imgsz=imgsz, precision=precision)
+                if (model.inference_backend, model.inference_precision) != (backend, precision):
+                    raise RuntimeError("export failed")
+                for _ in range(3):  # warm-up
+                    model(frame, verbose=False)
+                timings = []
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    model(frame, verbose=False)
+                    timings.append((time.perf_counter() - start) * 1000)
+                timings.sort()
+                report[name][variant] = {'mean_ms': round(sum(timings) / len(timings), 2),
+                                         'p90_ms': round(timings[int(0.9 * (len(timings) - 1))], 2)}
+            except Exception as e:
+                report[name][variant] = {'error': str(e)}
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export models to CPU runtimes and compare inference latency")
+    parser.add_argument('--models', nargs='+', default=None, help="Weights to compare (default: every .pt in Models/)")
+    parser.add_argument('--variants', nargs='+', default=None,
+                        help="backend[:precision] variants to compare, e.g. torch onnx:int8 openvino:fp16 (default: all installed backends at fp32)")
+    parser.add_argument('--runs', type=int, default=20, help="Timed runs per model and backend")
+    parser.add_argument('--imgsz', type=int, default=640, help="Inference/export image size")
+    args = parser.parse_args()
+
+    models = args.models or sorted(os.path.join(MODELS_DIR, f) for f in os.listdir(MODELS_DIR) if f.endswith('.pt'))
+    report = compare_latency(models, args.variants, args.runs, args.imgsz)
+
+    print(f"{'model':<36}{'variant':<16}{'mean ms':>10}{'p90 ms':>10}")
+    for name, rows in report.items():
+        for variant, row in rows.items():
+            if 'error' in row:
+                print(f"{name:<36}{variant:<16}  error: {row['error']}")
+            else:
+                print(f"{name:<36}{variant:<16}{row['mean_ms']:>10}{row['p90_ms']:>10}")
+    json.dump(report, sys.stdout, indent=2)
+    print()
@@ -0,0 +1,310 @@
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+
+import job_stats
+from job_runner import JobStopped, acquire_slot, release_slot, run_command
+
+# Pipeline runners shared by the web process (ITS_EXECUTION=local) and worker.py
+# (ITS_EXECUTION=queue). A job is described by its type and a JSON payload
+# whose paths are relative to BASE_DIR, so nodes sharing the Data directory at
+# a different mount point resolve them to their own location.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ANPR_DIR = os.path.join(BASE_DIR, 'ANPR-ATCC')
+ANPR_RESULTS_DIR = os.path.join(BASE_DIR, 'Data', 'ANPR-ATCC', 'Results')
+SIGNAL_DIR = os.path.join(BASE_DIR, 'Signal-Control')
+
+# Segment-parallel workers for accident detection and ANPR tracking (1 = serial)
+ACCIDENT_WORKERS = int(os.environ.get('ITS_ACCIDENT_WORKERS', '1'))
+ANPR_WORKERS = int(os.environ.get('ITS_ANPR_WORKERS', '1'))
+
+# Preload mode: load the models and the OCR reader once at import (in the gunicorn
+# master with preload_app) and run pipeline scripts in forked children, so all
+# workers and jobs share the weight pages copy-on-write
+PRELOAD_MODELS = os.environ.get('ITS_PRELOAD_MODELS', '0') == '1'
+PRELOAD_SPEC = os.environ.get('ITS_PRELOAD_SPEC', 'anpr:yolov8x.pt,anpr:License-Plate.pt,accident:accident_detector.pt,'
+                                                  'emergency:Emergency_Vechicle_Detection.pt,signal:yolov8x.pt')
+
+# Wall-clock limit per pipeline in seconds, e.g. ITS_ANPR_TIMEOUT=3600 (0 = no limit)
+JOB_TIMEOUTS = {
+    'anpr': int(os.environ.get('ITS_ANPR_TIMEOUT', '14400')),
+    'accident': int(os.environ.get('ITS_ACCIDENT_TIMEOUT', '7200')),
+    'emergency': int(os.environ.get('ITS_EMERGENCY_TIMEOUT', '7200')),
+    'signal': int(os.environ.get('ITS_SIGNAL_TIMEOUT', '1800')),
+}
+
+
+def job_timeout(job_type):
+    return JOB_TIMEOUTS.get(job_type.split('_')[0]) or None
+
+
+def to_payload_path(path):
+    return os.path.relpath(os.path.abspath(path), BASE_DIR)
+
+
+def from_payload_path(path):
+    return os.path.join(BASE_DIR, path)
+
+
+def preload_models():
+    import gc
+    from model_loader import MODELS_DIR, cuda_available, preload_model
+    from job_runner import configure_threads
+    if cuda_available():
+        # A CUDA context does not survive fork
+        print("Preload skipped: not supported on CUDA hosts")
+        return False
+    # Load on one thread: an OpenMP pool started here would hang the forked
+    # children (JobSlot.apply sizes theirs), see job_runner.fork_safe()
+    configure_threads(1)
+    for item in PRELOAD_SPEC.split(','):
+        pipeline, _, name = item.strip().rpartition(':')
+        try:
+            model = preload_model(os.path.join(MODELS_DIR, name), pipeline=pipeline or None)
+            if model is None:
+                print(f"Preload skipped for {name}: exported models are loaded in each job")
+                continue
+            print(f"Preloaded {name} for {pipeline or 'default'} ({model.inference_backend} {model.inference_precision})")
+        except Exception as e:
+            print(f"Error preloading {name}: {e}")
+    sys.path.append(ANPR_DIR)
+    try:
+        import util
+        util.get_reader()
+        print("Preloaded OCR reader")
+    except Exception as e:
+        print(f"Error preloading OCR reader: {e}")
+    # Keep the preloaded objects out of future collections: the GC touching
+    # their headers would otherwise un-share the pages in every worker
+    gc.collect()
+    gc.freeze()
+    return True
+
+
+def run_anpr(job, payload, slot, control, fork, stats):
+    # Each job reads its own upload and writes into its own results directory
+    video_path = from_payload_path(payload['input'])
+    results_dir = from_payload_path(payload['results'])
+    paths = ['--video', video_path, '--results', results_dir]
+
+    # Step 1: main.py
+    res1 = run_command([sys.executable, 'main.py', '--workers', str(ANPR_WORKERS)] + paths, cwd=ANPR_DIR, fork=fork, slot=slot, control=control, stats=stats)
+    if res1.returncode != 0:
+        job['status'] = 'failed'
+        job['error'] = f"main.py failed: {res1.stderr}"
+        return
+
+    # Step 2: add_missing_data.py
+    res2 = run_command([sys.executable, 'add_missing_data.py', '--results', results_dir], cwd=ANPR_DIR, slot=slot, control=control, stats=stats)
+    if res2.returncode != 0:
+        job['status'] = 'failed'
+        job['error'] = f"add_missing_data.py failed: {res2.stderr}"
+        return
+
+    # Step 3: visualize.py
+    res3 = run_command([sys.executable, 'visualize.py'] + paths, cwd=ANPR_DIR, slot=slot, control=control, stats=stats)
+    if res3.returncode != 0:
+        job['status'] = 'failed'
+        job['error'] = f"visualize.py failed: {res3.stderr}"
+        return
+
+    # Success
+    output_annotated_path = os.path.join(results_dir, 'output_annotated.webm')
+    if not os.path.isfile(output_annotated_path):
+        job['status'] = 'failed'
+        job['error'] = "Output video not found"
+        return
+
+    job['status'] = 'completed'
+    job['result_url'] = payload['result_url']
+
+
+def run_accident(job, payload, slot, control, fork, stats):
+    output_video_path = from_payload_path(payload['output'])
+    cmd = [
+        sys.executable,
+        os.path.join(BASE_DIR, 'Accident-Detection', 'accident_detector.py'),
+        '--video', from_payload_path(payload['input']),
+        '--output', output_video_path,
+        '--conf', '0.5',
+        '--workers', str(ACCIDENT_WORKERS)
+    ]
+    print(f"Running command: {' '.join(cmd)}")
+
+    res = run_command(cmd, fork=fork, slot=slot, control=control, stats=stats)
+
+    if res.returncode != 0:
+        job['status'] = 'failed'
+        job['error'] = f"Accident detection failed: {res.stderr}"
+        return
+
+    if not os.path.isfile(output_video_path):
+        job['status'] = 'failed'
+        job['error'] = "Output video not generated"
+        return
+
+    job['status'] = 'completed'
+    job['result_url'] = f"/media/accident/Results/{payload['output_filename']}"
+
+
+def run_emergency(job, payload, slot, control, fork, stats):
+    output_video_path = from_payload_path(payload['output'])
+    cmd = [
+        sys.executable,
+        os.path.join(BASE_DIR, 'Emergency-Vehicle', 'emergency_detector.py'),
+        '--video', from_payload_path(payload['input']),
+        '--output', output_video_path,
+        '--conf', '0.5'
+    ]
+    print(f"Running emergency command: {' '.join(cmd)}")
+
+    res = run_command(cmd, fork=fork, slot=slot, control=control, stats=stats)
+
+    if res.returncode != 0 and not os.path.isfile(output_video_path):
+        job['status'] = 'failed'
+        job['error'] = f"Emergency detection failed: {res.stderr}"
+        return
+
+    if not os.path.isfile(output_video_path):
+        job['status'] = 'failed'
+        job['error'] = "Output video not generated"
+        return
+
+    job['status'] = 'completed'
+    job['result_url'] = f"/media/emergency/Results/{payload['output_filename']}"
+
+
+def run_signal(job, payload, slot, control, fork, stats):
+    output_path = from_payload_path(payload['output'])
+    cmd = [
+        sys.executable,
+        os.path.join(SIGNAL_DIR, 'signalcontrol.py'),
+        '--headless',
+        '--output', output_path
+    ]
+    if payload.get('videos'):
+        cmd += ['--videos'] + [from_payload_path(p) for p in payload['videos']]
+    metrics_path = from_payload_path(payload['metrics']) if payload.get('metrics') else None
+    if metrics_path:
+        cmd += ['--metrics', metrics_path]
+    if payload.get('metrics_only'):
+        cmd.append('--metrics-only')
+    print(f"Running signal command: {' '.join(cmd)}")
+
+    # Signal control script might need to be run from its directory to find images
+    res = run_command(cmd, cwd=SIGNAL_DIR, fork=fork, slot=slot, control=control, stats=stats)
+
+    if res.returncode != 0:
+        job['status'] = 'failed'
+        job['error'] = f"Signal control failed: {stderr_tail(res.stderr)}"
+        return
+
+    if metrics_path:
+        try:
+            with open(metrics_summary_path(metrics_path)) as f:
+                job['metrics'] = json.load(f)
+        except (OSError, ValueError):
+            job['status'] = 'failed'
+            job['error'] = "Metrics not generated"
+            return
+        job['metrics_url'] = f"/media/signal/{payload['metrics_filename']}"
+
+    if payload.get('metrics_only'):
+        job['status'] = 'completed'
+        job['result_url'] = job['metrics_url']
+        return
+
+    if not os.path.isfile(output_path):
+        job['status'] = 'failed'
+        job['error'] = "Output video not generated"
+        return
+
+    job['status'] = 'completed'
+    job['result_url'] = f"/media/signal/{payload['output_filename']}"
+
+
+def stderr_tail(stderr, lines=20):
+    # The traceback at the end is what explains the failure
+    return '\n'.join((stderr or '').strip().splitlines()[-lines:])
+
+
+def metrics_summary_path(metrics_path):
+    # Written next to the series by Signal-Control/traffic_metrics.py
+    return os.path.splitext(metrics_path)[0] + '.json'
+
+
+PIPELINES = {
+    'anpr': run_anpr,
+    'accident': run_accident,
+    'emergency': run_emergency,
+    'signal_sample': run_signal,
+    'signal_metrics': run_signal,
+    'signal_detection': run_signal,
+}
+
+
+def partial_outputs(job_type, payload):
+    """Files a stopped job may have left half-written."""
+    if job_type == 'anpr':
+        return [from_payload_path(payload['results'])]
+    output = from_payload_path(payload['output'])
+    if job_type == 'accident':
+        return [output, f"{output}.segments_*"]
+    if payload.get('metrics'):
+        metrics = from_payload_path(payload['metrics'])
+        return [output, metrics, metrics_summary_path(metrics)]
+    return [output]
+
+
+def remove_partial_outputs(patterns):
+    for pattern in patterns:
+        for path in glob.glob(pattern):
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def mark_stopped(job, reason, control, outputs):
+    # Outputs of a job cancelled while still queued belong to an earlier job
+    if control.started:
+        remove_partial_outputs(outputs)
+    job['status'] = reason
+    if reason == 'timed_out':
+        job['error'] = f"Job exceeded the {control.timeout}s time limit"
+    else:
+        job['error'] = "Job cancelled"
+
+
+def run_job(job, job_type, payload, control, fork=None):
+    """Run one job to completion, writing its status into the `job` record.
+    Waits while MAX_CONCURRENT_JOBS jobs are running; the job stays 'queued'.
+    """
+    fork = PRELOAD_MODELS if fork is None else fork
+    # Counters and stage timers reported by the pipeline scripts (see job_stats.py)
+    stats = {}
+    slot = acquire_slot()
+    try:
+        control.check()
+        control.start()
+        job['started_at'] = control.started
+        job['status'] = 'processing'
+        PIPELINES[job_type](job, payload, slot, control, fork, stats)
+    except JobStopped as e:
+        mark_stopped(job, e.reason, control, partial_outputs(job_type, payload))
+    except Exception as e:
+        job['status'] = 'failed'
+        job['error'] = str(e)
+    finally:
+        control.finish()
+        release_slot(slot)
+        job['finished_at'] = time.time()
+        if stats:
+            job['stats'] = stats
+            job['stages'] = job_stats.breakdown(stats, job['finished_at'] - (control.started or job['finished_at']))
@@ -0,0 +1,94 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+from job_runner import configure_threads
+
+# What each segment-parallel pool worker loaded once in init_segment_worker
+# (a model, a tracker); the segment functions read it with segment_worker()
+_worker = None
+
+
+def keyframe_indices(video_path, fps):
+    """Frame indices of the keyframes of the first video stream.
+    Returns an empty list when neither ffprobe nor ffmpeg can list them.
+    """
+    times = []
+    if shutil.which('ffprobe'):
+        cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-skip_frame', 'nokey',
+               '-show_entries', 'frame=pts_time,best_effort_timestamp_time', '-of', 'csv=p=0', video_path]
+        res = subprocess.run(cmd, check=False, capture_output=True, text=True)
+        if res.returncode == 0:
+            for line in res.stdout.splitlines():
+                for field in line.split(','):
+                    try:
+                        times.append(float(field))
+                        break
+                    except ValueError:
+                        continue
+    elif shutil.which('ffmpeg'):
+        # No ffprobe: decode keyframes only and read their timestamps from showinfo
+        cmd = ['ffmpeg', '-nostdin', '-hide_banner', '-skip_frame', 'nokey', '-i', video_path,
+               '-map', '0:v:0', '-vf', 'showinfo', '-f', 'null', '-']
+        res = subprocess.run(cmd, check=False, capture_output=True, text=True)
+        times = [float(t) for t in re.findall(r'pts_time:\s*([0-9.]+)', res.stderr)]
+    return sorted({int(round(t * fps)) for t in times})
+
+
+def init_segment_worker(threads, load):
+    """ProcessPoolExecutor initializer of segment workers: runs load() on the
+    worker's share of the job's thread budget.
+    """
+    global _worker
+    # Stats travel back with each segment's result; only the parent writes the stats file
+    os.environ.pop('ITS_JOB_STATS', None)
+    # Read by load_model() for the sessions of exported models
+    os.environ['ITS_NUM_THREADS'] = str(threads)
+    _worker = load()
+    configure_threads(threads)
+
+
+def segment_worker():
+    return _worker
+
+
+def plan_segments(total_frames, count, keyframes=None):
+    """Split [0, total_frames) into at most `count` contiguous (start, end) ranges.
+    Boundaries are snapped to the nearest keyframe so every segment starts on one.
+    """
+    count = max(1, int(count))
+    if total_frames <= 0:
+        return []
+    bounds = []
+    for i in range(1, count):
+        target = total_frames * i // count
+        if keyframes:
+            target = min(keyframes, key=lambda k: abs(k - target))
+        if 0 < target < total_frames and target not in bounds:
+            bounds.append(target)
+    bounds = [0] + sorted(bounds) + [total_frames]
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+def concat_videos(part_paths, output_path):
+    """Join same-codec parts into one file with the ffmpeg concat demuxer (no re-encode)."""
+    if len(part_paths) == 1:
+        shutil.move(part_paths[0], output_path)
+        return True
+    fd, list_path = tempfile.mkstemp(suffix='.txt', dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            for path in part_paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        cmd = ['ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+               '-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy', output_path]
+        res = subprocess.run(cmd, check=False, capture_output=True, text=True)
+        if res.returncode != 0:
+            print(f"Error concatenating segments: {res.stderr}")
+            return False
+        return True
+    finally:
+        os.remove(list_path)
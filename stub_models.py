@@ -0,0 +1,178 @@
+import os
+import time
+import cv2
+import numpy as np
+
+# Stand-ins for the YOLO models and the OCR reader, enabled with
+# ITS_STUB_MODELS=1 (see model_loader.load_model). They return a fixed,
+# frame-indexed scene of vehicles moving across the frame, with a plate inside
+# each, so every pipeline runs end to end without weights or torch and the
+# benchmarks measure decode, drawing, encoding and bookkeeping alone.
+# ITS_STUB_LATENCY_MS adds a fixed delay per inference call. The scene moves
+# ITS_STUB_SPEED pixels per call; 0 keeps it still, so that segment workers,
+# whose models start counting at their segment, see the same boxes as a
+# serial run (tests/test_parallel.py).
+
+STUB_LATENCY_MS = float(os.environ.get('ITS_STUB_LATENCY_MS', '0'))
+STUB_VEHICLES = int(os.environ.get('ITS_STUB_VEHICLES', '6'))
+STUB_SPEED = float(os.environ.get('ITS_STUB_SPEED', '4'))
+
+COCO_VEHICLES = {2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck'}
+STUB_NAMES = {
+    'accident': {0: 'accident', 1: 'car'},
+    'emergency': {0: 'ambulance', 1: 'fire truck', 2: 'police car', 3: 'car'},
+    'plate': {0: 'license_plate'},
+    'coco': {0: 'person', 1: 'bicycle', 2: 'car', 3: 'motorcycle', 4: 'airplane', 5: 'bus', 6: 'train', 7: 'truck'},
+}
+PLATE_TEXTS = ['AB12CDE', 'KA05MN1', 'MH12AB3', 'TN09XYZ', 'DL3CAF7']
+
+
+class StubArray:
+    """Just enough of a torch tensor for the pipelines: indexing, tolist(), cpu().numpy()."""
+
+    def __init__(self, array):
+        self.array = np.asarray(array)
+
+    def __getitem__(self, index):
+        value = self.array[index]
+        return StubArray(value) if isinstance(value, np.ndarray) else value
+
+    def __iter__(self):
+        return iter(self.array)
+
+    def __len__(self):
+        return len(self.array)
+
+    def tolist(self):
+        return self.array.tolist()
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class StubBoxes:
+    def __init__(self, xyxy, conf, cls, ids=None):
+        self.xyxy = StubArray(np.asarray(xyxy, dtype=np.float32).reshape(-1, 4))
+        self.conf = StubArray(np.asarray(conf, dtype=np.float32))
+        self.cls = StubArray(np.asarray(cls, dtype=np.float32))
+        self.id = None if ids is None else StubArray(np.asarray(ids, dtype=np.float32))
+
+    @property
+    def data(self):
+        columns = [self.xyxy.array]
+        if self.id is not None:
+            columns.append(self.id.array[:, None])
+        columns += [self.conf.array[:, None], self.cls.array[:, None]]
+        return StubArray(np.hstack(columns))
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield StubBoxes(self.xyxy.array[i:i + 1], self.conf.array[i:i + 1], self.cls.array[i:i + 1],
+                            None if self.id is None else self.id.array[i:i + 1])
+
+
+class StubResults:
+    def __init__(self, frame, boxes, names):
+        self.orig_img = frame
+        self.boxes = boxes
+        self.names = names
+
+    def plot(self, img=None):
+        frame = (self.orig_img if img is None else img).copy()
+        for x1, y1, x2, y2 in self.boxes.xyxy.array.astype(int):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        return frame
+
+
+def stub_kind(weights_path):
+    name = os.path.basename(str(weights_path)).lower()
+    if 'accident' in name:
+        return 'accident'
+    if 'emergency' in name:
+        return 'emergency'
+    if 'plate' in name:
+        return 'plate'
+    return 'coco'
+
+
+def scene(index, width, height, count=STUB_VEHICLES):
+    """Vehicle boxes at call `index`: `count` vehicles in lanes, moving right."""
+    boxes = []
+    box_w, box_h = max(8, width // 8), max(6, height // 8)
+    lanes = max(1, min(count, 4))
+    for i in range(count):
+        lane = i % lanes
+        x = int((i * width / count + index * STUB_SPEED) % max(1, width - box_w))
+        y = int(height * (0.2 + 0.6 * lane / lanes))
+        boxes.append((x, y, x + box_w, min(height - 1, y + box_h)))
+    return boxes
+
+
+class StubModel:
+    def __init__(self, weights_path):
+        self.weights_path = weights_path
+        self.kind = stub_kind(weights_path)
+        self.names = STUB_NAMES[self.kind]
+        self.predictor = None
+        self.overrides = {}
+        self.inference_backend = 'stub'
+        self.inference_precision = 'fp32'
+        self.calls = 0
+
+    def add_callback(self, event, callback):
+        pass
+
+    def _boxes(self, frame, track):
+        height, width = frame.shape[:2]
+        vehicles = scene(self.calls, width, height)
+        self.calls += 1
+        if STUB_LATENCY_MS:
+            time.sleep(STUB_LATENCY_MS / 1000)
+        if self.kind == 'plate':
+            # Lower middle of each vehicle
+            xyxy = [(x1 + (x2 - x1) // 3, y1 + 2 * (y2 - y1) // 3, x2 - (x2 - x1) // 3, y2 - 1)
+                    for x1, y1, x2, y2 in vehicles]
+            cls = [0] * len(xyxy)
+        elif self.kind == 'accident':
+            # Accident in one 30-frame window out of every 300
+            xyxy = vehicles[:1] if self.calls % 300 < 30 else []
+            cls = [0] * len(xyxy)
+        elif self.kind == 'emergency':
+            xyxy = vehicles
+            cls = [0 if i == 0 else 3 for i in range(len(xyxy))]
+        else:
+            xyxy = vehicles
+            vehicle_ids = sorted(COCO_VEHICLES)
+            cls = [vehicle_ids[i % len(vehicle_ids)] for i in range(len(xyxy))]
+        ids = list(range(1, len(xyxy) + 1)) if track else None
+        return StubBoxes(xyxy, [0.9] * len(xyxy), cls, ids)
+
+    def __call__(self, frame, **kwargs):
+        # A list of frames is one batch, with one result per frame
+        frames = frame if isinstance(frame, list) else [frame]
+        return [StubResults(f, self._boxes(f, track=False), self.names) for f in frames]
+
+    def predict(self, frame, **kwargs):
+        return self(frame, **kwargs)
+
+    def track(self, frame, **kwargs):
+        return [StubResults(frame, self._boxes(frame, track=True), self.names)]
+
+
+class StubReader:
+    """easyocr.Reader stand-in cycling through valid plate strings."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def readtext(self, image):
+        text = PLATE_TEXTS[self.calls % len(PLATE_TEXTS)]
+        self.calls += 1
+        height, width = image.shape[:2]
+        return [([[0, 0], [width, 0], [width, height], [0, height]], text, 0.9)]
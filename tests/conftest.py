@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The pipelines are flat scripts run from their own directories; make their
+# modules importable the same way
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (BASE_DIR, os.path.join(BASE_DIR, 'Signal-Control'), os.path.join(BASE_DIR, 'ANPR-ATCC')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
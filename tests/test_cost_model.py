@@ -0,0 +1,20 @@
+from cost_model import wait_seconds
+
+
+def test_free_slot_means_no_wait():
+    assert wait_seconds([], [], 2) == 0.0
+    assert wait_seconds([30.0], [], 2) == 0.0
+
+
+def test_wait_for_the_first_slot_to_free_up():
+    assert wait_seconds([30.0, 10.0], [], 2) == 10.0
+
+
+def test_queued_jobs_fill_slots_greedily():
+    # The slot free at 10 takes the 5 s job, the next job waits for the one free at 15
+    assert wait_seconds([10.0, 30.0], [5.0], 2) == 15.0
+    assert wait_seconds([10.0, 30.0], [5.0, 40.0], 2) == 30.0
+
+
+def test_only_as_many_running_jobs_as_slots_count():
+    assert wait_seconds([50.0, 10.0, 30.0], [], 2) == 10.0
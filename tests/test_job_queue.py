@@ -0,0 +1,64 @@
+import pytest
+
+from job_queue import SqliteBroker
+
+
+@pytest.fixture
+def broker(tmp_path):
+    return SqliteBroker(str(tmp_path / 'jobs.db'))
+
+
+def _enqueue(broker, job_id, job_type='accident'):
+    broker.enqueue(job_id, job_type, {'input': 'in.mp4'}, {'status': 'queued', 'type': job_type})
+
+
+def test_claim_takes_the_oldest_wanted_job(broker):
+    _enqueue(broker, 'a', 'anpr')
+    _enqueue(broker, 'b', 'accident')
+    _enqueue(broker, 'c', 'accident')
+    assert broker.claim('w1', ['accident'])['id'] == 'b'
+    assert broker.claim('w1')['id'] == 'a'
+    assert broker.claim('w2')['id'] == 'c'
+    assert broker.claim('w2') is None
+
+
+def test_cancel_queued_job(broker):
+    _enqueue(broker, 'a')
+    assert broker.request_cancel('a') == 'cancelled'
+    assert broker.get('a')['status'] == 'cancelled'
+    assert broker.claim('w1') is None
+    assert broker.active() == []
+
+
+def test_cancel_claimed_job_is_left_to_its_worker(broker):
+    _enqueue(broker, 'a')
+    broker.claim('w1')
+    assert broker.request_cancel('a') == 'cancelling'
+    assert broker.cancel_requested('a')
+    broker.update('a', {'status': 'cancelled'})
+    assert broker.active() == []
+    assert broker.request_cancel('a') == 'cancelled'
+
+
+def test_requeue_stale_job(broker):
+    _enqueue(broker, 'a')
+    broker.claim('w1')
+    broker.update('a', {'status': 'processing', 'started_at': 1.0})
+    # A live worker's job is left alone
+    assert broker.requeue_stale(timeout=60) == []
+    # Negative timeout: every heartbeat is older than the cutoff
+    assert broker.requeue_stale(timeout=-1) == ['a']
+    record = broker.get('a')
+    assert record['status'] == 'queued'
+    assert 'started_at' not in record
+    assert broker.claim('w2')['id'] == 'a'
+
+
+def test_requeue_stale_finishes_cancelled_job(broker):
+    _enqueue(broker, 'a')
+    broker.claim('w1')
+    broker.request_cancel('a')
+    assert broker.requeue_stale(timeout=-1) == []
+    assert broker.get('a')['status'] == 'cancelled'
+    assert broker.active() == []
+    assert broker.claim('w2') is None
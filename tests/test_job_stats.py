@@ -0,0 +1,25 @@
+from job_stats import breakdown
+
+
+def test_shares_of_wall_time():
+    result = breakdown({'timers': {'decode': 2.0, 'inference': 6.0}, 'counters': {'frames': 100}}, 10.0)
+    assert list(result['stages']) == ['inference', 'decode', 'other']
+    assert result['stages']['inference'] == {'seconds': 6.0, 'percent': 60.0}
+    assert result['stages']['decode'] == {'seconds': 2.0, 'percent': 20.0}
+    assert result['stages']['other'] == {'seconds': 2.0, 'percent': 20.0}
+    assert result['fps'] == 10.0
+    assert result['wall_seconds'] == 10.0
+
+
+def test_parallel_stages_are_shares_of_their_sum():
+    # Segment workers: 15 s of stage time in 10 s of wall time
+    result = breakdown({'timers': {'inference': 12.0, 'decode': 3.0}}, 10.0)
+    assert result['stages']['inference']['percent'] == 80.0
+    assert result['stages']['decode']['percent'] == 20.0
+    assert result['stages']['other'] == {'seconds': 0.0, 'percent': 0.0}
+    assert 'fps' not in result
+
+
+def test_untimed_job_is_all_other():
+    result = breakdown({}, 4.0)
+    assert result['stages'] == {'other': {'seconds': 4.0, 'percent': 100.0}}
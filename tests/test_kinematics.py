@@ -0,0 +1,27 @@
+import numpy as np
+
+from simulation import Simulation
+
+
+def _overlapping(sim):
+    """Vehicles overlapping the vehicle ahead of them in the same lane, both still going straight."""
+    c = sim.columns
+    n = sim.count
+    rows = np.flatnonzero(c['active'][:n] & (c['leader'][:n] >= 0))
+    lead = c['leader'][rows]
+    straight = (c['active'][lead] & (c['angle'][rows] == 0) & (c['angle'][lead] == 0)
+                & ~c['turned'][rows] & ~c['turned'][lead])
+    rows, lead = rows[straight], lead[straight]
+    horizontal = c['horizontal'][rows]
+    start = np.where(horizontal, c['x'][rows], c['y'][rows])
+    end = start + np.where(horizontal, c['width'][rows], c['height'][rows])
+    lead_start = np.where(horizontal, c['x'][lead], c['y'][lead])
+    lead_end = lead_start + np.where(horizontal, c['width'][lead], c['height'][lead])
+    return int(np.count_nonzero((start < lead_end - 1e-9) & (lead_start < end - 1e-9)))
+
+
+def test_no_overlap_within_a_lane():
+    sim = Simulation(seed=1)
+    while not sim.finished:
+        sim.step()
+        assert _overlapping(sim) == 0, f"overlap at tick {sim.tick}"
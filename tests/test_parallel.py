@@ -0,0 +1,128 @@
+import os
+import csv
+import sys
+import shutil
+import subprocess
+
+import pytest
+
+from conftest import BASE_DIR
+from parallel import match_tracks, stitch_segments
+
+ANPR_DIR = os.path.join(BASE_DIR, 'ANPR-ATCC')
+
+
+def _entry(text='None'):
+    return {'car': {'bbox': [0, 0, 10, 10], 'obj_class': 'car'},
+            'license_plate': {'bbox': [1, 1, 5, 3], 'text': text, 'bbox_score': 0.9, 'text_score': 0.9}}
+
+
+def test_same_box_in_the_overlap_matches():
+    frames = range(10, 14)
+    prev_boxes = {f: {3: [100, 100, 200, 150]} for f in frames}
+    next_boxes = {f: {1: [102, 100, 202, 150]} for f in frames}
+    assert match_tracks(prev_boxes, {}, next_boxes, {}, frames) == {1: 3}
+
+
+def test_distant_boxes_do_not_match():
+    frames = range(10, 14)
+    prev_boxes = {f: {3: [100, 100, 200, 150]} for f in frames}
+    next_boxes = {f: {1: [400, 100, 500, 150]} for f in frames}
+    assert match_tracks(prev_boxes, {}, next_boxes, {}, frames) == {}
+
+
+def test_each_track_is_matched_once():
+    frames = range(10, 14)
+    prev_boxes = {f: {3: [100, 100, 200, 150], 4: [300, 100, 400, 150]} for f in frames}
+    next_boxes = {f: {1: [300, 100, 400, 150], 2: [100, 100, 200, 150]} for f in frames}
+    assert match_tracks(prev_boxes, {}, next_boxes, {}, frames) == {1: 4, 2: 3}
+
+
+def test_stitched_tracks_keep_one_id():
+    overlap = 4
+    segments = [(0, 10), (10, 20)]
+    box = [100, 100, 200, 150]
+    # The earlier segment keeps its trailing window, the later one starts `overlap` frames early
+    first = ({f: {7: _entry()} for f in range(0, 10)}, {f: {7: box} for f in range(6, 10)})
+    second = ({f: {1: _entry(), 2: _entry()} for f in range(6, 20)},
+              {f: {1: box, 2: [400, 300, 450, 330]} for f in range(6, 10)})
+    merged = stitch_segments(segments, [first, second], overlap)
+
+    assert sorted(merged) == list(range(20))
+    assert all(list(merged[f]) == [1] for f in range(0, 10))
+    # Local track 1 continues global car 1, local track 2 is a new car
+    assert all(sorted(merged[f]) == [1, 2] for f in range(10, 20))
+
+
+def _shifted(x):
+    """A 100x100 box and the same box `x` pixels to the right: IoU (100 - x) / (100 + x)."""
+    return [0, 0, 100, 100], [x, 0, x + 100, 100]
+
+
+def test_iou_threshold():
+    frames = range(4)
+    for x, matched in ((48, True), (60, False)):  # IoU 0.35 and 0.25 against MATCH_THRESHOLD 0.3
+        a, b = _shifted(x)
+        mapping = match_tracks({f: {3: a} for f in frames}, {}, {f: {1: b} for f in frames}, {}, frames)
+        assert mapping == ({1: 3} if matched else {})
+
+
+def test_score_is_normalised_by_the_longer_track():
+    # Overlapping in one of the four frames the earlier track was seen: IoU 1 / 4
+    frames = range(4)
+    box = [0, 0, 100, 100]
+    assert match_tracks({f: {3: box} for f in frames}, {}, {3: {1: box}}, {}, frames) == {}
+
+
+def test_identical_plate_read_adds_the_bonus():
+    frames = range(4)
+    a, b = _shifted(80)  # IoU 0.11: no match on boxes alone
+    prev_boxes, next_boxes = {f: {3: a} for f in frames}, {f: {1: b} for f in frames}
+    for prev_text, next_text, matched in (('KA05MN1', 'KA05MN1', True), ('KA05MN1', 'MH12AB3', False),
+                                          ('None', 'None', False), ('AB1', 'AB1', False)):
+        prev_results = {2: {3: _entry(prev_text)}}
+        next_results = {2: {1: _entry(next_text)}}
+        mapping = match_tracks(prev_boxes, prev_results, next_boxes, next_results, frames)
+        assert mapping == ({1: 3} if matched else {}), (prev_text, next_text)
+
+
+def _read_rows(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def _run_anpr(clip, results, workers, env):
+    cmd = [sys.executable, 'main.py', '--workers', str(workers), '--overlap', '10', '--video', clip, '--results', results]
+    subprocess.run(cmd, cwd=ANPR_DIR, env=env, check=True, capture_output=True, timeout=300)
+    return _read_rows(os.path.join(results, 'main.csv'))
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="segment-parallel mode needs ffmpeg")
+def test_parallel_run_matches_serial(tmp_path):
+    sys.path.insert(0, os.path.join(BASE_DIR, 'bench'))
+    from clips import make_clip
+    clip = make_clip(str(tmp_path / 'clip.mp4'), frames=120, size=(320, 180))
+    # A still stub scene: every worker's detector sees what the serial one sees.
+    # Plate texts cycle per OCR call, so they differ between the runs.
+    env = dict(os.environ, ITS_STUB_MODELS='1', ITS_STUB_SPEED='0', ITS_ANPR_CHECKPOINT_EVERY='0')
+    env.pop('ITS_JOB_STATS', None)
+    serial = _run_anpr(clip, str(tmp_path / 'serial'), 1, env)
+    parallel = _run_anpr(clip, str(tmp_path / 'parallel'), 3, env)
+
+    def key(row):
+        return int(row['frame_nmr']), int(row['car_id'])
+    assert serial
+    assert abs(len(parallel) - len(serial)) <= 0.01 * len(serial)
+    assert {row['car_id'] for row in parallel} == {row['car_id'] for row in serial}
+    parallel_rows = {key(row): row for row in parallel}
+    matched = 0
+    for row in serial:
+        other = parallel_rows.get(key(row))
+        if other is None:
+            continue
+        assert other['car_class'] == row['car_class']
+        car_a = [float(v) for v in row['car_bbox'][1:-1].split()]
+        car_b = [float(v) for v in other['car_bbox'][1:-1].split()]
+        assert max(abs(a - b) for a, b in zip(car_a, car_b)) <= 1.0
+        matched += 1
+    assert matched >= 0.99 * len(serial)
@@ -0,0 +1,76 @@
+import os
+import subprocess
+
+import pipelines
+
+
+def _anpr_payload(job_id):
+    results = os.path.join('Data', 'ANPR-ATCC', 'Results', job_id)
+    return {'input': os.path.join('Data', 'ANPR-ATCC', f"anpr_atcc_{job_id}.mp4"), 'results': results,
+            'result_url': f"/media/anpr-atcc/Results/{job_id}/output_annotated.webm"}
+
+
+def test_anpr_jobs_use_their_own_paths(monkeypatch, tmp_path):
+    monkeypatch.setattr(pipelines, 'BASE_DIR', str(tmp_path))
+    commands = []
+
+    def run_command(cmd, cwd=None, **kwargs):
+        commands.append(cmd)
+        if cmd[1] == 'visualize.py':
+            results = cmd[cmd.index('--results') + 1]
+            os.makedirs(results, exist_ok=True)
+            open(os.path.join(results, 'output_annotated.webm'), 'w').close()
+        return subprocess.CompletedProcess(cmd, 0, '', '')
+
+    monkeypatch.setattr(pipelines, 'run_command', run_command)
+    job = {}
+    payload = _anpr_payload('job-a')
+    pipelines.run_anpr(job, payload, None, None, False, {})
+
+    results = str(tmp_path / 'Data' / 'ANPR-ATCC' / 'Results' / 'job-a')
+    video = str(tmp_path / 'Data' / 'ANPR-ATCC' / 'anpr_atcc_job-a.mp4')
+    assert [cmd[1] for cmd in commands] == ['main.py', 'add_missing_data.py', 'visualize.py']
+    for cmd in commands:
+        assert cmd[cmd.index('--results') + 1] == results
+    assert commands[0][commands[0].index('--video') + 1] == video
+    assert commands[2][commands[2].index('--video') + 1] == video
+    assert job['status'] == 'completed'
+    assert job['result_url'] == payload['result_url']
+
+
+def test_anpr_partial_outputs_are_the_jobs_own():
+    outputs = pipelines.partial_outputs('anpr', _anpr_payload('job-a'))
+    assert outputs == [os.path.join(pipelines.BASE_DIR, 'Data', 'ANPR-ATCC', 'Results', 'job-a')]
+
+
+def _signal_payload(tmp_path):
+    return {'output': str(tmp_path / 'signal.webm'), 'output_filename': 'signal.webm'}
+
+
+def test_signal_job_fails_on_non_zero_exit(monkeypatch, tmp_path):
+    stderr = '\n'.join(f"line {i}" for i in range(50)) + '\nRuntimeError: boom\n'
+
+    def run_command(cmd, cwd=None, **kwargs):
+        # A video left behind by a crashed run must not count as success
+        open(tmp_path / 'signal.webm', 'w').close()
+        return subprocess.CompletedProcess(cmd, 1, '', stderr)
+
+    monkeypatch.setattr(pipelines, 'run_command', run_command)
+    job = {}
+    pipelines.run_signal(job, _signal_payload(tmp_path), None, None, False, {})
+    assert job['status'] == 'failed'
+    assert job['error'].endswith('RuntimeError: boom')
+    assert 'line 0\n' not in job['error']
+    assert 'result_url' not in job
+
+
+def test_signal_job_completes_on_zero_exit(monkeypatch, tmp_path):
+    def run_command(cmd, cwd=None, **kwargs):
+        open(tmp_path / 'signal.webm', 'w').close()
+        return subprocess.CompletedProcess(cmd, 0, '', '')
+
+    monkeypatch.setattr(pipelines, 'run_command', run_command)
+    job = {}
+    pipelines.run_signal(job, _signal_payload(tmp_path), None, None, False, {})
+    assert job['status'] == 'completed'
+    assert job['result_url'] == '/media/signal/signal.webm'
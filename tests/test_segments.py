@@ -0,0 +1,26 @@
+from segments import plan_segments
+
+
+def test_even_split():
+    assert plan_segments(100, 4) == [(0, 25), (25, 50), (50, 75), (75, 100)]
+
+
+def test_boundaries_snap_to_keyframes():
+    assert plan_segments(100, 3, [0, 30, 60, 90]) == [(0, 30), (30, 60), (60, 100)]
+
+
+def test_boundaries_sharing_a_keyframe_merge():
+    assert plan_segments(100, 4, [0, 50]) == [(0, 50), (50, 100)]
+
+
+def test_segments_cover_every_frame():
+    for total, count in ((3, 5), (7, 2), (1, 4), (1000, 7)):
+        segments = plan_segments(total, count)
+        assert segments[0][0] == 0 and segments[-1][1] == total
+        assert all(a[1] == b[0] for a, b in zip(segments, segments[1:]))
+        assert all(start < end for start, end in segments)
+        assert len(segments) <= count
+
+
+def test_empty_video():
+    assert plan_segments(0, 4) == []
@@ -0,0 +1,34 @@
+from simulation import Simulation, DEFAULT_GREEN, DEFAULT_MINIMUM, DEFAULT_MAXIMUM, DEFAULT_YELLOW, NO_OF_SIGNALS
+
+
+def test_phase_sequence():
+    sim = Simulation(seed=1)
+    phases = []  # [(signal, yellow), ticks]
+    while not sim.finished:
+        sim.step()
+        phase = (sim.controller.current_green, sim.controller.current_yellow)
+        if phases and phases[-1][0] == phase:
+            phases[-1][1] += 1
+        else:
+            phases.append([phase, 1])
+    phases = [(phase, ticks / sim.ticks_per_second) for phase, ticks in phases]
+
+    # Green then yellow for each signal in turn
+    for i, (phase, _) in enumerate(phases):
+        assert phase == ((i // 2) % NO_OF_SIGNALS, i % 2)
+    assert phases[0][1] == DEFAULT_GREEN
+    # The last phase is cut off by the end of the run
+    for (signal, yellow), seconds in phases[1:-1]:
+        if yellow:
+            assert seconds == DEFAULT_YELLOW
+        else:
+            assert DEFAULT_MINIMUM <= seconds <= DEFAULT_MAXIMUM
+
+
+def test_intersections_do_not_share_state():
+    a, b = Simulation(seed=1), Simulation(seed=1)
+    a.run(60)
+    assert b.tick == 0
+    assert b.controller.current_green == 0 and b.signals[0].green == DEFAULT_GREEN
+    b.run(60)
+    assert a.controller.state() == b.controller.state()
@@ -0,0 +1,15 @@
+import pytest
+
+from simulation import Simulation
+
+
+@pytest.mark.parametrize('seed, total', [(1, 283), (2, 279), (3, 285)])
+def test_seeded_summary(seed, total):
+    summary = Simulation(seed=seed).run()
+    assert summary['total'] == total
+    assert summary['time'] == 300
+    assert sum(summary['crossed'].values()) == total
+
+
+def test_same_seed_same_run():
+    assert Simulation(seed=7).run() == Simulation(seed=7).run()
@@ -0,0 +1,18 @@
+import pickle
+
+from simulation import Simulation
+
+
+def test_fork_replays_the_same_run():
+    sim = Simulation(seed=5)
+    sim.run(100)
+    fork = sim.fork()
+    assert fork.tick == sim.tick
+    assert fork.run() == sim.run()
+
+
+def test_snapshot_survives_pickling():
+    sim = Simulation(seed=5)
+    sim.run(50)
+    restored = Simulation.from_snapshot(pickle.loads(pickle.dumps(sim.snapshot())))
+    assert restored.run() == sim.run()
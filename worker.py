@@ -0,0 +1,174 @@
+import os
+import time
+import uuid
+import signal
+import socket
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+import pipelines
+from cost_model import CostModel
+from job_queue import WORKER_TIMEOUT_SECONDS, get_broker
+from job_runner import MAX_CONCURRENT_JOBS, JobControl
+from pipelines import PIPELINES, PRELOAD_MODELS, job_timeout, preload_models, run_job
+
+# Pulls jobs from the broker (ITS_BROKER_URL) and runs them with the same
+# pipelines as the web process. Start one per compute node, with the Data
+# directory shared with the web tier:
+#
+#   ITS_BROKER_URL=redis://queue:6379/0 python worker.py --types accident emergency
+
+POLL_SECONDS = float(os.environ.get('ITS_WORKER_POLL', '2'))
+HEARTBEAT_SECONDS = max(1.0, WORKER_TIMEOUT_SECONDS / 4)
+# Serve /metrics of this worker's jobs on this port (0 = off)
+METRICS_PORT = int(os.environ.get('ITS_WORKER_METRICS_PORT', '0'))
+
+
+class BrokerRecord(dict):
+    """Job record whose writes are forwarded to the broker, so status reads on the web tier see them."""
+
+    def __init__(self, broker, job_id, record):
+        super().__init__(record)
+        self.broker = broker
+        self.job_id = job_id
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.broker.update(self.job_id, {key: value})
+
+
+class Worker:
+    def __init__(self, broker, types=None, slots=MAX_CONCURRENT_JOBS):
+        self.broker = broker
+        self.types = types
+        self.slots = slots
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.cost_model = CostModel()
+        self.running = {}
+        self.lock = threading.Lock()
+        self.free = threading.Semaphore(slots)
+        self.stopping = threading.Event()
+
+    def heartbeat_loop(self):
+        while not self.stopping.is_set() or self.running:
+            try:
+                with self.lock:
+                    running = dict(self.running)
+                self.broker.heartbeat(self.worker_id, self.slots, list(running))
+                for job_id, control in running.items():
+                    if self.broker.cancel_requested(job_id):
+                        control.stop('cancelled')
+                requeued = self.broker.requeue_stale()
+                if requeued:
+                    print(f"Requeued jobs of lost workers: {', '.join(requeued)}")
+            except Exception as e:
+                print(f"Heartbeat failed: {e}")
+            time.sleep(HEARTBEAT_SECONDS)
+
+    def execute(self, job):
+        job_id, job_type = job['id'], job['type']
+        control = JobControl(job_timeout(job_type))
+        with self.lock:
+            self.running[job_id] = control
+        try:
+            print(f"Running {job_type} job {job_id}")
+            record = BrokerRecord(self.broker, job_id, job['record'])
+            run_job(record, job_type, job['payload'], control)
+            if record['status'] == 'completed' and 'cost_units' in record:
+                self.cost_model.observe(job_type, record['cost_units'], time.time() - record['started_at'])
+            metrics.observe_job(record)
+            print(f"Job {job_id} {record['status']}")
+        except Exception as e:
+            print(f"Job {job_id} could not be run: {e}")
+            self.broker.update(job_id, {'status': 'failed', 'error': str(e)})
+        finally:
+            with self.lock:
+                del self.running[job_id]
+            self.free.release()
+
+    def run(self):
+        threading.Thread(target=self.heartbeat_loop, name="heartbeat", daemon=True).start()
+        print(f"Worker {self.worker_id} started with {self.slots} slots")
+        while not self.stopping.is_set():
+            self.free.acquire()
+            if self.stopping.is_set():  # stopped while waiting for a slot
+                self.free.release()
+                break
+            job = None
+            try:
+                job = self.broker.claim(self.worker_id, self.types)
+            except Exception as e:
+                print(f"Could not claim a job: {e}")
+            if job is None:
+                self.free.release()
+                self.stopping.wait(POLL_SECONDS)
+                continue
+            threading.Thread(target=self.execute, args=(job,), name=f"job-{job['id']}").start()
+
+        # Drain: running jobs finish and keep their heartbeats until then
+        while self.running:
+            time.sleep(1)
+        self.broker.unregister(self.worker_id)
+        print(f"Worker {self.worker_id} stopped")
+
+    def metrics_text(self):
+        with self.lock:
+            running = len(self.running)
+        return metrics.render([
+            ('its_worker_running_jobs', "Jobs running on this worker", [({'worker': self.worker_id}, running)]),
+            ('its_job_slots', "Job slots of this worker", [({'worker': self.worker_id}, self.slots)]),
+        ])
+
+
+def serve_metrics(worker, port):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = worker.metrics_text().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', metrics.CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('', port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"Serving metrics on port {port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued ITS jobs")
+    parser.add_argument('--types', nargs='+', default=None, choices=sorted(PIPELINES),
+                        help="Job types this worker takes (default: all)")
+    parser.add_argument('--broker', default=None, help="Broker URL (default: ITS_BROKER_URL)")
+    args = parser.parse_args()
+
+    if PRELOAD_MODELS:
+        pipelines.PRELOAD_MODELS = preload_models()
+    worker = Worker(get_broker(args.broker), args.types)
+    if METRICS_PORT:
+        serve_metrics(worker, METRICS_PORT)
+
+    def stop(signum, frame):
+        if worker.stopping.is_set():
+            # Second signal: kill the running jobs and leave before their status is
+            # written; the broker requeues them once the heartbeats stop
+            for control in list(worker.running.values()):
+                control.stop('interrupted', grace=0)
+            os._exit(1)
+        print("Stopping after the running jobs finish (signal again to exit now)")
+        worker.stopping.set()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    worker.run()
+
+
+if __name__ == '__main__':
+    main()